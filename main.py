@@ -2,6 +2,15 @@
 """
 Check Printer Application - Main Entry Point
 Supports both Linux and Windows
+
+    python main.py            # Desktop application
+    python main.py serve ...  # Render service (see src/render_service.py)
+    python main.py watch DIR  # Hot folder printing (see src/hot_folder.py)
+    python main.py queue ...  # Shared render queue (see src/work_queue.py)
+    python main.py pool ...   # Print on several printers (see src/printer_pool.py)
+    python main.py broker ... # Shared print broker (see src/print_broker.py)
+    python main.py pdf ...    # Fast PDF export of a batch (see src/pdf_direct.py)
+    python main.py raw ...    # PostScript/PCL printing (see src/raw_overlay.py)
 """
 import sys
 import os
@@ -9,7 +18,28 @@ import os
 # Add the project root to the path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from src.app import main
-
 if __name__ == "__main__":
-    main()
+    if sys.argv[1:2] == ["serve"]:
+        from src.render_service import main as serve
+        serve(sys.argv[2:])
+    elif sys.argv[1:2] == ["watch"]:
+        from src.hot_folder import main as watch
+        watch(sys.argv[2:])
+    elif sys.argv[1:2] == ["queue"]:
+        from src.work_queue import main as queue
+        queue(sys.argv[2:])
+    elif sys.argv[1:2] == ["pool"]:
+        from src.printer_pool import main as pool
+        pool(sys.argv[2:])
+    elif sys.argv[1:2] == ["broker"]:
+        from src.print_broker import main as broker
+        broker(sys.argv[2:])
+    elif sys.argv[1:2] == ["pdf"]:
+        from src.pdf_direct import main as export_pdf
+        export_pdf(sys.argv[2:])
+    elif sys.argv[1:2] == ["raw"]:
+        from src.raw_overlay import main as raw
+        raw(sys.argv[2:])
+    else:
+        from src.app import main
+        main()
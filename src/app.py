@@ -3,25 +3,39 @@ Main application window for the Check Printer.
 """
 import os
 import sys
-from PyQt6.QtCore import Qt, QDate
-from PyQt6.QtGui import QPixmap, QTransform, QPainter
-from PyQt6.QtPrintSupport import QPrinter, QPrintDialog
-from PyQt6.QtWidgets import QApplication, QWidget, QVBoxLayout, QHBoxLayout
+from PyQt6.QtCore import Qt, QDate, QTimer, pyqtSignal
+from PyQt6.QtGui import QPixmap, QPainter, QKeySequence, QShortcut
+from PyQt6.QtWidgets import QApplication, QWidget, QVBoxLayout, QHBoxLayout, QFileDialog
 from qfluentwidgets import (
     SubtitleLabel, LineEdit, DoubleSpinBox, CalendarPicker,
-    PrimaryPushButton, StrongBodyLabel, BodyLabel, InfoBar, InfoBarPosition, ComboBox
+    PrimaryPushButton, PushButton, StrongBodyLabel, BodyLabel, InfoBar, InfoBarPosition, ComboBox,
+    MessageBox
 )
 
-from src.models import CheckTemplate, CheckData
+from src.models import CheckTemplate
 from src.renderers import CheckRenderer
 from src.widgets import CheckPreviewWidget
 from src.utils import get_resource_path, amount_to_words
 from src.print_dialog import CheckPrintDialog
+from src.fonts import load_bundled_fonts
+from src.template_cache import template_cache, PREVIEW_MAX_WIDTH
+from src.workers import submit, when_done
+from src.batch import load_batch, parse_amount, parse_date
+from src.batch_browser import BatchBrowser
+from src.batch_print import BatchPrintJob
+from src.print_broker import BROKER_ENV, BrokerClient
+from src.printers import PrinterCatalog, PrinterSession, make_printer
+from src.print_profiles import ProfileStore
+from src.entry_grid import BulkEntryWindow
+from src.history import CheckHistory, HistoryCompleter
 
 
 class CheckPrinterApp(QWidget):
     """Main application window."""
     
+    # (template name, "loading" | "ready" | "error")
+    templateStateChanged = pyqtSignal(str, str)
+    
     def __init__(self):
         super().__init__()
         self.setWindowTitle("PyQt Check Printer (French Demo)")
@@ -34,6 +48,14 @@ class CheckPrinterApp(QWidget):
         self.check_templates = CheckTemplate.TEMPLATES
         self.current_background = None
         self.current_check_type = None
+        self.template_states = {}
+        self.template_pixmaps = {}
+
+        # Amount in words, converted on the worker pool
+        self.current_words = ""
+        self.words_amount = None
+        self.words_generation = 0
+        self.words_future = None
 
         # Main Layout
         self.h_layout = QHBoxLayout(self)
@@ -59,7 +81,7 @@ class CheckPrinterApp(QWidget):
         self.spin_amount = DoubleSpinBox()
         self.spin_amount.setRange(0, 999999999)
         self.spin_amount.setValue(11800.00)
-        self.spin_amount.valueChanged.connect(self.update_preview)
+        self.spin_amount.valueChanged.connect(self.on_amount_changed)
         self.v_layout.addWidget(self.lbl_amount)
         self.v_layout.addWidget(self.spin_amount)
 
@@ -79,6 +101,15 @@ class CheckPrinterApp(QWidget):
         self.v_layout.addWidget(self.lbl_loc)
         self.v_layout.addWidget(self.txt_loc)
 
+        # Autocomplete from issued-check history and the payee list
+        self.history = CheckHistory()
+        self.completer_ben = HistoryCompleter(self.history, "beneficiary", self.txt_ben)
+        self.completer_loc = HistoryCompleter(self.history, "location", self.txt_loc)
+
+        # Printers are discovered in the background; one printer is kept across prints
+        self.printer_catalog = PrinterCatalog()
+        self.printer_session = PrinterSession()
+
         # Date
         self.lbl_date = BodyLabel("Le (Date):")
         self.date_picker = CalendarPicker()
@@ -89,11 +120,41 @@ class CheckPrinterApp(QWidget):
 
         self.v_layout.addStretch(1)
 
+        # Batch Button
+        self.btn_batch = PushButton("Ouvrir un lot (Batch)…")
+        self.btn_batch.clicked.connect(self.open_batch)
+        self.v_layout.addWidget(self.btn_batch)
+        self.batch_browser = None
+        self.batch_path = None
+        self.batch_job = None
+        # Rows file written by the entry grid for the running job, deleted once printed
+        self.entry_rows_path = None
+
+        # Bulk Entry Button
+        self.btn_bulk = PushButton("Saisie en lot (Grid)…")
+        self.btn_bulk.clicked.connect(self.open_bulk_entry)
+        self.v_layout.addWidget(self.btn_bulk)
+        self.bulk_entry = None
+
         # Print Button
         self.btn_print = PrimaryPushButton("Imprimer (Print)")
         self.btn_print.clicked.connect(self.print_check)
         self.v_layout.addWidget(self.btn_print)
 
+        # Quick print: the active profile, no dialogs
+        self.print_profiles = ProfileStore()
+        quick_layout = QHBoxLayout()
+        self.combo_profile = ComboBox()
+        self.combo_profile.currentTextChanged.connect(self.on_profile_changed)
+        self.btn_quick_print = PushButton("Impression rapide (Ctrl+P)")
+        self.btn_quick_print.clicked.connect(self.quick_print)
+        quick_layout.addWidget(self.combo_profile, 1)
+        quick_layout.addWidget(self.btn_quick_print)
+        self.v_layout.addLayout(quick_layout)
+        self.update_profile_combo()
+        self.shortcut_quick_print = QShortcut(QKeySequence("Ctrl+P"), self)
+        self.shortcut_quick_print.activated.connect(self.quick_print)
+
         # --- RIGHT PANEL: PREVIEW ---
         self.panel_preview = QWidget()
         self.prev_layout = QVBoxLayout(self.panel_preview)
@@ -106,49 +167,112 @@ class CheckPrinterApp(QWidget):
         self.h_layout.addWidget(self.panel_controls, 1)
         self.h_layout.addWidget(self.panel_preview, 2)
 
+        self.current_words = self.get_amount_in_words(self.spin_amount.value())
+        self.words_amount = self.spin_amount.value()
         self.update_preview()
 
     def get_amount_in_words(self, amount: float) -> str:
         """Convert amount to words."""
         return amount_to_words(amount, language='fr')
 
-    def get_current_data(self) -> dict:
-        """Get current check data."""
+    def on_amount_changed(self, *args):
+        """Convert the new amount in the background and refresh the preview."""
+        self.request_words()
+        self.update_preview()
+
+    def request_words(self):
+        """Start converting the current amount; superseded results are dropped."""
+        amount = self.spin_amount.value()
+        self.words_generation += 1
+        generation = self.words_generation
+        if self.words_future is not None:
+            # Still queued (e.g. while the spin box arrow is held): skip it
+            self.words_future.cancel()
+            self.words_future = None
+        if amount == self.words_amount:
+            return
+        self.words_future = submit(
+            self.get_amount_in_words, amount,
+            on_done=lambda f: self.on_words_ready(generation, amount, f)
+        )
+
+    def on_words_ready(self, generation: int, amount: float, future):
+        """Show converted words unless a newer amount has been requested."""
+        if generation != self.words_generation or future.cancelled():
+            return
+        self.words_future = None
+        self.current_words = future.result()
+        self.words_amount = amount
+        self.update_preview()
+
+    def get_current_data(self, final: bool = False) -> dict:
+        """Get current check data.
+
+        The preview shows the last converted words while a conversion is
+        running; final=True converts synchronously if they are out of date.
+        """
+        amount = self.spin_amount.value()
+        words = self.current_words
+        if final and amount != self.words_amount:
+            words = self.get_amount_in_words(amount)
         return {
-            "amount": self.spin_amount.value(),
-            "words": self.get_amount_in_words(self.spin_amount.value()),
+            "amount": amount,
+            "words": words,
             "beneficiary": self.txt_ben.text(),
             "location": self.txt_loc.text(),
             "date": self.date_picker.date
         }
 
+    def showEvent(self, event):
+        """Start prefetching templates once the window is first shown."""
+        super().showEvent(event)
+        if not self.template_states:
+            # Queued so the first frame is painted before any work is submitted
+            QTimer.singleShot(0, self.prefetch_templates)
+        if not self.history.loaded:
+            QTimer.singleShot(0, self.history.load_async)
+        if not self.printer_catalog.started:
+            QTimer.singleShot(0, self.printer_catalog.start)
+
+    def prefetch_templates(self):
+        """Decode every template on the worker pool without blocking the UI."""
+        for template_name, filename in self.check_templates.items():
+            if template_name in self.template_states:
+                continue
+            if not os.path.exists(get_resource_path(filename)):
+                continue
+            self._load_template(template_name)
+
+    def _load_template(self, template_name: str):
+        """Start loading a template; the result arrives in on_template_loaded."""
+        self.set_template_state(template_name, "loading")
+        future = template_cache.load_async(template_name, PREVIEW_MAX_WIDTH)
+        when_done(future, lambda f: self.on_template_loaded(template_name, f))
+
+    def set_template_state(self, template_name: str, state: str):
+        """Record a template's loading state ("loading", "ready" or "error")."""
+        self.template_states[template_name] = state
+        self.templateStateChanged.emit(template_name, state)
+        self._update_template_label()
+
+    def _update_template_label(self):
+        """Show whether the selected template is still loading."""
+        loading = self.template_states.get(self.current_check_type) == "loading"
+        suffix = " (chargement…)" if loading else ""
+        self.lbl_template.setText(f"Modèle de chèque (Check Template):{suffix}")
+
     def on_template_changed(self, template_name: str):
-        """Load the selected check template image."""
+        """Select a check template; its image is loaded in the background."""
         if template_name == "Aucun (None)":
             self.current_background = None
             self.current_check_type = None
         elif template_name in self.check_templates:
             image_path = get_resource_path(self.check_templates[template_name])
             if os.path.exists(image_path):
-                self.current_background = QPixmap(image_path)
-                if self.current_background.isNull():
-                    InfoBar.error(
-                        title='Erreur',
-                        content=f"Impossible de charger l'image: {template_name}",
-                        orient=Qt.Orientation.Horizontal,
-                        isClosable=True,
-                        position=InfoBarPosition.TOP,
-                        duration=3000,
-                        parent=self
-                    )
-                    self.current_background = None
-                    self.current_check_type = None
-                else:
-                    # Rotate BDR image 90 degrees counterclockwise
-                    if template_name == "BDR":
-                        transform = QTransform().rotate(-90)
-                        self.current_background = self.current_background.transformed(transform)
-                    self.current_check_type = template_name
+                self.current_background = self.template_pixmaps.get(template_name)
+                self.current_check_type = template_name
+                if self.current_background is None:
+                    self._load_template(template_name)
             else:
                 InfoBar.warning(
                     title='Attention',
@@ -161,6 +285,38 @@ class CheckPrinterApp(QWidget):
                 )
                 self.current_background = None
                 self.current_check_type = None
+        self._update_template_label()
+        self.update_preview()
+
+    def on_template_loaded(self, template_name: str, future):
+        """Publish a loaded template and show it if it is still selected."""
+        try:
+            image = future.result()
+        except Exception as e:
+            print(f"Error loading template {template_name}: {e}")
+            image = None
+
+        failed = image is None or image.isNull()
+        if not failed and template_name not in self.template_pixmaps:
+            # Decoded and rotated (BDR) by the template cache
+            self.template_pixmaps[template_name] = QPixmap.fromImage(image)
+        self.set_template_state(template_name, "error" if failed else "ready")
+        if template_name != self.current_check_type or self.current_background is not None:
+            return
+
+        if failed:
+            InfoBar.error(
+                title='Erreur',
+                content=f"Impossible de charger l'image: {template_name}",
+                orient=Qt.Orientation.Horizontal,
+                isClosable=True,
+                position=InfoBarPosition.TOP,
+                duration=3000,
+                parent=self
+            )
+            self.current_check_type = None
+        else:
+            self.current_background = self.template_pixmaps[template_name]
         self.update_preview()
 
     def update_preview(self):
@@ -168,53 +324,304 @@ class CheckPrinterApp(QWidget):
         data = self.get_current_data()
         self.preview_widget.update_data(data, self.current_background, self.current_check_type)
 
+    def open_batch(self):
+        """Open a CSV/JSONL batch file in the batch browser."""
+        path, _ = QFileDialog.getOpenFileName(
+            self, "Ouvrir un lot", "", "Lots de chèques (*.csv *.jsonl *.ndjson)"
+        )
+        if not path:
+            return
+        try:
+            records = load_batch(path)
+        except (OSError, ValueError) as e:
+            InfoBar.error(
+                title='Erreur',
+                content=f"Impossible de lire le lot: {str(e)}",
+                orient=Qt.Orientation.Horizontal,
+                isClosable=True,
+                position=InfoBarPosition.TOP,
+                duration=3000,
+                parent=self
+            )
+            return
+
+        # Thumbnails render on worker threads, so they need a QImage
+        background = None
+        if self.current_check_type:
+            background = template_cache.get(self.current_check_type, PREVIEW_MAX_WIDTH)
+        if self.batch_browser is not None:
+            self.batch_browser.close()
+        self.batch_path = path
+        self.batch_browser = BatchBrowser(records, background, self.current_check_type)
+        self.batch_browser.printRequested.connect(self.print_batch)
+        self.batch_browser.show()
+
+    def print_batch(self, path: str = None) -> bool:
+        """Print a batch file (the open batch by default), offering to resume an interrupted run.
+
+        Returns whether a print job was started.
+        """
+        if self.batch_job is not None:
+            InfoBar.warning(
+                title='Attention',
+                content="Un lot est déjà en cours d'impression.",
+                orient=Qt.Orientation.Horizontal,
+                isClosable=True,
+                position=InfoBarPosition.TOP,
+                duration=3000,
+                parent=self
+            )
+            return False
+
+        job = BatchPrintJob(path or self.batch_path, self.current_check_type)
+        checkpoint = job.prepare()
+        start = 0
+        if 0 < checkpoint.next_index < checkpoint.total:
+            box = MessageBox(
+                "Reprendre l'impression",
+                f"{checkpoint.next_index} chèques sur {checkpoint.total} ont déjà été envoyés. "
+                f"Reprendre au chèque {checkpoint.next_index + 1} ?",
+                self
+            )
+            if box.exec():
+                start = checkpoint.next_index
+
+        # Printed on a worker thread, so not on the session printer
+        printer = make_printer(self.printer_session.printer_name())
+        # Same margins and calibration offset as single checks on this printer
+        dialog = CheckPrintDialog(printer, self, self.printer_catalog,
+                                  profile=self.print_profiles.active())
+        if not dialog.exec():
+            return False
+        job.profile = dialog.profile()
+        if job.profile.background and self.current_check_type:
+            job.background = template_cache.load(self.current_check_type)
+
+        # QPainter may drive a QPrinter off the GUI thread
+        self.batch_job = job
+        when_done(submit(job.run, printer, start), self.on_batch_printed)
+        return True
+
+    def print_entry_rows(self, path: str):
+        """Print the rows file written by the entry grid, deleting it once printed."""
+        if self.print_batch(path):
+            self.entry_rows_path = path
+        else:
+            # The checkpoint written before the dialog opened
+            BatchPrintJob(path).discard()
+            os.remove(path)
+
+    def on_batch_printed(self, future):
+        """Report the end of a batch print run."""
+        job, self.batch_job = self.batch_job, None
+        # Entry grid rows are printed again from the grid, not resumed
+        resumable = self.entry_rows_path is None
+        if not resumable:
+            job.discard()
+            os.remove(self.entry_rows_path)
+            self.entry_rows_path = None
+        try:
+            checkpoint = future.result()
+        except Exception as e:
+            InfoBar.error(
+                title='Erreur d\'impression',
+                content=f"Impression du lot interrompue: {str(e)}" + (" (reprise possible)" if resumable else ""),
+                orient=Qt.Orientation.Horizontal,
+                isClosable=True,
+                position=InfoBarPosition.TOP,
+                duration=5000,
+                parent=self
+            )
+            return
+        InfoBar.success(
+            title='Succès',
+            content=f"{checkpoint.pages_spooled} chèques envoyés, {len(checkpoint.errors)} ignorés.",
+            orient=Qt.Orientation.Horizontal,
+            isClosable=True,
+            position=InfoBarPosition.TOP,
+            duration=3000,
+            parent=self
+        )
+
+    def print_via_broker(self):
+        """Send the check to the shared print broker ahead of any bulk job."""
+        data = self.get_current_data(final=True)
+        record = dict(data, date=data["date"].toString("dd/MM/yyyy"))
+        future = submit(self._print_on_broker, record)
+        when_done(future, lambda future: self.on_broker_printed(future, data))
+
+    def _print_on_broker(self, record: dict) -> dict:
+        with BrokerClient() as client:
+            job = client.submit([record], priority="counter", check_type=self.current_check_type,
+                                name=record["beneficiary"])
+            return client.wait(job["job_id"])
+
+    def on_broker_printed(self, future, data: dict):
+        """Report the result of a check printed by the broker."""
+        try:
+            status = future.result()
+            if status["state"] != "done" or not status["printed"]:
+                raise RuntimeError(status["error"] or next(iter(status["skipped"].values()), status["state"]))
+        except Exception as e:
+            InfoBar.error(
+                title='Erreur d\'impression',
+                content=f"Erreur lors de l'impression: {str(e)}",
+                orient=Qt.Orientation.Horizontal,
+                isClosable=True,
+                position=InfoBarPosition.TOP,
+                duration=3000,
+                parent=self
+            )
+            return
+        self.history.record_issued(data)
+        InfoBar.success(
+            title='Succès',
+            content="Le chèque a été imprimé.",
+            orient=Qt.Orientation.Horizontal,
+            isClosable=True,
+            position=InfoBarPosition.TOP,
+            duration=2000,
+            parent=self
+        )
+
+    def open_bulk_entry(self):
+        """Open the bulk entry grid; the preview follows its current row."""
+        if self.bulk_entry is None:
+            self.bulk_entry = BulkEntryWindow()
+            self.bulk_entry.currentRecordChanged.connect(self.show_record)
+            self.bulk_entry.printRequested.connect(self.print_entry_rows)
+        self.bulk_entry.show()
+        self.bulk_entry.raise_()
+
+    def show_record(self, record: dict):
+        """Load a batch record into the form, leaving unparsable fields as they are."""
+        widgets = (self.spin_amount, self.txt_ben, self.txt_loc, self.date_picker)
+        for widget in widgets:
+            widget.blockSignals(True)
+        try:
+            try:
+                self.spin_amount.setValue(parse_amount(record.get("amount")))
+            except ValueError:
+                pass
+            self.txt_ben.setText(record.get("beneficiary", ""))
+            self.txt_loc.setText(record.get("location", ""))
+            try:
+                self.date_picker.setDate(parse_date(record.get("date")))
+            except ValueError:
+                pass
+        finally:
+            for widget in widgets:
+                widget.blockSignals(False)
+        self.on_amount_changed()
+
     def print_check(self):
         """Print the check."""
-        printer = QPrinter(QPrinter.PrinterMode.HighResolution)
+        if os.environ.get(BROKER_ENV):
+            self.print_via_broker()
+            return
+        printer = self.printer_session.printer
+        
+        # Decode the full-resolution template while the dialogs are open; it
+        # is only needed when the background is printed
+        full_background = None
+        if self.current_check_type:
+            full_background = template_cache.load_async(self.current_check_type)
         
         # Use custom print dialog
-        dialog = CheckPrintDialog(printer, self)
+        dialog = CheckPrintDialog(printer, self, self.printer_catalog,
+                                  profile=self.print_profiles.active(), profiles=True)
         
         if dialog.exec():
-            try:
-                painter = QPainter(printer)
-                if not painter.isActive():
-                    raise Exception("Failed to initialize painter")
-                
-                rect = printer.pageRect(QPrinter.Unit.Millimeter)
-                
-                renderer = CheckRenderer(
-                    self.get_current_data(),
-                    self.current_background,
-                    self.current_check_type
-                )
-                renderer.draw(painter, rect, draw_background=True)
-                painter.end()
-                
-                InfoBar.success(
-                    title='Succès',
-                    content="L'impression a été envoyée.",
-                    orient=Qt.Orientation.Horizontal,
-                    isClosable=True,
-                    position=InfoBarPosition.TOP,
-                    duration=2000,
-                    parent=self
-                )
-            except Exception as e:
-                InfoBar.error(
-                    title='Erreur d\'impression',
-                    content=f"Erreur lors de l'impression: {str(e)}",
-                    orient=Qt.Orientation.Horizontal,
-                    isClosable=True,
-                    position=InfoBarPosition.TOP,
-                    duration=3000,
-                    parent=self
-                )
+            profile = dialog.profile()
+            if profile.name:
+                self.print_profiles.save(profile)
+                self.print_profiles.set_active(profile.name)
+                self.update_profile_combo()
+            background = None
+            if profile.background and full_background is not None:
+                background = full_background.result()
+            self.print_with_profile(printer, profile, background)
+    
+    def quick_print(self):
+        """Print the check with the active profile, without any dialog."""
+        profile = self.print_profiles.active()
+        if profile is None or os.environ.get(BROKER_ENV):
+            self.print_check()
+            return
+        printer = self.printer_session.printer
+        profile.apply(printer)
+        background = None
+        if profile.background and self.current_check_type:
+            background = template_cache.load(self.current_check_type)
+        self.print_with_profile(printer, profile, background)
+    
+    def print_with_profile(self, printer, profile, background=None):
+        """Print the current check on a configured printer."""
+        try:
+            painter = QPainter(printer)
+            if not painter.isActive():
+                raise Exception("Failed to initialize painter")
+            
+            rect = profile.check_rect(printer)
+            
+            data = self.get_current_data(final=True)
+            renderer = CheckRenderer(
+                data,
+                background,
+                self.current_check_type
+            )
+            # Overlay only unless a test print was requested
+            renderer.draw(
+                painter, rect,
+                draw_background=profile.background,
+                grayscale=profile.grayscale
+            )
+            painter.end()
+            self.history.record_issued(data)
+            
+            InfoBar.success(
+                title='Succès',
+                content="L'impression a été envoyée.",
+                orient=Qt.Orientation.Horizontal,
+                isClosable=True,
+                position=InfoBarPosition.TOP,
+                duration=2000,
+                parent=self
+            )
+        except Exception as e:
+            self.printer_session.reset()
+            InfoBar.error(
+                title='Erreur d\'impression',
+                content=f"Erreur lors de l'impression: {str(e)}",
+                orient=Qt.Orientation.Horizontal,
+                isClosable=True,
+                position=InfoBarPosition.TOP,
+                duration=3000,
+                parent=self
+            )
+    
+    def update_profile_combo(self):
+        """List the saved print profiles with the active one selected."""
+        names = [profile.name for profile in self.print_profiles.profiles()]
+        active = self.print_profiles.active()
+        self.combo_profile.blockSignals(True)
+        self.combo_profile.clear()
+        self.combo_profile.addItems(names)
+        if active is not None:
+            self.combo_profile.setCurrentIndex(names.index(active.name))
+        self.combo_profile.blockSignals(False)
+        self.combo_profile.setEnabled(bool(names))
+    
+    def on_profile_changed(self, name: str):
+        """Make the profile picked next to the quick print button the active one."""
+        if name:
+            self.print_profiles.set_active(name)
 
 
 def main():
     """Main entry point."""
     app = QApplication(sys.argv)
+    load_bundled_fonts()
     window = CheckPrinterApp()
     window.show()
     sys.exit(app.exec())
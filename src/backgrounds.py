@@ -0,0 +1,60 @@
+"""
+Template backgrounds resampled for each output device.
+"""
+import threading
+from collections import OrderedDict
+from PyQt6.QtCore import Qt, QSize, QSizeF
+from PyQt6.QtGui import QImage, QPixmap
+
+from src.models import CHECK_WIDTH_MM, CHECK_HEIGHT_MM
+
+MM_PER_INCH = 25.4
+
+
+def check_size_pixels(dpi_x: float, dpi_y: float) -> QSizeF:
+    """Get the physical check size in pixels at the given resolution."""
+    return QSizeF(CHECK_WIDTH_MM / MM_PER_INCH * dpi_x, CHECK_HEIGHT_MM / MM_PER_INCH * dpi_y)
+
+
+class BackgroundProvider:
+    """Serves backgrounds pre-resampled to the exact pixel size of a target."""
+
+    def __init__(self, max_entries: int = 8):
+        self.max_entries = max_entries
+        self._images = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, source, size: QSize, grayscale: bool = False):
+        """Get source scaled to size; a QPixmap source gives a QPixmap back."""
+        key = (source.cacheKey(), size.width(), size.height(), grayscale)
+        with self._lock:
+            image = self._images.get(key)
+            if image is not None:
+                self._images.move_to_end(key)
+                return image
+
+        if source.size() == size and not grayscale:
+            image = source
+        else:
+            image = source.toImage() if isinstance(source, QPixmap) else source
+            image = image.scaled(size, Qt.AspectRatioMode.IgnoreAspectRatio,
+                                 Qt.TransformationMode.SmoothTransformation)
+            if grayscale:
+                image = image.convertToFormat(QImage.Format.Format_Grayscale8)
+            if isinstance(source, QPixmap):
+                image = QPixmap.fromImage(image)
+
+        with self._lock:
+            self._images[key] = image
+            if len(self._images) > self.max_entries:
+                self._images.popitem(last=False)
+        return image
+
+    def clear(self):
+        """Drop all resampled backgrounds."""
+        with self._lock:
+            self._images.clear()
+
+
+# Shared between the preview widget and the print renderer
+background_provider = BackgroundProvider()
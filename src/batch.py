@@ -0,0 +1,199 @@
+"""
+Batch files: many checks read from CSV or JSON Lines.
+
+Records are kept as read (plain dicts of strings) and only converted to check
+data, which includes the amount-to-words conversion, when they are used.
+"""
+import csv
+import json
+import os
+import struct
+from typing import Iterator, Optional
+
+from PyQt6.QtCore import QDate
+
+from src.utils import amount_to_words
+
+BATCH_FIELDS = ("amount", "beneficiary", "location", "date")
+MAX_AMOUNT = 999999999
+DATE_FORMATS = ("dd/MM/yyyy", "yyyy-MM-dd", "dd-MM-yyyy")
+BATCH_EXTENSIONS = (".csv", ".jsonl", ".ndjson")
+
+
+def is_jsonl(path: str) -> bool:
+    """Check whether a batch file is JSON Lines rather than CSV."""
+    return path.lower().endswith((".jsonl", ".ndjson"))
+
+
+def read_batch_records(path: str) -> Iterator[dict]:
+    """Read the records of a CSV or JSON Lines batch file."""
+    if is_jsonl(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+    else:
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            sample = f.read(4096)
+            f.seek(0)
+            yield from csv.DictReader(f, dialect=_sniff_dialect(sample))
+
+
+def write_batch(path: str, records: list, fields=BATCH_FIELDS):
+    """Write records to a CSV or JSON Lines batch file, replacing it whole."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+        if is_jsonl(path):
+            for record in records:
+                f.write(json.dumps({name: record.get(name, "") for name in fields},
+                                   ensure_ascii=False) + "\n")
+        else:
+            writer = csv.DictWriter(f, fieldnames=fields, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(records)
+    os.replace(tmp_path, path)
+
+
+def _sniff_dialect(sample: str):
+    try:
+        return csv.Sniffer().sniff(sample, delimiters=",;\t")
+    except csv.Error:
+        return csv.excel
+
+
+class BatchIndex:
+    """Byte offsets of the records of a batch file, for seeking to any record.
+
+    The offsets are stored as fixed-size integers, so finding record N reads
+    8 bytes however large the batch is. CSV records must be one per line (no
+    quoted line breaks), as written by spreadsheets and accounting exports.
+    """
+
+    OFFSET = struct.Struct("<Q")
+
+    def __init__(self, path: str, offsets_path: str):
+        self.path = path
+        self.offsets_path = offsets_path
+
+    @classmethod
+    def build(cls, path: str, offsets_path: str) -> "BatchIndex":
+        """Scan the batch file once and write the offset of every record."""
+        tmp_path = f"{offsets_path}.tmp"
+        with open(path, "rb") as source, open(tmp_path, "wb") as out:
+            header_pending = not is_jsonl(path)
+            offset = 0
+            for line in source:
+                if line.strip():
+                    if header_pending:
+                        header_pending = False
+                    else:
+                        out.write(cls.OFFSET.pack(offset))
+                offset += len(line)
+        os.replace(tmp_path, offsets_path)
+        return cls(path, offsets_path)
+
+    def __len__(self) -> int:
+        return os.path.getsize(self.offsets_path) // self.OFFSET.size
+
+    def offset(self, index: int) -> int:
+        """Get the byte offset of a record."""
+        with open(self.offsets_path, "rb") as f:
+            f.seek(index * self.OFFSET.size)
+            return self.OFFSET.unpack(f.read(self.OFFSET.size))[0]
+
+    def read_from(self, start: int) -> Iterator[tuple]:
+        """Yield (index, record) from record start to the end of the file."""
+        if start >= len(self):
+            return
+        parse = self._line_parser()
+        with open(self.path, "rb") as f:
+            f.seek(self.offset(start))
+            index = start
+            for line in f:
+                text = line.decode("utf-8").strip()
+                if text:
+                    yield index, parse(text)
+                    index += 1
+
+    def _line_parser(self):
+        """Get a function turning one line of the file into a record."""
+        if is_jsonl(self.path):
+            return json.loads
+        with open(self.path, newline="", encoding="utf-8-sig") as f:
+            sample = f.read(4096)
+        dialect = _sniff_dialect(sample)
+        header = next(csv.reader([sample.splitlines()[0]], dialect))
+        return lambda text: dict(zip(header, next(csv.reader([text], dialect))))
+
+
+def load_batch(path: str) -> list:
+    """Read all records of a batch file."""
+    return list(read_batch_records(path))
+
+
+def parse_amount(value) -> float:
+    """Parse an amount written as 11800.5, "11 800,50" or "11,800.50"."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value or "").strip()
+    for space in (" ", "\u00a0", "\u202f"):
+        text = text.replace(space, "")
+    if "," in text and "." in text:
+        # The last separator is the decimal one
+        if text.rfind(",") > text.rfind("."):
+            text = text.replace(".", "").replace(",", ".")
+        else:
+            text = text.replace(",", "")
+    else:
+        text = text.replace(",", ".")
+    return float(text)
+
+
+def parse_date(value) -> QDate:
+    """Parse a date in one of DATE_FORMATS."""
+    if isinstance(value, QDate):
+        return value
+    text = str(value or "").strip()
+    for fmt in DATE_FORMATS:
+        date = QDate.fromString(text, fmt)
+        if date.isValid():
+            return date
+    raise ValueError(f"Date invalide: {text!r}")
+
+
+def _checked_fields(record: dict) -> tuple:
+    """Parse and check the fields of a record. Raises ValueError if it is invalid."""
+    try:
+        amount = parse_amount(record.get("amount"))
+    except ValueError:
+        raise ValueError(f"Montant invalide: {record.get('amount')!r}")
+    if not 0 < amount <= MAX_AMOUNT:
+        raise ValueError(f"Montant hors limites: {amount}")
+
+    beneficiary = str(record.get("beneficiary") or "").strip()
+    if not beneficiary:
+        raise ValueError("Bénéficiaire manquant")
+
+    return amount, beneficiary, parse_date(record.get("date"))
+
+
+def validate_record(record: dict) -> Optional[str]:
+    """Get the error message for an invalid record, or None if it is valid."""
+    try:
+        _checked_fields(record)
+    except ValueError as e:
+        return str(e)
+    return None
+
+
+def record_to_data(record: dict) -> dict:
+    """Convert a batch record to check data. Raises ValueError if it is invalid."""
+    amount, beneficiary, date = _checked_fields(record)
+    return {
+        "amount": amount,
+        "words": str(record.get("words") or "").strip() or amount_to_words(amount, language='fr'),
+        "beneficiary": beneficiary,
+        "location": str(record.get("location") or "").strip(),
+        "date": date
+    }
@@ -0,0 +1,218 @@
+"""
+Virtualized browser for reviewing a batch of checks before printing.
+
+Only rows the view asks for are rendered, on the worker pool, and the
+resulting thumbnails are kept in a memory-bounded LRU cache.
+"""
+import threading
+from collections import OrderedDict
+
+from PyQt6.QtCore import Qt, QAbstractListModel, QModelIndex, QSize, QRectF, pyqtSignal
+from PyQt6.QtGui import QImage, QPainter, QColor
+from PyQt6.QtWidgets import QListView, QWidget, QVBoxLayout, QHBoxLayout
+from qfluentwidgets import StrongBodyLabel, PrimaryPushButton
+
+from src.batch import record_to_data
+from src.models import CHECK_WIDTH_MM, CHECK_HEIGHT_MM
+from src.renderers import CheckRenderer
+from src.utils import format_amount_display
+from src.workers import submit
+
+THUMBNAIL_WIDTH = 280
+THUMBNAIL_SIZE = QSize(THUMBNAIL_WIDTH, round(THUMBNAIL_WIDTH * CHECK_HEIGHT_MM / CHECK_WIDTH_MM))
+
+
+def render_thumbnail(record: dict, background, check_type, size: QSize) -> QImage:
+    """Render one batch record to an image. Safe to call on a worker thread."""
+    image = QImage(size, QImage.Format.Format_ARGB32_Premultiplied)
+    image.fill(QColor(255, 255, 255))
+    painter = QPainter(image)
+    painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+    renderer = CheckRenderer(record_to_data(record), background, check_type)
+    renderer.draw(painter, QRectF(0, 0, size.width(), size.height()), draw_background=True)
+    painter.end()
+    return image
+
+
+class ThumbnailCache:
+    """LRU cache of thumbnails bounded by their total size in bytes."""
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._images = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Get a thumbnail, marking it as recently used."""
+        with self._lock:
+            image = self._images.get(key)
+            if image is not None:
+                self._images.move_to_end(key)
+            return image
+
+    def put(self, key, image: QImage):
+        """Add a thumbnail, evicting the least recently used ones over budget."""
+        with self._lock:
+            old = self._images.pop(key, None)
+            if old is not None:
+                self._bytes -= old.sizeInBytes()
+            self._images[key] = image
+            self._bytes += image.sizeInBytes()
+            while self._bytes > self.max_bytes and len(self._images) > 1:
+                _, evicted = self._images.popitem(last=False)
+                self._bytes -= evicted.sizeInBytes()
+
+    def clear(self):
+        """Drop all thumbnails."""
+        with self._lock:
+            self._images.clear()
+            self._bytes = 0
+
+
+class BatchListModel(QAbstractListModel):
+    """List model over batch records with lazily rendered thumbnails."""
+
+    def __init__(self, records: list, background=None, check_type=None, parent=None):
+        super().__init__(parent)
+        self.records = records
+        self.background = background
+        self.check_type = check_type
+        self.thumbnails = ThumbnailCache()
+        self._pending = {}
+        self._failed = set()
+        self._placeholder = QImage(THUMBNAIL_SIZE, QImage.Format.Format_ARGB32_Premultiplied)
+        self._placeholder.fill(QColor(240, 248, 255))
+        self._error_placeholder = QImage(THUMBNAIL_SIZE, QImage.Format.Format_ARGB32_Premultiplied)
+        self._error_placeholder.fill(QColor(253, 231, 233))
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.records)
+
+    def data(self, index: QModelIndex, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        row = index.row()
+        if role == Qt.ItemDataRole.DisplayRole:
+            record = self.records[row]
+            return f"#{row + 1}  {record.get('beneficiary', '')}  {record.get('amount', '')}"
+        if role == Qt.ItemDataRole.DecorationRole:
+            if row in self._failed:
+                return self._error_placeholder
+            thumbnail = self.thumbnails.get((row, self.check_type))
+            if thumbnail is None:
+                self._request_thumbnail(row)
+                return self._placeholder
+            return thumbnail
+        if role == Qt.ItemDataRole.ToolTipRole:
+            try:
+                data = record_to_data(self.records[row])
+            except ValueError as e:
+                return f"Erreur: {e}"
+            return f"{format_amount_display(data['amount'])} DA — {data['words']}"
+        return None
+
+    def set_template(self, background, check_type):
+        """Switch the template; thumbnails are re-rendered on demand."""
+        self.background = background
+        self.check_type = check_type
+        self.cancel_pending()
+        if self.records:
+            self.dataChanged.emit(self.index(0), self.index(len(self.records) - 1),
+                                  [Qt.ItemDataRole.DecorationRole])
+
+    def cancel_outside(self, first: int, last: int):
+        """Cancel queued renders for rows that scrolled out of view."""
+        for row in [r for r in self._pending if r < first or r > last]:
+            if self._pending[row].cancel():
+                del self._pending[row]
+
+    def cancel_pending(self):
+        """Cancel every queued render."""
+        for future in self._pending.values():
+            future.cancel()
+        self._pending.clear()
+
+    def _request_thumbnail(self, row: int):
+        """Queue a render for row unless one is already queued."""
+        if row in self._pending:
+            return
+        key = (row, self.check_type)
+        self._pending[row] = submit(
+            render_thumbnail, self.records[row], self.background, self.check_type, THUMBNAIL_SIZE,
+            on_done=lambda f: self._on_thumbnail(key, f)
+        )
+
+    def _on_thumbnail(self, key, future):
+        """Store a finished thumbnail and repaint its row."""
+        row, check_type = key
+        if self._pending.get(row) is future:
+            del self._pending[row]
+        if future.cancelled():
+            return
+        try:
+            image = future.result()
+        except Exception as e:
+            print(f"[BATCH] Could not render row {row + 1}: {e}")
+            self._failed.add(row)
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [Qt.ItemDataRole.DecorationRole])
+            return
+        self.thumbnails.put(key, image)
+        if check_type == self.check_type and row < len(self.records):
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [Qt.ItemDataRole.DecorationRole])
+
+
+class BatchBrowser(QWidget):
+    """Scrollable grid of check thumbnails for a whole batch."""
+
+    printRequested = pyqtSignal()
+
+    def __init__(self, records: list, background=None, check_type=None, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Aperçu du lot (Batch Preview)")
+        self.resize(960, 640)
+
+        self.model = BatchListModel(records, background, check_type, self)
+
+        self.view = QListView()
+        self.view.setViewMode(QListView.ViewMode.IconMode)
+        self.view.setResizeMode(QListView.ResizeMode.Adjust)
+        self.view.setMovement(QListView.Movement.Static)
+        self.view.setUniformItemSizes(True)
+        self.view.setIconSize(THUMBNAIL_SIZE)
+        self.view.setGridSize(QSize(THUMBNAIL_SIZE.width() + 16, THUMBNAIL_SIZE.height() + 36))
+        self.view.setModel(self.model)
+        self.view.verticalScrollBar().valueChanged.connect(self.on_scrolled)
+
+        self.btn_print = PrimaryPushButton("Imprimer le lot (Print Batch)")
+        self.btn_print.clicked.connect(self.printRequested)
+
+        header = QHBoxLayout()
+        header.addWidget(StrongBodyLabel(f"{len(records)} chèques"))
+        header.addStretch(1)
+        header.addWidget(self.btn_print)
+
+        layout = QVBoxLayout(self)
+        layout.addLayout(header)
+        layout.addWidget(self.view)
+
+    def visible_rows(self) -> tuple:
+        """Get the first and last rows currently in the viewport."""
+        viewport = self.view.viewport().rect()
+        first = self.view.indexAt(viewport.topLeft())
+        last = self.view.indexAt(viewport.bottomRight())
+        first_row = first.row() if first.isValid() else 0
+        last_row = last.row() if last.isValid() else self.model.rowCount() - 1
+        return first_row, last_row
+
+    def on_scrolled(self):
+        """Drop renders queued for rows that are no longer visible."""
+        self.model.cancel_outside(*self.visible_rows())
+
+    def closeEvent(self, event):
+        """Stop rendering when the browser is closed."""
+        self.model.cancel_pending()
+        self.model.thumbnails.clear()
+        super().closeEvent(event)
@@ -0,0 +1,185 @@
+"""
+Resumable batch print jobs.
+
+A batch is rendered through the staged pipeline and printed as a series of
+small spool jobs. After each one has been handed to the spooler a checkpoint
+is written, so an interrupted run (paper jam, crash, power cut) resumes from
+the first check that was not spooled.
+Resuming seeks straight to that record through the batch index; nothing
+before it is read or rendered again.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, field, asdict
+from typing import Optional
+
+from PyQt6.QtGui import QPainter
+
+from src.batch import BatchIndex
+from src.pipeline import BatchPipeline
+from src.print_profiles import PrintProfile
+from src.renderers import get_check_rect
+from src.utils import get_data_dir
+
+JOBS_DIR = "jobs"
+
+
+@dataclass
+class Checkpoint:
+    """Durable progress of a batch print job."""
+    job_id: str
+    input_path: str
+    check_type: Optional[str]
+    total: int
+    next_index: int = 0
+    pages_spooled: int = 0
+    # record index (as a string, for JSON) -> validation error
+    errors: dict = field(default_factory=dict)
+    updated: float = 0.0
+
+    @property
+    def finished(self) -> bool:
+        return self.next_index >= self.total
+
+    def save(self, path: str):
+        """Write the checkpoint atomically and flush it to disk."""
+        self.updated = time.time()
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(asdict(self), f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["Checkpoint"]:
+        """Read a checkpoint, or None if there is no usable one."""
+        try:
+            with open(path, encoding="utf-8") as f:
+                return cls(**json.load(f))
+        except (OSError, ValueError, TypeError):
+            return None
+
+
+def job_id_for(path: str, name: Optional[str] = None) -> str:
+    """Identify a batch by its path (or a stable name) and the current version of the file."""
+    stat = os.stat(path)
+    key = f"{name or os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+class BatchPrintJob:
+    """Prints a batch file in spool-sized chunks with a checkpoint after each."""
+
+    def __init__(self, input_path: str, check_type: Optional[str] = None, background=None,
+                 pages_per_spool: int = 1, jobs_dir: Optional[str] = None,
+                 job_id: Optional[str] = None, profile: Optional[PrintProfile] = None):
+        self.input_path = os.path.abspath(input_path)
+        self.check_type = check_type
+        # Template image for test prints; None prints the overlay only
+        self.background = background
+        # Calibration offset and grayscale choice; None prints at the page origin
+        self.profile = profile
+        self.pages_per_spool = max(1, pages_per_spool)
+
+        jobs_dir = jobs_dir or get_data_dir(JOBS_DIR)
+        self.job_id = job_id or job_id_for(self.input_path)
+        self.checkpoint_path = os.path.join(jobs_dir, f"{self.job_id}.json")
+        self.index_path = os.path.join(jobs_dir, f"{self.job_id}.idx")
+        self.checkpoint = None
+        self.pipeline = None
+        self._stop = threading.Event()
+
+    def prepare(self) -> Checkpoint:
+        """Load the checkpoint, indexing the batch file the first time."""
+        if self.checkpoint is not None:
+            return self.checkpoint
+        checkpoint = Checkpoint.load(self.checkpoint_path)
+        if checkpoint is None or not os.path.exists(self.index_path):
+            index = BatchIndex.build(self.input_path, self.index_path)
+            checkpoint = Checkpoint(self.job_id, self.input_path, self.check_type, len(index))
+            checkpoint.save(self.checkpoint_path)
+        self.checkpoint = checkpoint
+        return checkpoint
+
+    def discard(self):
+        """Delete the checkpoint and index of a job that no longer needs resuming."""
+        for path in (self.checkpoint_path, self.index_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def stop(self):
+        """Stop after the spool job in progress; the run can be resumed later."""
+        self._stop.set()
+        if self.pipeline is not None:
+            self.pipeline.stop()
+
+    def run(self, printer, start: Optional[int] = None) -> Checkpoint:
+        """Print from start (default: the checkpoint) to the end of the batch."""
+        checkpoint = self.prepare()
+        if start is not None:
+            checkpoint.next_index = max(0, min(start, checkpoint.total))
+            checkpoint.save(self.checkpoint_path)
+        self._stop.clear()
+
+        records = BatchIndex(self.input_path, self.index_path).read_from(checkpoint.next_index)
+        self.pipeline = BatchPipeline(records, self.check_type, self.background,
+                                      dpi=printer.logicalDpiY())
+        self._painter = QPainter()
+        self._chunk_pages = 0
+        try:
+            self.pipeline.run(lambda page: self._spool_page(printer, page, checkpoint),
+                              lambda failed: self._close(printer, checkpoint, failed))
+        finally:
+            self.pipeline = None
+        return checkpoint
+
+    def _close(self, printer, checkpoint: Checkpoint, failed: bool):
+        """End the last spool job, or abort it if the run failed."""
+        if not failed:
+            self._end_spool(checkpoint)
+        elif self._painter.isActive():
+            printer.abort()
+            self._painter.end()
+
+    def _spool_page(self, printer, page, checkpoint: Checkpoint):
+        """Add a rendered page to the current spool job, ending it once full."""
+        if self._stop.is_set() and not self._painter.isActive():
+            return
+        if page.error is not None:
+            checkpoint.errors[str(page.index)] = page.error
+        else:
+            if not self._painter.isActive():
+                printer.setDocName(f"Chèques {page.index + 1}+ ({self.job_id})")
+                if not self._painter.begin(printer):
+                    raise RuntimeError("Failed to initialize painter")
+            else:
+                printer.newPage()
+            page.renderer.draw(self._painter, self._check_rect(printer),
+                               draw_background=self.background is not None,
+                               grayscale=self.profile is not None and self.profile.grayscale,
+                               layout=page.layout)
+            self._chunk_pages += 1
+        checkpoint.next_index = page.index + 1
+        if self._chunk_pages >= self.pages_per_spool or not self._painter.isActive():
+            self._end_spool(checkpoint)
+
+    def _check_rect(self, printer):
+        if self.profile is not None:
+            return self.profile.check_rect(printer)
+        return get_check_rect(printer)
+
+    def _end_spool(self, checkpoint: Checkpoint):
+        """End the spool job in progress and record it in the checkpoint."""
+        if self._painter.isActive():
+            # Ending the painter hands the pages to the spooler
+            self._painter.end()
+            checkpoint.pages_spooled += self._chunk_pages
+            print(f"[BATCH PRINT] {self.job_id}: {checkpoint.next_index}/{checkpoint.total}")
+        self._chunk_pages = 0
+        checkpoint.save(self.checkpoint_path)
@@ -0,0 +1,386 @@
+"""
+Spreadsheet-style grid for keying many checks.
+
+Cells live in a columnar store (one list of strings per field). Rows are
+validated on demand when the view asks for them and re-validated only when
+they are edited, so the grid stays responsive with tens of thousands of rows.
+The keyed rows can be saved as a batch file or printed as a batch job.
+"""
+import os
+import tempfile
+
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex, pyqtSignal
+from PyQt6.QtGui import QColor, QKeySequence
+from PyQt6.QtWidgets import (
+    QApplication, QTableView, QWidget, QVBoxLayout, QHBoxLayout, QAbstractItemView, QHeaderView,
+    QFileDialog
+)
+from qfluentwidgets import (
+    StrongBodyLabel, BodyLabel, PushButton, PrimaryPushButton, InfoBar, InfoBarPosition, MessageBox
+)
+
+from src.batch import BATCH_FIELDS, validate_record, write_batch
+from src.utils import get_data_dir
+
+COLUMN_TITLES = {
+    "amount": "Montant (DA)",
+    "beneficiary": "Bénéficiaire",
+    "location": "Lieu",
+    "date": "Date",
+}
+
+INVALID_COLOR = QColor(253, 231, 233)
+# Rows sent to the printer are written here while they print
+ENTRY_DIR = "entry"
+
+
+class ColumnStore:
+    """Check records stored column by column."""
+
+    def __init__(self, fields=BATCH_FIELDS):
+        self.fields = tuple(fields)
+        self.columns = {name: [] for name in self.fields}
+
+    def __len__(self) -> int:
+        return len(self.columns[self.fields[0]])
+
+    def get(self, row: int, column: int) -> str:
+        return self.columns[self.fields[column]][row]
+
+    def set(self, row: int, column: int, value: str):
+        self.columns[self.fields[column]][row] = value
+
+    def append_rows(self, count: int, default: str = ""):
+        for values in self.columns.values():
+            values.extend([default] * count)
+
+    def remove_rows(self, row: int, count: int):
+        for values in self.columns.values():
+            del values[row:row + count]
+
+    def record(self, row: int) -> dict:
+        """Get a row as a batch record."""
+        return {name: self.columns[name][row] for name in self.fields}
+
+
+class CheckTableModel(QAbstractTableModel):
+    """Editable table model over a ColumnStore with cached row validation."""
+
+    def __init__(self, store: ColumnStore = None, parent=None):
+        super().__init__(parent)
+        self.store = store or ColumnStore()
+        # row -> error message or None; missing rows have not been validated yet
+        self._errors = {}
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.store)
+
+    def columnCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.store.fields)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if orientation == Qt.Orientation.Horizontal:
+            return COLUMN_TITLES.get(self.store.fields[section], self.store.fields[section])
+        return str(section + 1)
+
+    def flags(self, index: QModelIndex):
+        if not index.isValid():
+            return Qt.ItemFlag.NoItemFlags
+        return Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsSelectable | Qt.ItemFlag.ItemIsEditable
+
+    def data(self, index: QModelIndex, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        row = index.row()
+        if role in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.EditRole):
+            return self.store.get(row, index.column())
+        if role == Qt.ItemDataRole.BackgroundRole:
+            return INVALID_COLOR if self.row_error(row) else None
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return self.row_error(row)
+        return None
+
+    def setData(self, index: QModelIndex, value, role=Qt.ItemDataRole.EditRole) -> bool:
+        if not index.isValid() or role != Qt.ItemDataRole.EditRole:
+            return False
+        self.store.set(index.row(), index.column(), str(value).strip())
+        self._invalidate_rows(index.row(), index.row())
+        return True
+
+    def row_error(self, row: int):
+        """Get the validation error of a row, validating it on first use."""
+        if row not in self._errors:
+            record = self.store.record(row)
+            if any(record.values()):
+                self._errors[row] = validate_record(record)
+            else:
+                # Blank rows are not errors, just unused
+                self._errors[row] = None
+        return self._errors[row]
+
+    def invalid_rows(self) -> list:
+        """Get every row that fails validation, reusing cached results."""
+        return [row for row in range(len(self.store)) if self.row_error(row)]
+
+    def filled_records(self) -> list:
+        """Get the non-blank rows as batch records."""
+        records = (self.store.record(row) for row in range(len(self.store)))
+        return [record for record in records if any(record.values())]
+
+    def append_rows(self, count: int = 1):
+        """Add blank rows at the end."""
+        first = len(self.store)
+        self.beginInsertRows(QModelIndex(), first, first + count - 1)
+        self.store.append_rows(count)
+        self.endInsertRows()
+
+    def remove_rows(self, row: int, count: int = 1):
+        """Remove rows, shifting cached validation results."""
+        count = min(count, len(self.store) - row)
+        if row < 0 or count <= 0:
+            return
+        self.beginRemoveRows(QModelIndex(), row, row + count - 1)
+        self.store.remove_rows(row, count)
+        self._errors = {r - count if r >= row + count else r: error
+                        for r, error in self._errors.items() if not row <= r < row + count}
+        self.endRemoveRows()
+
+    def paste_rows(self, row: int, column: int, rows: list):
+        """Write a block of cells starting at (row, column), adding rows as needed."""
+        if not rows:
+            return
+        missing = row + len(rows) - len(self.store)
+        if missing > 0:
+            self.append_rows(missing)
+
+        last_column = column
+        for r, values in enumerate(rows, start=row):
+            for c, value in enumerate(values[:len(self.store.fields) - column], start=column):
+                self.store.set(r, c, value.strip())
+                last_column = max(last_column, c)
+        self._invalidate_rows(row, row + len(rows) - 1, last_column)
+
+    def _invalidate_rows(self, first: int, last: int, last_column: int = None):
+        """Forget validation for edited rows and repaint them."""
+        for row in range(first, last + 1):
+            self._errors.pop(row, None)
+        if last_column is None:
+            last_column = len(self.store.fields) - 1
+        self.dataChanged.emit(self.index(first, 0), self.index(last, last_column))
+
+
+class EntryGridView(QTableView):
+    """Table view tuned for keyboard-only entry and clipboard paste."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setEditTriggers(
+            QAbstractItemView.EditTrigger.AnyKeyPressed
+            | QAbstractItemView.EditTrigger.EditKeyPressed
+            | QAbstractItemView.EditTrigger.DoubleClicked
+        )
+        self.setSelectionMode(QAbstractItemView.SelectionMode.ContiguousSelection)
+        self.setWordWrap(False)
+        # Fixed row heights so the view never measures rows it does not show
+        self.verticalHeader().setDefaultSectionSize(28)
+        self.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+        self.horizontalHeader().setStretchLastSection(True)
+
+    def keyPressEvent(self, event):
+        """Paste, clear cells or delete rows, and move down (adding a row) on Enter."""
+        model = self.model()
+        index = self.currentIndex()
+        if event.matches(QKeySequence.StandardKey.Paste):
+            self.paste_clipboard()
+            return
+        if (event.key() == Qt.Key.Key_Delete and event.modifiers() & Qt.KeyboardModifier.ControlModifier
+                and self.state() != QAbstractItemView.State.EditingState):
+            self.delete_rows()
+            return
+        if event.key() in (Qt.Key.Key_Delete, Qt.Key.Key_Backspace) and self.state() != QAbstractItemView.State.EditingState:
+            for selected in self.selectedIndexes():
+                model.setData(selected, "")
+            return
+        if event.key() in (Qt.Key.Key_Return, Qt.Key.Key_Enter) and self.state() != QAbstractItemView.State.EditingState:
+            if index.isValid():
+                if index.row() == model.rowCount() - 1:
+                    model.append_rows(1)
+                self.setCurrentIndex(model.index(index.row() + 1, 0))
+            return
+        super().keyPressEvent(event)
+
+    def delete_rows(self):
+        """Delete the selected rows, or the current one, keeping at least one row."""
+        model = self.model()
+        rows = sorted({selected.row() for selected in self.selectedIndexes()})
+        if not rows and self.currentIndex().isValid():
+            rows = [self.currentIndex().row()]
+        if not rows:
+            return
+        # The selection is contiguous
+        model.remove_rows(rows[0], rows[-1] - rows[0] + 1)
+        if model.rowCount() == 0:
+            model.append_rows(1)
+        column = max(self.currentIndex().column(), 0)
+        self.setCurrentIndex(model.index(min(rows[0], model.rowCount() - 1), column))
+
+    def paste_clipboard(self):
+        """Paste tab-separated rows (e.g. from a spreadsheet) at the current cell."""
+        text = QApplication.clipboard().text()
+        if not text:
+            return
+        rows = [line.split("\t") for line in text.rstrip("\r\n").splitlines()]
+        index = self.currentIndex()
+        row = index.row() if index.isValid() else 0
+        column = index.column() if index.isValid() else 0
+        self.model().paste_rows(row, column, rows)
+
+
+class BulkEntryWindow(QWidget):
+    """Window with the entry grid; emits the record under the cursor."""
+
+    currentRecordChanged = pyqtSignal(dict)
+    # Path of a new batch file holding the rows to print; the receiver deletes it
+    printRequested = pyqtSignal(str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Saisie en lot (Bulk Entry)")
+        self.resize(820, 600)
+
+        self.model = CheckTableModel()
+        self.model.append_rows(20)
+
+        self.view = EntryGridView()
+        self.view.setModel(self.model)
+        self.view.selectionModel().currentRowChanged.connect(self.on_current_row_changed)
+        self.model.dataChanged.connect(self.on_data_changed)
+        self.model.dataChanged.connect(self.mark_modified)
+        self.model.rowsRemoved.connect(self.mark_modified)
+        self.saved_path = None
+        self.modified = False
+
+        self.lbl_status = BodyLabel("")
+        self.btn_check = PushButton("Vérifier (Validate)")
+        self.btn_check.clicked.connect(self.update_status)
+        self.btn_save = PushButton("Enregistrer (Save)…")
+        self.btn_save.clicked.connect(self.save_rows)
+        self.btn_print = PrimaryPushButton("Imprimer ces lignes (Print)")
+        self.btn_print.clicked.connect(self.print_rows)
+
+        bottom = QHBoxLayout()
+        bottom.addWidget(self.lbl_status)
+        bottom.addStretch(1)
+        bottom.addWidget(self.btn_check)
+        bottom.addWidget(self.btn_save)
+        bottom.addWidget(self.btn_print)
+
+        layout = QVBoxLayout(self)
+        layout.addWidget(StrongBodyLabel(
+            "Saisie des chèques — Entrée: ligne suivante, Ctrl+V: coller, Ctrl+Suppr: supprimer la ligne"))
+        layout.addWidget(self.view)
+        layout.addLayout(bottom)
+        self.view.setCurrentIndex(self.model.index(0, 0))
+
+    def on_current_row_changed(self, current, previous):
+        """Send the newly current row to the preview."""
+        if current.isValid():
+            self.currentRecordChanged.emit(self.model.store.record(current.row()))
+
+    def on_data_changed(self, top_left, bottom_right, roles=()):
+        """Refresh the preview when the current row is edited."""
+        row = self.view.currentIndex().row()
+        if top_left.row() <= row <= bottom_right.row():
+            self.currentRecordChanged.emit(self.model.store.record(row))
+
+    def update_status(self):
+        """Count filled and invalid rows."""
+        invalid = self.model.invalid_rows()
+        filled = len(self.model.filled_records())
+        self.lbl_status.setText(f"{filled} chèques, {len(invalid)} erreurs")
+        if invalid:
+            self.view.setCurrentIndex(self.model.index(invalid[0], 0))
+
+    def mark_modified(self, *args):
+        """Note that rows changed since they were last saved."""
+        self.modified = True
+
+    def save_rows(self) -> bool:
+        """Save the filled rows as a CSV or JSON Lines batch file; False if not saved."""
+        path, selected = QFileDialog.getSaveFileName(
+            self, "Enregistrer la saisie", self.saved_path or "",
+            "CSV (*.csv);;JSON Lines (*.jsonl)"
+        )
+        if not path:
+            return False
+        if not os.path.splitext(path)[1]:
+            path += ".jsonl" if "jsonl" in selected else ".csv"
+        try:
+            write_batch(path, self.model.filled_records())
+        except OSError as e:
+            self._show_error(f"Impossible d'enregistrer la saisie: {str(e)}")
+            return False
+        self.saved_path = path
+        self.modified = False
+        InfoBar.success(
+            title='Succès',
+            content=f"Saisie enregistrée dans {os.path.basename(path)}.",
+            orient=Qt.Orientation.Horizontal,
+            isClosable=True,
+            position=InfoBarPosition.TOP,
+            duration=2000,
+            parent=self
+        )
+        return True
+
+    def print_rows(self):
+        """Write the filled rows to a batch file and ask for it to be printed."""
+        self.update_status()
+        if self.model.invalid_rows():
+            self._show_error("Corrigez les lignes en rouge avant d'imprimer.")
+            return
+        records = self.model.filled_records()
+        if not records:
+            self._show_error("Aucune ligne à imprimer.")
+            return
+        path = None
+        try:
+            # A file of its own per print, so a second print never touches one still printing
+            fd, path = tempfile.mkstemp(prefix="saisie-", suffix=".csv", dir=get_data_dir(ENTRY_DIR))
+            os.close(fd)
+            write_batch(path, records)
+        except OSError as e:
+            if path is not None and os.path.exists(path):
+                os.remove(path)
+            self._show_error(f"Impossible de préparer l'impression: {str(e)}")
+            return
+        print(f"[BULK ENTRY] {len(records)} rows written to {path}")
+        self.printRequested.emit(path)
+
+    def closeEvent(self, event):
+        """Offer to save rows that were keyed or edited since the last save."""
+        if self.modified and self.model.filled_records():
+            box = MessageBox(
+                "Saisie non enregistrée",
+                "Les lignes saisies n'ont pas été enregistrées. Les enregistrer avant de fermer ?",
+                self
+            )
+            box.yesButton.setText("Enregistrer")
+            box.cancelButton.setText("Fermer sans enregistrer")
+            if box.exec() and not self.save_rows():
+                event.ignore()
+                return
+        super().closeEvent(event)
+
+    def _show_error(self, message: str):
+        InfoBar.error(
+            title='Erreur',
+            content=message,
+            orient=Qt.Orientation.Horizontal,
+            isClosable=True,
+            position=InfoBarPosition.TOP,
+            duration=3000,
+            parent=self
+        )
@@ -0,0 +1,58 @@
+"""
+Bundled font loading for identical check layout on every machine.
+"""
+import os
+from PyQt6.QtGui import QFont, QFontDatabase
+
+from src.utils import get_resource_path
+
+FONTS_DIR = "fonts"
+
+# Metric-compatible replacements for the families the templates were laid out with
+FAMILY_SUBSTITUTES = {
+    "Arial": "Liberation Sans",
+    "Courier New": "Liberation Mono",
+}
+
+_registered_families = set()
+_font_cache = {}
+
+
+def load_bundled_fonts() -> list:
+    """Register the fonts shipped in the fonts directory. Call once at startup."""
+    fonts_dir = get_resource_path(FONTS_DIR)
+    if not os.path.isdir(fonts_dir):
+        return []
+
+    for filename in sorted(os.listdir(fonts_dir)):
+        if not filename.lower().endswith((".ttf", ".otf")):
+            continue
+        font_id = QFontDatabase.addApplicationFont(os.path.join(fonts_dir, filename))
+        if font_id == -1:
+            print(f"[FONTS] Could not load {filename}")
+            continue
+        _registered_families.update(QFontDatabase.applicationFontFamilies(font_id))
+
+    # Fonts built before registration may have resolved to a fallback
+    _font_cache.clear()
+    return sorted(_registered_families)
+
+
+def resolve_family(family: str) -> str:
+    """Get the bundled substitute for a family, if one was registered."""
+    substitute = FAMILY_SUBSTITUTES.get(family)
+    if substitute in _registered_families:
+        return substitute
+    return family
+
+
+def get_font(family: str, point_size: float, weight=QFont.Weight.Normal) -> QFont:
+    """Get a shared font, built once per family, size and weight. Do not modify it."""
+    key = (family, point_size, weight)
+    font = _font_cache.get(key)
+    if font is None:
+        font = QFont(resolve_family(family))
+        font.setPointSizeF(point_size)
+        font.setWeight(weight)
+        _font_cache[key] = font
+    return font
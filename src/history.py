@@ -0,0 +1,250 @@
+"""
+Issued-check history and autocomplete for beneficiaries and locations.
+
+Names are kept in a sorted prefix index (accent- and case-insensitive). Short
+prefixes, which match the most names, keep their most used names up to date as
+names are added; longer prefixes rank their matches found by binary search.
+The history itself is stored in SQLite; loading and writing it happen on the
+worker pool.
+"""
+import bisect
+import heapq
+import os
+import sqlite3
+import time
+import unicodedata
+from typing import Optional
+
+from PyQt6.QtCore import Qt, QStringListModel
+from PyQt6.QtWidgets import QCompleter
+
+from src.utils import get_data_dir, get_resource_path
+from src.workers import submit, when_done
+
+HISTORY_DB = "history.db"
+PAYEE_LIST = "payees.txt"
+HISTORY_KINDS = ("beneficiary", "location")
+# Prefixes up to this length keep their TOP_NAMES most used names
+TOP_PREFIX_LENGTH = 3
+TOP_NAMES = 20
+
+
+def normalize_key(text: str) -> str:
+    """Fold case and strip accents so "benali" matches "Bénali"."""
+    decomposed = unicodedata.normalize("NFKD", text.strip().casefold())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+class PrefixIndex:
+    """Sorted index of names for prefix lookups ranked by use count."""
+
+    def __init__(self):
+        self._keys = []
+        # key -> [display name, use count]
+        self._entries = {}
+        # short prefix -> keys of its most used names, most used first
+        self._top = {}
+
+    @classmethod
+    def from_counts(cls, counts: dict) -> "PrefixIndex":
+        """Build an index in one pass from {name: count}."""
+        index = cls()
+        for name, count in counts.items():
+            key = normalize_key(name)
+            if not key:
+                continue
+            entry = index._entries.get(key)
+            if entry is None:
+                index._entries[key] = [name, count]
+            else:
+                entry[1] += count
+        index._keys = sorted(index._entries)
+        by_prefix = {}
+        for key in index._keys:
+            for prefix in _short_prefixes(key):
+                by_prefix.setdefault(prefix, []).append(key)
+        for prefix, keys in by_prefix.items():
+            index._top[prefix] = heapq.nsmallest(TOP_NAMES, keys, key=index._rank)
+        return index
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _rank(self, key: str) -> tuple:
+        """Sort key: most used first, then alphabetical."""
+        return -self._entries[key][1], key
+
+    def add(self, name: str, count: int = 1):
+        """Add a use of name, inserting it if it is new."""
+        key = normalize_key(name)
+        if not key:
+            return
+        entry = self._entries.get(key)
+        if entry is None:
+            self._entries[key] = [name.strip(), count]
+            bisect.insort(self._keys, key)
+        else:
+            entry[0] = name.strip()
+            entry[1] += count
+        # Counts only grow, so a name can only move up in its prefixes' lists
+        for prefix in _short_prefixes(key):
+            top = self._top.setdefault(prefix, [])
+            if key not in top:
+                if len(top) >= TOP_NAMES and self._rank(key) >= self._rank(top[-1]):
+                    continue
+                top.append(key)
+            top.sort(key=self._rank)
+            del top[TOP_NAMES:]
+
+    def merge(self, other: "PrefixIndex"):
+        """Add every entry of another index."""
+        for key in other._keys:
+            name, count = other._entries[key]
+            self.add(name, count)
+
+    def suggest(self, prefix: str, limit: int = 10) -> list:
+        """Get up to limit names starting with prefix, most used first."""
+        key = normalize_key(prefix)
+        if not key:
+            return []
+        if len(key) <= TOP_PREFIX_LENGTH and limit <= TOP_NAMES:
+            keys = self._top.get(key, [])[:limit]
+        else:
+            start = bisect.bisect_left(self._keys, key)
+            end = bisect.bisect_left(self._keys, key + "\U0010ffff", start)
+            keys = heapq.nsmallest(limit, self._keys[start:end], key=self._rank)
+        return [self._entries[k][0] for k in keys]
+
+
+def _short_prefixes(key: str) -> list:
+    return [key[:length] for length in range(1, min(len(key), TOP_PREFIX_LENGTH) + 1)]
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    connection = sqlite3.connect(path)
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS names ("
+        " kind TEXT NOT NULL, name TEXT NOT NULL, uses INTEGER NOT NULL DEFAULT 0,"
+        " last_used REAL, PRIMARY KEY (kind, name))"
+    )
+    return connection
+
+
+def _read_counts(db_path: str, payee_list: Optional[str]) -> dict:
+    """Read {kind: {name: count}} from the database and the payee list."""
+    counts = {kind: {} for kind in HISTORY_KINDS}
+    if payee_list and os.path.exists(payee_list):
+        with open(payee_list, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    counts["beneficiary"].setdefault(line.strip(), 0)
+    connection = _connect(db_path)
+    try:
+        for kind, name, uses in connection.execute("SELECT kind, name, uses FROM names"):
+            if kind in counts:
+                counts[kind][name] = counts[kind].get(name, 0) + uses
+    finally:
+        connection.close()
+    return counts
+
+
+def _build_indexes(db_path: str, payee_list: Optional[str]) -> dict:
+    counts = _read_counts(db_path, payee_list)
+    return {kind: PrefixIndex.from_counts(counts[kind]) for kind in HISTORY_KINDS}
+
+
+def _write_uses(db_path: str, uses: list):
+    connection = _connect(db_path)
+    try:
+        with connection:
+            connection.executemany(
+                "INSERT INTO names (kind, name, uses, last_used) VALUES (?, ?, 1, ?) "
+                "ON CONFLICT (kind, name) DO UPDATE SET uses = uses + 1, last_used = excluded.last_used",
+                uses
+            )
+    finally:
+        connection.close()
+
+
+class CheckHistory:
+    """Beneficiary and location history feeding the autocomplete indexes."""
+
+    def __init__(self, db_path: Optional[str] = None, payee_list: Optional[str] = None):
+        self.db_path = db_path or os.path.join(get_data_dir(), HISTORY_DB)
+        self.payee_list = payee_list or get_resource_path(PAYEE_LIST)
+        self.indexes = {kind: PrefixIndex() for kind in HISTORY_KINDS}
+        self.loaded = False
+        self._loading = False
+        # Uses recorded while loading; written once the load has read the database
+        self._pending_uses = []
+
+    def load_async(self):
+        """Build the indexes on the worker pool and swap them in when ready."""
+        self._loading = True
+        future = submit(_build_indexes, self.db_path, self.payee_list)
+        when_done(future, self._on_loaded)
+        return future
+
+    def _on_loaded(self, future):
+        self._loading = False
+        try:
+            indexes = future.result()
+        except (OSError, sqlite3.Error) as e:
+            print(f"[HISTORY] Could not load history: {e}")
+        else:
+            # Keep names recorded while the history was loading; the loaded
+            # indexes do not count them, since their writes were held back
+            for kind, index in indexes.items():
+                index.merge(self.indexes[kind])
+            self.indexes = indexes
+            self.loaded = True
+        uses, self._pending_uses = self._pending_uses, []
+        self._write(uses)
+
+    def suggest(self, kind: str, prefix: str, limit: int = 10) -> list:
+        """Get names of the given kind starting with prefix."""
+        return self.indexes[kind].suggest(prefix, limit)
+
+    def record_issued(self, data: dict):
+        """Record the names on an issued check; the database write is queued."""
+        now = time.time()
+        uses = []
+        for kind in HISTORY_KINDS:
+            name = str(data.get(kind) or "").strip()
+            if name:
+                self.indexes[kind].add(name)
+                uses.append((kind, name, now))
+        if self._loading:
+            self._pending_uses.extend(uses)
+        else:
+            self._write(uses)
+
+    def _write(self, uses: list):
+        if uses:
+            future = submit(_write_uses, self.db_path, uses)
+            when_done(future, self._on_written)
+
+    def _on_written(self, future):
+        if future.exception() is not None:
+            print(f"[HISTORY] Could not save history: {future.exception()}")
+
+
+class HistoryCompleter(QCompleter):
+    """Completer that asks the history index for suggestions as the user types."""
+
+    def __init__(self, history: CheckHistory, kind: str, line_edit):
+        super().__init__(line_edit)
+        self.history = history
+        self.kind = kind
+        self._model = QStringListModel(self)
+        self.setModel(self._model)
+        self.setCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
+        # Matching (accent-insensitive) is done by the index, not by QCompleter
+        self.setCompletionMode(QCompleter.CompletionMode.UnfilteredPopupCompletion)
+        # Connected before the line edit's own completer handling runs
+        line_edit.textEdited.connect(self.update_suggestions)
+        line_edit.setCompleter(self)
+
+    def update_suggestions(self, text: str):
+        """Replace the suggestion list for the current text."""
+        self._model.setStringList(self.history.suggest(self.kind, text) if text else [])
@@ -0,0 +1,271 @@
+"""
+Hot folder: print batch files dropped into a spool directory.
+
+    spool/               files are dropped here (write *.tmp, then rename)
+    spool/processing/    claimed files, renamed to "<host>-<pid>~<name>"
+    spool/done/          printed files, each with a <name>.result.json manifest
+    spool/failed/        files that could not be printed, with their manifest
+
+A file is claimed by renaming it into processing/. The rename is atomic, so
+when several watchers share a folder exactly one of them gets each file.
+Files left in processing/ by a watcher that died on this host are taken over
+and resume from their print checkpoint.
+"""
+import argparse
+import json
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Optional
+
+from PyQt6.QtCore import QFileSystemWatcher, QObject, QTimer
+from PyQt6.QtGui import QGuiApplication
+
+from src.batch import BATCH_EXTENSIONS
+from src.batch_print import BatchPrintJob, job_id_for
+from src.fonts import load_bundled_fonts
+from src.models import CheckTemplate
+from src.printers import make_printer
+from src.template_cache import template_cache
+from src.workers import submit
+
+PROCESSING_DIR = "processing"
+DONE_DIR = "done"
+FAILED_DIR = "failed"
+MANIFEST_SUFFIX = ".result.json"
+OWNER_SEPARATOR = "~"
+
+# A file must be left untouched this long before it is claimed
+SETTLE_SECONDS = 2.0
+# Rescan even without change notifications (network shares do not send them)
+RESCAN_INTERVAL_MS = 5000
+
+
+def worker_name() -> str:
+    """Get the owner tag of this process, as used in claimed file names."""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def pid_alive(pid: int) -> bool:
+    """Check whether a process on this host is still running."""
+    if os.name == "nt":
+        # os.kill() would terminate it; assume it is alive
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def unique_path(directory: str, name: str) -> str:
+    """Get a path for name in directory that does not overwrite an existing file."""
+    path = os.path.join(directory, name)
+    if not os.path.exists(path):
+        return path
+    stem, ext = os.path.splitext(name)
+    return os.path.join(directory, f"{stem}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}{ext}")
+
+
+class HotFolderWatcher(QObject):
+    """Watches a spool directory and prints batch files one at a time."""
+
+    def __init__(self, spool_dir: str, check_type: Optional[str] = None,
+                 printer_name: Optional[str] = None, pdf_dir: Optional[str] = None,
+                 background: bool = False, parent=None):
+        super().__init__(parent)
+        self.spool_dir = os.path.abspath(spool_dir)
+        self.processing_dir = os.path.join(self.spool_dir, PROCESSING_DIR)
+        self.done_dir = os.path.join(self.spool_dir, DONE_DIR)
+        self.failed_dir = os.path.join(self.spool_dir, FAILED_DIR)
+        self.check_type = check_type
+        self.printer_name = printer_name
+        self.pdf_dir = pdf_dir
+        self.background = background
+        self.owner = worker_name()
+
+        self.job = None
+        self._stopping = False
+        self._watcher = QFileSystemWatcher(self)
+        self._timer = QTimer(self)
+        self._timer.setInterval(RESCAN_INTERVAL_MS)
+
+    def start(self):
+        """Take over orphaned files, then start watching."""
+        for directory in (self.processing_dir, self.done_dir, self.failed_dir, self.pdf_dir):
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        self._recover_orphans()
+        # inotify on Linux; a change only triggers a scan of the folder
+        self._watcher.addPath(self.spool_dir)
+        self._watcher.directoryChanged.connect(self.scan)
+        self._timer.timeout.connect(self.scan)
+        self._timer.start()
+        print(f"[HOT FOLDER] {self.owner} watching {self.spool_dir}")
+        self.scan()
+
+    def stop(self):
+        """Stop watching; a file being printed stops after its current spool job."""
+        self._stopping = True
+        self._timer.stop()
+        if self.job is not None:
+            self.job.stop()
+
+    def candidates(self) -> list:
+        """Get batch files in the spool folder that are ready to claim, oldest first."""
+        ready = []
+        now = time.time()
+        with os.scandir(self.spool_dir) as entries:
+            for entry in entries:
+                name = entry.name
+                if name.startswith(".") or not name.lower().endswith(BATCH_EXTENSIONS):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                if entry.is_file() and now - stat.st_mtime >= SETTLE_SECONDS:
+                    ready.append((stat.st_mtime, name))
+        return [name for _, name in sorted(ready)]
+
+    def scan(self, *args):
+        """Claim and start the next ready file unless one is being printed."""
+        if self._stopping:
+            return
+        if self.job is not None:
+            # Scanned again when the current file is finished
+            return
+        for name in self.candidates():
+            claimed = self.claim(name)
+            if claimed:
+                self._start(claimed, name)
+                return
+
+    def claim(self, name: str) -> Optional[str]:
+        """Move a file into processing/ under our name; None if another watcher got it."""
+        claimed = os.path.join(self.processing_dir, f"{self.owner}{OWNER_SEPARATOR}{name}")
+        try:
+            os.rename(os.path.join(self.spool_dir, name), claimed)
+        except (FileNotFoundError, PermissionError):
+            # Taken by another watcher, or still open by the writer (Windows)
+            return None
+        return claimed
+
+    def _recover_orphans(self):
+        """Re-claim files whose watcher on this host is no longer running."""
+        host = socket.gethostname()
+        for claimed in sorted(os.listdir(self.processing_dir)):
+            owner, separator, name = claimed.partition(OWNER_SEPARATOR)
+            owner_host, _, pid = owner.rpartition("-")
+            if not separator or owner_host != host or not pid.isdigit() or pid_alive(int(pid)):
+                continue
+            if os.path.exists(os.path.join(self.spool_dir, name)):
+                print(f"[HOT FOLDER] Not requeuing {claimed}: {name} was dropped again")
+                continue
+            try:
+                os.rename(os.path.join(self.processing_dir, claimed),
+                          os.path.join(self.spool_dir, name))
+                print(f"[HOT FOLDER] Requeued {name} from stopped watcher {owner}")
+            except FileNotFoundError:
+                pass
+
+    def _start(self, claimed: str, name: str):
+        """Print a claimed file on the worker pool."""
+        background = template_cache.load(self.check_type) if self.background and self.check_type else None
+        # Keyed by the original name so a requeued file resumes its checkpoint
+        self.job = BatchPrintJob(claimed, self.check_type, background,
+                                 job_id=job_id_for(claimed, name))
+        print(f"[HOT FOLDER] Printing {name} (job {self.job.job_id})")
+        submit(self._process, self.job, claimed, name, on_done=self._on_processed)
+
+    def _process(self, job: BatchPrintJob, claimed: str, name: str) -> dict:
+        """Print a claimed file, then file it with its manifest under done/ or failed/."""
+        started = time.time()
+        manifest = {"file": name, "job_id": job.job_id, "worker": self.owner,
+                    "check_type": self.check_type, "started": started}
+        error = None
+        try:
+            checkpoint = job.prepare()
+            if checkpoint.total == 0:
+                raise ValueError("Lot vide")
+            if self.pdf_dir:
+                stem = os.path.splitext(name)[0]
+                printer = make_printer(pdf_path=unique_path(self.pdf_dir, f"{stem}.pdf"))
+                # A PDF cannot be appended to: write it in one spool job
+                job.pages_per_spool = checkpoint.total
+                checkpoint = job.run(printer, start=0)
+            else:
+                checkpoint = job.run(make_printer(self.printer_name))
+            if not checkpoint.finished:
+                # Stopped: leave the file claimed so it resumes on the next start
+                manifest["status"] = "stopped"
+                return manifest
+        except Exception as e:
+            error = str(e)
+            checkpoint = job.checkpoint
+
+        if checkpoint is not None:
+            manifest.update(total=checkpoint.total, printed=checkpoint.pages_spooled,
+                            next_index=checkpoint.next_index, skipped=checkpoint.errors)
+        manifest.update(status="failed" if error else "done", error=error,
+                        finished=time.time(), seconds=round(time.time() - started, 3))
+
+        target_dir = self.failed_dir if error else self.done_dir
+        target = unique_path(target_dir, name)
+        with open(f"{target}{MANIFEST_SUFFIX}", "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(claimed, target)
+        if not error:
+            # Failed files keep their checkpoint so a retry resumes
+            job.discard()
+        return manifest
+
+    def _on_processed(self, future):
+        self.job = None
+        try:
+            manifest = future.result()
+            print(f"[HOT FOLDER] {manifest['file']}: {manifest['status']}"
+                  + (f" ({manifest['error']})" if manifest.get("error") else ""))
+        except Exception as e:
+            # Filing the result failed; the file stays in processing/
+            print(f"[HOT FOLDER] Could not file result: {e}")
+        if self._stopping:
+            QGuiApplication.quit()
+            return
+        self.scan()
+
+
+def main(argv=None):
+    """Run a hot folder watcher until interrupted."""
+    parser = argparse.ArgumentParser(prog="main.py watch", description="Print batch files dropped into a folder")
+    parser.add_argument("spool_dir", help="folder to watch")
+    parser.add_argument("--check-type", choices=sorted(CheckTemplate.TEMPLATES), help="check template")
+    parser.add_argument("--printer", help="printer name (default: system default)")
+    parser.add_argument("--pdf-dir", help="write a PDF per file here instead of printing")
+    parser.add_argument("--background", action="store_true", help="print the template image (test prints)")
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    app = QGuiApplication(sys.argv[:1])
+    load_bundled_fonts()
+
+    watcher = HotFolderWatcher(args.spool_dir, args.check_type, args.printer, args.pdf_dir, args.background)
+
+    def shutdown(*args):
+        watcher.stop()
+        if watcher.job is None:
+            app.quit()
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+    # Let the Python interpreter run signal handlers while Qt's loop is running
+    heartbeat = QTimer()
+    heartbeat.timeout.connect(lambda: None)
+    heartbeat.start(500)
+
+    watcher.start()
+    sys.exit(app.exec())
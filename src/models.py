@@ -5,6 +5,10 @@ from PyQt6.QtCore import QDate
 from dataclasses import dataclass
 from typing import Optional
 
+# Physical check size
+CHECK_WIDTH_MM = 175
+CHECK_HEIGHT_MM = 80
+
 
 @dataclass
 class CheckData:
@@ -35,6 +39,11 @@ class CheckTemplate:
         "CCP": "chèque-ccp.png"
     }
     
+    # Rotation (degrees) applied to template images after decoding
+    ROTATIONS = {
+        "BDR": -90
+    }
+    
     # Position sets for different check types
     # Coordinates (X, Y) in Percentages (0.0 to 1.0)
     POSITIONS = {
@@ -80,3 +89,8 @@ class CheckTemplate:
     def get_template_path(cls, check_type: str) -> Optional[str]:
         """Get template file path."""
         return cls.TEMPLATES.get(check_type)
+    
+    @classmethod
+    def get_rotation(cls, check_type: str) -> int:
+        """Get the rotation to apply to the template image."""
+        return cls.ROTATIONS.get(check_type, 0)
@@ -0,0 +1,284 @@
+"""
+Direct PDF writer for bulk and archive exports.
+
+Writes PDF objects straight to disk without QPainter: each page is a short
+content stream of text operators at the template positions. The fonts are
+the standard Helvetica-Bold and Courier (WinAnsi encoding), which every PDF
+reader provides, so nothing is embedded. The background, if any, is one
+image object shared by every page; JPEG templates are copied in as they are.
+
+    python main.py pdf paie.csv paie.pdf --check-type BNA
+"""
+import argparse
+import json
+import os
+import struct
+import sys
+import time
+from typing import Optional
+
+from PyQt6.QtCore import QBuffer, QIODevice
+from PyQt6.QtGui import QGuiApplication
+
+from src.batch import read_batch_records, record_to_data
+from src.models import CheckTemplate, CHECK_WIDTH_MM, CHECK_HEIGHT_MM
+from src.pipeline import RENDER_DPI
+from src.renderers import (
+    AMOUNT_BASELINE_OFFSET, AMOUNT_POINT_SIZE, DATE_POINT_SIZE, TEXT_POINT_SIZE, WORDS_RIGHT_MARGIN
+)
+from src.template_cache import template_cache
+from src.text_layout import fit_text
+from src.utils import format_amount_display, get_resource_path
+
+POINTS_PER_MM = 72 / 25.4
+PAGE_WIDTH = CHECK_WIDTH_MM * POINTS_PER_MM
+PAGE_HEIGHT = CHECK_HEIGHT_MM * POINTS_PER_MM
+
+# Courier glyphs are all 600/1000 em wide
+COURIER_ADVANCE = 0.6
+COURIER_LINE_SPACING = 1.133
+COURIER_ASCENT = 0.629
+COURIER_DESCENT = 0.157
+# CheckRenderer's amount baseline offset, in device pixels at the render resolution
+AMOUNT_BASELINE_POINTS = AMOUNT_BASELINE_OFFSET * 72 / RENDER_DPI
+
+# Fixed object numbers; pages follow, two objects each
+CATALOG, PAGES, RESOURCES, FONT_AMOUNT, FONT_TEXT, BACKGROUND = range(1, 7)
+PDF_FONTS = {"amount": b"F1", "text": b"F2"}
+JPEG_QUALITY = 90
+
+
+def pdf_string(text: str) -> bytes:
+    """Encode text as a PDF literal string in WinAnsi (cp1252); other characters become '?'."""
+    data = text.encode("cp1252", errors="replace")
+    return b"(" + data.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)") + b")"
+
+
+def fit_words(text: str, max_width: float, max_height: Optional[float] = None) -> tuple:
+    """Get (size, lines) for the amount in words, fitted like the renderer's, in Courier."""
+    return fit_text(text, TEXT_POINT_SIZE, max_width, max_height,
+                    lambda line, size: len(line) * COURIER_ADVANCE * size,
+                    lambda size: (size * COURIER_LINE_SPACING, size * COURIER_DESCENT))
+
+
+def text_runs(data: dict, positions: dict) -> list:
+    """Get (font, size, x, y, text) for each line of a check, in points from its top left.
+
+    font is "amount" (Helvetica-Bold) or "text" (Courier); y is the baseline.
+    """
+    def point(name, baseline_offset=0.0):
+        px, py = positions[name]
+        return PAGE_WIDTH * px, PAGE_HEIGHT * py + baseline_offset
+
+    x, y = point("amount_num", AMOUNT_BASELINE_POINTS)
+    runs = [("amount", AMOUNT_POINT_SIZE, x, y, format_amount_display(data["amount"]))]
+
+    x, y = point("amount_words")
+    # Room for a second line: down to the top of the nearest field below
+    tops = [point(name)[1] - field_size * COURIER_ASCENT
+            for name, field_size in (("beneficiary", TEXT_POINT_SIZE), ("location", TEXT_POINT_SIZE),
+                                     ("date", DATE_POINT_SIZE))
+            if point(name)[1] > y]
+    size, lines = fit_words(data["words"], PAGE_WIDTH * (1 - WORDS_RIGHT_MARGIN) - x,
+                            min(tops) - y if tops else None)
+    for i, line in enumerate(lines):
+        runs.append(("text", size, x, y + i * size * COURIER_LINE_SPACING, line))
+
+    for name in ("beneficiary", "location"):
+        x, y = point(name)
+        runs.append(("text", TEXT_POINT_SIZE, x, y, data[name]))
+
+    x, y = point("date")
+    runs.append(("text", DATE_POINT_SIZE, x, y, f"le {data['date'].toString('dd/MM/yyyy')}"))
+    return runs
+
+
+class JpegImage:
+    """A JPEG file's bytes and the header fields a PDF image object needs."""
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.width, self.height, self.components = self._read_header(data)
+        # Photoshop writes CMYK JPEGs inverted
+        self.inverted = self.components == 4 and b"Adobe" in data[:4096]
+
+    @classmethod
+    def from_file(cls, path: str) -> "JpegImage":
+        with open(path, "rb") as f:
+            return cls(f.read())
+
+    @staticmethod
+    def _read_header(data: bytes) -> tuple:
+        if data[:2] != b"\xff\xd8":
+            raise ValueError("Not a JPEG file")
+        pos = 2
+        while pos + 4 <= len(data):
+            if data[pos] != 0xFF:
+                pos += 1
+                continue
+            marker = data[pos + 1]
+            if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7 or marker == 0xFF:
+                pos += 1 if marker == 0xFF else 2
+                continue
+            length = struct.unpack(">H", data[pos + 2:pos + 4])[0]
+            # Start of frame markers, except DHT, JPG and DAC
+            if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+                height, width, components = struct.unpack(">HHB", data[pos + 5:pos + 10])
+                return width, height, components
+            pos += 2 + length
+        raise ValueError("JPEG without a frame header")
+
+    def pdf_object(self) -> bytes:
+        color_space = {1: b"/DeviceGray", 3: b"/DeviceRGB", 4: b"/DeviceCMYK"}[self.components]
+        decode = b" /Decode [1 0 1 0 1 0 1 0]" if self.inverted else b""
+        header = (b"<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace %s"
+                  b" /BitsPerComponent 8 /Filter /DCTDecode%s /Length %d >>\nstream\n"
+                  % (self.width, self.height, color_space, decode, len(self.data)))
+        return header + self.data + b"\nendstream"
+
+
+def template_background(check_type: str) -> tuple:
+    """Get (JpegImage, rotation) for a template; JPEG files are used without decoding."""
+    path = get_resource_path(CheckTemplate.get_template_path(check_type))
+    if path.lower().endswith((".jpg", ".jpeg")):
+        return JpegImage.from_file(path), CheckTemplate.get_rotation(check_type)
+    # Other formats are decoded (already rotated) and encoded once
+    image = template_cache.load(check_type)
+    buffer = QBuffer()
+    buffer.open(QIODevice.OpenModeFlag.WriteOnly)
+    image.save(buffer, "JPEG", JPEG_QUALITY)
+    return JpegImage(bytes(buffer.data())), 0
+
+
+def _image_matrix(rotation: int) -> bytes:
+    """Get the cm operands that fill the page with the image turned by rotation degrees."""
+    w, h = PAGE_WIDTH, PAGE_HEIGHT
+    matrices = {
+        0: (w, 0, 0, h, 0, 0),
+        90: (0, -h, w, 0, 0, h),
+        180: (-w, 0, 0, -h, w, h),
+        270: (0, h, -w, 0, w, 0),
+    }
+    return b" ".join(b"%.2f" % v for v in matrices[rotation % 360])
+
+
+class DirectPdfWriter:
+    """Streams check pages to a PDF file as text operators."""
+
+    def __init__(self, path: str, check_type: Optional[str] = None, background=None):
+        """background is a (JpegImage, rotation) pair, e.g. from template_background()."""
+        self.path = path
+        self.positions = CheckTemplate.get_positions(check_type)
+        self.pages = 0
+        self._offsets = {}
+        self._first_page = BACKGROUND + (background is not None)
+        self._next_object = self._first_page
+        self._file = open(path, "wb")
+        self._file.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+        self._background_ops = b""
+        xobjects = b""
+        if background is not None:
+            image, rotation = background
+            self._write_object(BACKGROUND, image.pdf_object())
+            self._background_ops = b"q " + _image_matrix(rotation) + b" cm /Bg Do Q\n"
+            xobjects = b" /XObject << /Bg %d 0 R >>" % BACKGROUND
+        for number, name in ((FONT_AMOUNT, b"Helvetica-Bold"), (FONT_TEXT, b"Courier")):
+            self._write_object(number, b"<< /Type /Font /Subtype /Type1 /BaseFont /" + name
+                               + b" /Encoding /WinAnsiEncoding >>")
+        self._write_object(RESOURCES, b"<< /Font << /F1 %d 0 R /F2 %d 0 R >>%s >>"
+                           % (FONT_AMOUNT, FONT_TEXT, xobjects))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def abort(self):
+        """Close and delete the unfinished file."""
+        self._file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def _write_object(self, number: int, body: bytes):
+        self._offsets[number] = self._file.tell()
+        self._file.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+
+    def content(self, data: dict) -> bytes:
+        """Get the content stream of one check."""
+        ops = [self._background_ops, b"BT\n"]
+        for font, size, x, y, value in text_runs(data, self.positions):
+            ops.append(b"/%s %.1f Tf 1 0 0 1 %.2f %.2f Tm %s Tj\n"
+                       % (PDF_FONTS[font], size, x, PAGE_HEIGHT - y, pdf_string(value)))
+        ops.append(b"ET\n")
+        return b"".join(ops)
+
+    def add_page(self, data: dict):
+        """Write one check as a page."""
+        content = self.content(data)
+        number = self._next_object
+        self._next_object += 2
+        self._write_object(number, b"<< /Length %d >>\nstream\n" % len(content) + content + b"endstream")
+        self._write_object(number + 1, b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %.2f %.2f]"
+                           b" /Resources %d 0 R /Contents %d 0 R >>"
+                           % (PAGES, PAGE_WIDTH, PAGE_HEIGHT, RESOURCES, number))
+        self.pages += 1
+
+    def close(self):
+        """Write the page tree, cross-reference table and trailer."""
+        kids = b" ".join(b"%d 0 R" % (self._first_page + 2 * i + 1) for i in range(self.pages))
+        self._write_object(PAGES, b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, self.pages))
+        self._write_object(CATALOG, b"<< /Type /Catalog /Pages %d 0 R >>" % PAGES)
+
+        size = self._next_object
+        xref_offset = self._file.tell()
+        lines = [b"xref\n0 %d\n" % size, b"0000000000 65535 f \n"]
+        for number in range(1, size):
+            lines.append(b"%010d 00000 n \n" % self._offsets[number])
+        lines.append(b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+                     % (size, CATALOG, xref_offset))
+        self._file.write(b"".join(lines))
+        self._file.close()
+
+
+def export_batch(input_path: str, output_path: str, check_type: Optional[str] = None,
+                 background: bool = False) -> dict:
+    """Write every valid record of a batch file as one PDF; returns counts and skipped records."""
+    started = time.perf_counter()
+    errors = {}
+    tmp_path = f"{output_path}.tmp"
+    backdrop = template_background(check_type) if background and check_type else None
+    with DirectPdfWriter(tmp_path, check_type, backdrop) as writer:
+        for index, record in enumerate(read_batch_records(input_path)):
+            try:
+                writer.add_page(record_to_data(record))
+            except ValueError as e:
+                errors[str(index)] = str(e)
+    os.replace(tmp_path, output_path)
+    seconds = time.perf_counter() - started
+    return {"output": output_path, "pages": writer.pages, "skipped": errors,
+            "seconds": round(seconds, 3),
+            "pages_per_second": round(writer.pages / seconds) if seconds else None}
+
+
+def main(argv=None):
+    """Export a batch file to PDF with the direct writer."""
+    parser = argparse.ArgumentParser(
+        prog="main.py pdf", description="Fast PDF export of a batch",
+        epilog="Text uses the standard PDF fonts: characters outside cp1252 print as '?'.")
+    parser.add_argument("batch_file")
+    parser.add_argument("output")
+    parser.add_argument("--check-type", choices=sorted(CheckTemplate.TEMPLATES))
+    parser.add_argument("--background", action="store_true", help="include the template image")
+    args = parser.parse_args(argv)
+
+    if args.background:
+        # Only non-JPEG templates need Qt to decode them
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+        app = QGuiApplication(sys.argv[:1])  # noqa: F841 - fonts need an application
+    summary = export_batch(args.batch_file, args.output, args.check_type, args.background)
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
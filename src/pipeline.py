@@ -0,0 +1,277 @@
+"""
+Staged batch pipeline: ingest → validate → layout → render → spool.
+
+Each stage runs a fixed number of workers that take pages from a bounded
+asyncio queue and do their blocking work on a thread pool. A window of
+in-flight records bounds memory end to end: when the printer is slow the
+spool stage stops releasing slots, so ingest waits instead of reading ahead.
+Pages reach the spool stage in batch order whatever order the workers
+finish in.
+
+Printers get the text layout and draw it as vector text in the spool stage;
+pages are only rasterized in the render stage for image outputs (rasterize).
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from itertools import islice
+from typing import Iterable, Optional
+
+from PyQt6.QtGui import QColor, QImage, QPainter
+
+from src.batch import record_to_data
+from src.renderers import CheckRenderer, get_check_rect
+
+STAGES = ("ingest", "validate", "layout", "render", "spool")
+DEFAULT_CONCURRENCY = {"ingest": 1, "validate": 2, "layout": 2, "render": 2, "spool": 1}
+
+# Default layout resolution, and the one pages are rasterized at (about 8 MB per page)
+RENDER_DPI = 300
+# Records between ingest and the spooler; bounds memory at roughly this many pages
+MAX_IN_FLIGHT = 8
+INGEST_CHUNK = 64
+REPORT_INTERVAL = 2.0
+
+
+@dataclass
+class Page:
+    """One batch record on its way through the pipeline."""
+    seq: int
+    index: int
+    record: dict
+    data: Optional[dict] = None
+    renderer: Optional[CheckRenderer] = None
+    layout: Optional[list] = None
+    image: Optional[QImage] = None
+    # Set by the first stage that fails; later stages pass the page through
+    error: Optional[str] = None
+
+
+@dataclass
+class StageMetrics:
+    """Throughput, latency and queue depth of one stage."""
+    name: str
+    concurrency: int
+    processed: int = 0
+    failed: int = 0
+    busy_seconds: float = 0.0
+    max_seconds: float = 0.0
+    queue_depth: int = 0
+    max_queue_depth: int = 0
+
+    def record(self, seconds: float, failed: bool = False):
+        self.processed += 1
+        self.failed += failed
+        self.busy_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+
+    def set_queue_depth(self, depth: int):
+        self.queue_depth = depth
+        self.max_queue_depth = max(self.max_queue_depth, depth)
+
+    @property
+    def mean_ms(self) -> float:
+        return self.busy_seconds / self.processed * 1000 if self.processed else 0.0
+
+    def snapshot(self) -> dict:
+        return {
+            "concurrency": self.concurrency,
+            "processed": self.processed,
+            "failed": self.failed,
+            "mean_ms": round(self.mean_ms, 2),
+            "max_ms": round(self.max_seconds * 1000, 2),
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+        }
+
+
+def render_device(dpi: int) -> QImage:
+    """Get a 1x1 image reporting dpi, for measuring text as the render stage will."""
+    image = QImage(1, 1, QImage.Format.Format_RGB32)
+    dots_per_meter = round(dpi / 0.0254)
+    image.setDotsPerMeterX(dots_per_meter)
+    image.setDotsPerMeterY(dots_per_meter)
+    return image
+
+
+class BatchPipeline:
+    """Runs batch records through the stages into a sink, one page at a time."""
+
+    def __init__(self, records: Iterable, check_type: Optional[str] = None, background=None,
+                 concurrency: Optional[dict] = None, dpi: int = RENDER_DPI,
+                 max_in_flight: int = MAX_IN_FLIGHT, rasterize: bool = False):
+        # (index, record) pairs, e.g. BatchIndex.read_from() or enumerate(records)
+        self.records = records
+        self.check_type = check_type
+        self.background = background
+        self.concurrency = {**DEFAULT_CONCURRENCY, **(concurrency or {})}
+        # One spooler: pages must reach the printer in order
+        self.concurrency["spool"] = 1
+        # Text is laid out at the resolution of the device it is drawn on
+        self.dpi = dpi
+        self.rasterize = rasterize
+        self.max_in_flight = max(1, max_in_flight)
+        self.metrics = {name: StageMetrics(name, self.concurrency[name]) for name in STAGES}
+        self._device = render_device(dpi)
+        self._rect = get_check_rect(self._device)
+        self._stop = threading.Event()
+
+    def stop(self):
+        """Stop reading records; pages already in flight still reach the sink."""
+        self._stop.set()
+
+    def snapshot(self) -> dict:
+        """Get the metrics of every stage."""
+        return {name: metrics.snapshot() for name, metrics in self.metrics.items()}
+
+    def run(self, sink, close=None):
+        """Run the pipeline to completion on a private event loop.
+
+        sink(page) is called from a pool thread for every page in batch order,
+        including pages with an error. close(failed) is then called on a pool
+        thread before the pool exits: a printer painter must be ended there,
+        since the fonts it drew with belong to the pool's threads.
+        """
+        return asyncio.run(self.run_async(sink, close))
+
+    async def run_async(self, sink, close=None):
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        pool = ThreadPoolExecutor(max_workers=sum(self.concurrency.values()),
+                                  thread_name_prefix="check-pipeline")
+        window = asyncio.Semaphore(self.max_in_flight)
+        queues = {name: asyncio.Queue(maxsize=self.concurrency[name] * 2) for name in STAGES[1:]}
+        stage_work = {"validate": self._validate, "layout": self._layout, "render": self._render}
+
+        tasks = [asyncio.ensure_future(self._ingest(pool, window, queues["validate"]))]
+        for name, downstream in zip(STAGES[1:-1], STAGES[2:]):
+            tasks.append(asyncio.ensure_future(
+                self._stage(name, stage_work[name], pool, queues[name], queues[downstream],
+                            self.concurrency[downstream])
+            ))
+        tasks.append(asyncio.ensure_future(self._spool(sink, pool, window, queues["spool"])))
+        reporter = asyncio.ensure_future(self._report(queues))
+
+        failed = True
+        try:
+            await asyncio.gather(*tasks)
+            failed = False
+        finally:
+            for task in tasks + [reporter]:
+                task.cancel()
+            await asyncio.gather(*tasks, reporter, return_exceptions=True)
+            if close is not None:
+                await loop.run_in_executor(pool, close, failed)
+            pool.shutdown(wait=True)
+            self._log(time.perf_counter() - started)
+
+    async def _ingest(self, pool, window: asyncio.Semaphore, outbox: asyncio.Queue):
+        """Read records in chunks, waiting for a free slot before each one."""
+        loop = asyncio.get_running_loop()
+        metrics = self.metrics["ingest"]
+        records = iter(self.records)
+        seq = 0
+        while not self._stop.is_set():
+            started = time.perf_counter()
+            chunk = await loop.run_in_executor(pool, lambda: list(islice(records, INGEST_CHUNK)))
+            if not chunk:
+                break
+            per_record = (time.perf_counter() - started) / len(chunk)
+            for index, record in chunk:
+                await window.acquire()
+                if self._stop.is_set():
+                    window.release()
+                    break
+                metrics.record(per_record)
+                await outbox.put(Page(seq, index, record))
+                seq += 1
+        for _ in range(self.concurrency["validate"]):
+            await outbox.put(None)
+
+    async def _stage(self, name: str, work, pool, inbox: asyncio.Queue, outbox: asyncio.Queue,
+                     downstream_workers: int):
+        """Run the workers of one stage, then tell the next stage it is done."""
+        await asyncio.gather(*(self._worker(name, work, pool, inbox, outbox)
+                               for _ in range(self.concurrency[name])))
+        for _ in range(downstream_workers):
+            await outbox.put(None)
+
+    async def _worker(self, name: str, work, pool, inbox: asyncio.Queue, outbox: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+        metrics = self.metrics[name]
+        while True:
+            metrics.set_queue_depth(inbox.qsize())
+            page = await inbox.get()
+            if page is None:
+                return
+            if page.error is None:
+                started = time.perf_counter()
+                try:
+                    await loop.run_in_executor(pool, work, page)
+                except Exception as e:
+                    page.error = str(e)
+                metrics.record(time.perf_counter() - started, page.error is not None)
+            await outbox.put(page)
+
+    async def _spool(self, sink, pool, window: asyncio.Semaphore, inbox: asyncio.Queue):
+        """Hand pages to the sink in batch order, freeing a slot for each."""
+        loop = asyncio.get_running_loop()
+        metrics = self.metrics["spool"]
+        waiting = {}
+        next_seq = 0
+        while True:
+            metrics.set_queue_depth(inbox.qsize())
+            page = await inbox.get()
+            if page is None:
+                return
+            waiting[page.seq] = page
+            while next_seq in waiting:
+                page = waiting.pop(next_seq)
+                started = time.perf_counter()
+                await loop.run_in_executor(pool, sink, page)
+                metrics.record(time.perf_counter() - started, page.error is not None)
+                # Drop the image now rather than when the page is collected
+                page.image = None
+                window.release()
+                next_seq += 1
+
+    def _validate(self, page: Page):
+        page.data = record_to_data(page.record)
+
+    def _layout(self, page: Page):
+        page.renderer = CheckRenderer(page.data, self.background, self.check_type)
+        page.layout = page.renderer.layout_text(self._rect, self._device)
+
+    def _render(self, page: Page):
+        """Rasterize the page for image outputs; printers draw the layout themselves."""
+        if not self.rasterize:
+            return
+        size = self._rect.size().toSize()
+        image = QImage(size, QImage.Format.Format_RGB32)
+        image.setDotsPerMeterX(self._device.dotsPerMeterX())
+        image.setDotsPerMeterY(self._device.dotsPerMeterY())
+        image.fill(QColor(255, 255, 255))
+        painter = QPainter(image)
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        page.renderer.draw(painter, self._rect, draw_background=self.background is not None,
+                           layout=page.layout)
+        painter.end()
+        page.image = image
+
+    async def _report(self, queues: dict):
+        """Log stage metrics periodically while the pipeline runs."""
+        while True:
+            await asyncio.sleep(REPORT_INTERVAL)
+            for name, queue in queues.items():
+                self.metrics[name].set_queue_depth(queue.qsize())
+            self._log()
+
+    def _log(self, elapsed: Optional[float] = None):
+        stages = " | ".join(
+            f"{m.name} {m.processed} ({m.mean_ms:.1f} ms, q {m.queue_depth})"
+            for m in self.metrics.values()
+        )
+        suffix = f" in {elapsed:.1f} s" if elapsed is not None else ""
+        print(f"[PIPELINE] {stages}{suffix}")
@@ -0,0 +1,529 @@
+"""
+Print broker shared by several application instances.
+
+Clients send jobs to one local broker process, which owns the printers. Each
+printer has its own scheduler that hands out one page at a time:
+
+- priority classes are served strictly in order ("counter" before "normal"
+  before "bulk"), so a counter check preempts a payroll batch at the next
+  page boundary;
+- within a class, clients take turns page by page, so one desk's large job
+  does not hold back another desk's.
+
+The protocol is one JSON object per line over a Unix socket (localhost TCP on
+Windows). Requests: {"op": "submit", ...}, {"op": "cancel", "job_id": ...},
+{"op": "status"}, {"op": "watch"}. The broker answers each request and sends
+{"event": "status", "job": {...}} lines as the jobs of the connection progress.
+
+A file sink can stand in for a printer (--sink DIR): pages are written as PNG
+files and listed in DIR/sink.log in print order.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import socket
+import stat
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Optional
+
+from PyQt6.QtGui import QGuiApplication, QPainter
+
+from src.batch import record_to_data
+from src.fonts import load_bundled_fonts
+from src.models import CheckTemplate
+from src.printers import make_printer
+from src.render_service import render_png
+from src.renderers import CheckRenderer, get_check_rect
+from src.template_cache import template_cache
+from src.utils import get_data_dir, is_windows
+
+PRIORITIES = ("counter", "normal", "bulk")
+DEFAULT_PORT = 8766
+SOCKET_NAME = "broker.sock"
+BROKER_ENV = "CHECK_PRINT_BROKER"
+# Pages of one job per spool job when nothing preempts it
+SPOOL_PAGES = 20
+# End an open spool job once no page has come for this long
+IDLE_FLUSH_SECONDS = 0.5
+MAX_LINE_BYTES = 16 * 1024 * 1024
+
+
+def default_address() -> str:
+    """Get the broker address: $CHECK_PRINT_BROKER, else a per-user socket or port."""
+    if os.environ.get(BROKER_ENV):
+        return os.environ[BROKER_ENV]
+    if is_windows():
+        return f"127.0.0.1:{DEFAULT_PORT}"
+    return os.path.join(get_data_dir(), SOCKET_NAME)
+
+
+def _split_address(address: str):
+    """Get (host, port) for a TCP address, or None for a socket path."""
+    host, separator, port = address.rpartition(":")
+    if separator and port.isdigit() and os.sep not in address:
+        return host or "127.0.0.1", int(port)
+    return None
+
+
+def _remove_stale_socket(path: str):
+    """Remove a socket left by a broker that is gone; refuse any other file or a live broker."""
+    try:
+        mode = os.stat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise OSError(f"{path} exists and is not a socket")
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except (ConnectionRefusedError, FileNotFoundError):
+        os.remove(path)
+    else:
+        raise OSError(f"A print broker is already listening on {path}")
+    finally:
+        probe.close()
+
+
+@dataclass
+class BrokerJob:
+    """A client's job and its progress."""
+    job_id: str
+    client: str
+    priority: str
+    printer: str
+    checks: list
+    check_type: Optional[str] = None
+    background: bool = False
+    name: str = ""
+    state: str = "queued"
+    next_page: int = 0
+    printed: int = 0
+    skipped: dict = field(default_factory=dict)
+    error: Optional[str] = None
+    submitted: float = field(default_factory=time.time)
+
+    @property
+    def finished(self) -> bool:
+        return self.printed + len(self.skipped) >= len(self.checks)
+
+    def status(self) -> dict:
+        return {
+            "job_id": self.job_id, "client": self.client, "priority": self.priority,
+            "printer": self.printer, "name": self.name, "state": self.state,
+            "printed": self.printed, "skipped": self.skipped, "total": len(self.checks),
+            "error": self.error,
+        }
+
+
+class FairScheduler:
+    """Hands out pages by priority class, then round-robin between clients."""
+
+    def __init__(self):
+        # priority -> client -> jobs of that client in submission order
+        self._classes = {priority: OrderedDict() for priority in PRIORITIES}
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def add(self, job: BrokerJob):
+        with self._cond:
+            self._classes[job.priority].setdefault(job.client, deque()).append(job)
+            self._cond.notify()
+
+    def cancel(self, job_id: str) -> Optional[BrokerJob]:
+        """Remove a job that still has pages to hand out."""
+        with self._cond:
+            for clients in self._classes.values():
+                for client, jobs in list(clients.items()):
+                    for job in jobs:
+                        if job.job_id == job_id:
+                            jobs.remove(job)
+                            if not jobs:
+                                del clients[client]
+                            return job
+        return None
+
+    def queued(self) -> list:
+        """Get the jobs waiting for pages, highest priority first."""
+        with self._cond:
+            return [job for clients in self._classes.values()
+                    for jobs in clients.values() for job in jobs]
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def next_page(self, timeout: Optional[float] = None):
+        """Get the next (job, page index), or None on timeout or once closed."""
+        with self._cond:
+            while not self._closed:
+                for clients in self._classes.values():
+                    if not clients:
+                        continue
+                    client, jobs = next(iter(clients.items()))
+                    job = jobs[0]
+                    index = job.next_page
+                    job.next_page += 1
+                    if job.next_page >= len(job.checks):
+                        jobs.popleft()
+                    if jobs:
+                        # The client goes to the back of its class
+                        clients.move_to_end(client)
+                    else:
+                        del clients[client]
+                    return job, index
+                if not self._cond.wait(timeout):
+                    return None
+            return None
+
+
+class PrinterOutput:
+    """Prints pages on a system printer."""
+
+    def __init__(self, printer_name: Optional[str] = None):
+        self.printer = make_printer(printer_name)
+        self.painter = QPainter()
+        self.pages = 0
+
+    def begin(self, doc_name: str):
+        self.printer.setDocName(doc_name)
+        self.pages = 0
+
+    def page(self, data: dict, check_type=None, background=None):
+        if self.pages == 0:
+            if not self.painter.begin(self.printer):
+                raise RuntimeError("Failed to initialize painter")
+        else:
+            self.printer.newPage()
+        CheckRenderer(data, background, check_type).draw(
+            self.painter, get_check_rect(self.printer), draw_background=background is not None)
+        self.pages += 1
+
+    def end(self):
+        if self.painter.isActive():
+            self.painter.end()
+
+    def abort(self):
+        if self.painter.isActive():
+            self.printer.abort()
+            self.painter.end()
+
+
+class FileSinkOutput:
+    """Stand-in printer that writes pages as PNG files and logs them in order."""
+
+    def __init__(self, directory: str):
+        self.directory = os.path.abspath(directory)
+        os.makedirs(self.directory, exist_ok=True)
+        self.log_path = os.path.join(self.directory, "sink.log")
+        self.doc_name = ""
+        self._seq = itertools.count(1)
+
+    def begin(self, doc_name: str):
+        self.doc_name = doc_name
+
+    def page(self, data: dict, check_type=None, background=None):
+        seq = next(self._seq)
+        name = f"{seq:06d}.png"
+        with open(os.path.join(self.directory, name), "wb") as f:
+            f.write(render_png(data, check_type, background))
+        entry = {"seq": seq, "file": name, "doc": self.doc_name,
+                 "amount": data["amount"], "beneficiary": data["beneficiary"]}
+        with open(self.log_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def end(self):
+        pass
+
+    def abort(self):
+        pass
+
+
+class PrintBroker:
+    """Accepts jobs from clients and drives one worker thread per printer."""
+
+    def __init__(self, outputs: dict):
+        # printer name -> output; the first one is the default
+        self.outputs = outputs
+        self.schedulers = {name: FairScheduler() for name in outputs}
+        self.jobs = {}
+        self._connections = set()
+        self._loop = None
+        self._threads = []
+
+    async def serve(self, address: str):
+        """Serve clients on address until cancelled."""
+        self._loop = asyncio.get_running_loop()
+        tcp = _split_address(address)
+        if not tcp:
+            _remove_stale_socket(address)
+        for name in self.outputs:
+            thread = threading.Thread(target=self._printer_loop, args=(name,),
+                                      name=f"broker-{name}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+        if tcp:
+            server = await asyncio.start_server(self._handle, *tcp, limit=MAX_LINE_BYTES)
+        else:
+            server = await asyncio.start_unix_server(self._handle, address, limit=MAX_LINE_BYTES)
+            os.chmod(address, 0o600)
+        print(f"[PRINT BROKER] Listening on {address} ({', '.join(self.outputs)})")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for scheduler in self.schedulers.values():
+                scheduler.close()
+            if not tcp and os.path.exists(address):
+                os.remove(address)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        connection = _Connection(writer)
+        self._connections.add(connection)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    connection.send(self._dispatch(connection, request))
+                except (ValueError, KeyError, TypeError) as e:
+                    connection.send({"event": "error", "error": str(e)})
+                await writer.drain()
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            self._connections.discard(connection)
+            writer.close()
+
+    def _dispatch(self, connection: "_Connection", request: dict) -> dict:
+        op = request.get("op")
+        if op == "submit":
+            job = self.submit(request)
+            connection.jobs.add(job.job_id)
+            return {"event": "accepted", "job": job.status()}
+        if op == "cancel":
+            job = self.cancel(request["job_id"])
+            return {"event": "cancelled" if job else "error", "job_id": request["job_id"]}
+        if op == "status":
+            return {"event": "snapshot", "jobs": [job.status() for job in self.jobs.values()
+                                                   if job.state in ("queued", "printing")]}
+        if op == "watch":
+            connection.watch_all = True
+            return {"event": "watching"}
+        raise ValueError(f"Opération inconnue: {op!r}")
+
+    def submit(self, request: dict) -> BrokerJob:
+        """Queue a job from a submit request."""
+        priority = request.get("priority", "normal")
+        if priority not in PRIORITIES:
+            raise ValueError(f"Priorité inconnue: {priority!r}")
+        printer = request.get("printer") or next(iter(self.outputs))
+        if printer not in self.outputs:
+            raise ValueError(f"Imprimante inconnue: {printer!r}")
+        checks = request["checks"]
+        if not isinstance(checks, list) or not checks:
+            raise ValueError("Aucun chèque")
+        for i, record in enumerate(checks):
+            if not isinstance(record, dict):
+                raise ValueError(f"Chèque {i + 1}: objet attendu")
+        check_type = request.get("check_type")
+        if check_type is not None and check_type not in CheckTemplate.TEMPLATES:
+            raise ValueError(f"Type de chèque inconnu: {check_type!r}")
+
+        job = BrokerJob(uuid.uuid4().hex[:12], str(request.get("client") or "anonyme"), priority,
+                        printer, checks, check_type, bool(request.get("background")),
+                        str(request.get("name") or ""))
+        self.jobs[job.job_id] = job
+        self.schedulers[printer].add(job)
+        print(f"[PRINT BROKER] {job.client}: {priority} job {job.job_id} ({len(checks)} pages)")
+        self._publish(job)
+        return job
+
+    def cancel(self, job_id: str) -> Optional[BrokerJob]:
+        """Cancel the pages of a job that have not been printed yet."""
+        job = self.jobs.get(job_id)
+        if job is None or not self.schedulers[job.printer].cancel(job_id):
+            return None
+        job.state = "cancelled"
+        self._publish(job)
+        return job
+
+    def _publish(self, job: BrokerJob):
+        """Send a job's status to interested connections; safe from any thread."""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._broadcast, job.status())
+
+    def _broadcast(self, status: dict):
+        for connection in list(self._connections):
+            if connection.watch_all or status["job_id"] in connection.jobs:
+                connection.send({"event": "status", "job": status})
+        if status["state"] not in ("queued", "printing"):
+            # Finished jobs are only kept for their final status
+            self.jobs.pop(status["job_id"], None)
+
+    def _printer_loop(self, name: str):
+        """Print pages in the order the printer's scheduler hands them out."""
+        output = self.outputs[name]
+        scheduler = self.schedulers[name]
+        current = None
+        spooled = 0
+        while True:
+            item = scheduler.next_page(IDLE_FLUSH_SECONDS if current else None)
+            if item is None:
+                if current is not None:
+                    output.end()
+                    current = None
+                if scheduler.closed:
+                    return
+                continue
+
+            job, index = item
+            if job is not current or spooled >= SPOOL_PAGES:
+                # Page boundary: a higher priority or another client's job starts a new spool job
+                if current is not None:
+                    output.end()
+                output.begin(f"{job.name or 'Chèques'} ({job.client})")
+                current = job
+                spooled = 0
+            if job.state == "queued":
+                job.state = "printing"
+
+            try:
+                data = record_to_data(job.checks[index])
+            except Exception as e:
+                # A bad record only skips its own page
+                job.skipped[str(index)] = str(e)
+            else:
+                try:
+                    background = template_cache.load(job.check_type) if job.background and job.check_type else None
+                    output.page(data, job.check_type, background)
+                except Exception as e:
+                    output.abort()
+                    current = None
+                    scheduler.cancel(job.job_id)
+                    job.state = "failed"
+                    job.error = str(e)
+                    print(f"[PRINT BROKER] {name}: job {job.job_id} failed: {e}")
+                    self._publish(job)
+                    continue
+                job.printed += 1
+                spooled += 1
+
+            if job.finished:
+                job.state = "done"
+            self._publish(job)
+
+
+class _Connection:
+    """A client connection and the jobs it follows."""
+
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+        self.jobs = set()
+        self.watch_all = False
+
+    def send(self, message: dict):
+        if not self.writer.is_closing():
+            self.writer.write(json.dumps(message, ensure_ascii=False).encode("utf-8") + b"\n")
+
+
+class BrokerClient:
+    """Blocking client for the print broker."""
+
+    def __init__(self, address: Optional[str] = None, client: Optional[str] = None, timeout: float = 10.0):
+        self.address = address or default_address()
+        self.client = client or socket.gethostname()
+        tcp = _split_address(self.address)
+        if tcp:
+            self.sock = socket.create_connection(tcp, timeout=timeout)
+        else:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.settimeout(timeout)
+            self.sock.connect(self.address)
+        self._file = self.sock.makefile("rb")
+
+    def close(self):
+        self._file.close()
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def send(self, request: dict):
+        self.sock.sendall(json.dumps(request, ensure_ascii=False).encode("utf-8") + b"\n")
+
+    def receive(self) -> dict:
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError("Broker closed the connection")
+        return json.loads(line)
+
+    def submit(self, checks: list, priority: str = "normal", check_type: Optional[str] = None,
+               printer: Optional[str] = None, name: str = "", background: bool = False) -> dict:
+        """Submit a job and get its first status."""
+        self.send({"op": "submit", "client": self.client, "priority": priority, "checks": checks,
+                   "check_type": check_type, "printer": printer, "name": name,
+                   "background": background})
+        while True:
+            message = self.receive()
+            if message["event"] == "accepted":
+                return message["job"]
+            if message["event"] == "error":
+                raise ValueError(message["error"])
+
+    def wait(self, job_id: str, on_status=None, timeout: Optional[float] = None) -> dict:
+        """Wait for a job to finish, calling on_status(status) for each update."""
+        self.sock.settimeout(timeout)
+        while True:
+            message = self.receive()
+            if message.get("event") != "status" or message["job"]["job_id"] != job_id:
+                continue
+            status = message["job"]
+            if on_status is not None:
+                on_status(status)
+            if status["state"] not in ("queued", "printing"):
+                return status
+
+
+def main(argv=None):
+    """Run the print broker until interrupted."""
+    parser = argparse.ArgumentParser(prog="main.py broker", description="Shared print broker")
+    parser.add_argument("--address", default=None, help=f"socket path or host:port (default: ${BROKER_ENV} or per-user socket)")
+    parser.add_argument("--printer", action="append", default=[], help="printer name (repeat for several)")
+    parser.add_argument("--sink", action="append", default=[], help="file sink folder standing in for a printer")
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    app = QGuiApplication(sys.argv[:1])  # noqa: F841 - fonts and printing need an application
+    load_bundled_fonts()
+
+    outputs = {}
+    for name in args.printer:
+        outputs[name] = PrinterOutput(name)
+    for directory in args.sink:
+        outputs[f"sink:{os.path.basename(os.path.abspath(directory))}"] = FileSinkOutput(directory)
+    if not outputs:
+        outputs["default"] = PrinterOutput()
+
+    broker = PrintBroker(outputs)
+    try:
+        asyncio.run(broker.serve(args.address or default_address()))
+    except KeyboardInterrupt:
+        pass
@@ -2,25 +2,35 @@
 Custom print dialog for better check printing experience.
 """
 from PyQt6.QtGui import QPageLayout
-from PyQt6.QtCore import Qt,QMarginsF
+from PyQt6.QtCore import QMarginsF
 from PyQt6.QtPrintSupport import QPrinter, QPrintDialog
-from PyQt6.QtWidgets import QDialog, QVBoxLayout, QHBoxLayout, QSpinBox
-from qfluentwidgets import BodyLabel, PrimaryPushButton
+from PyQt6.QtWidgets import QDialog, QVBoxLayout, QHBoxLayout, QSpinBox, QDoubleSpinBox
+from qfluentwidgets import BodyLabel, PrimaryPushButton, CheckBox, ComboBox, LineEdit
+
+from src.print_profiles import PrintProfile
 
 
 class CheckPrintDialog(QDialog):
-    """Wrapper around standard print dialog with additional options."""
+    """Wrapper around standard print dialog with additional options.
+
+    With a printer catalog the printer is picked from its cached list and the
+    system print dialog (which enumerates printers again) is only shown on request.
+    """
     
-    def __init__(self, printer: QPrinter, parent=None):
+    def __init__(self, printer: QPrinter, parent=None, catalog=None, profile=None, profiles=False):
         super().__init__(parent)
         self.printer = printer
+        self.catalog = catalog
+        # Settings shown initially; with profiles=True the choices can be saved as a profile
+        self.initial_profile = profile or PrintProfile("")
+        self.profiles = profiles
         self.setWindowTitle("Imprimer le Chèque")
         self.setMinimumWidth(400)
         self.setMinimumHeight(300)
         
         # Configure printer defaults
         self.printer.setPageOrientation(QPageLayout.Orientation.Portrait)
-        self.printer.setPageMargins(QMarginsF(10, 10, 10, 10), QPageLayout.Unit.Millimeter)
+        self.set_margin(self.initial_profile.margin_mm)
         
         self.init_ui()
         self.result_code = QDialog.DialogCode.Rejected
@@ -35,17 +45,54 @@ class CheckPrintDialog(QDialog):
         title = BodyLabel("Configuration d'impression")
         layout.addWidget(title)
         
+        # Printer, from the discovery cache
+        self.printer_combo = None
+        self.system_dialog_check = None
+        names = self.catalog.names() if self.catalog is not None else []
+        if names:
+            printer_layout = QHBoxLayout()
+            printer_layout.addWidget(BodyLabel("Imprimante:"))
+            self.printer_combo = ComboBox()
+            for name in names:
+                self.printer_combo.addItem(name, userData=name)
+            current = self.initial_profile.printer_name or self.printer.printerName()
+            self.printer_combo.setCurrentIndex(names.index(current) if current in names else 0)
+            printer_layout.addWidget(self.printer_combo)
+            printer_layout.addStretch()
+            layout.addLayout(printer_layout)
+            self.printer_info = BodyLabel()
+            self.printer_combo.currentIndexChanged.connect(self.update_printer_info)
+            self.update_printer_info()
+            layout.addWidget(self.printer_info)
+            self.system_dialog_check = CheckBox("Options avancées (boîte d'impression système)")
+            layout.addWidget(self.system_dialog_check)
+        
         # Copies
         copies_layout = QHBoxLayout()
         copies_label = BodyLabel("Nombre de copies:")
         self.copies_spin = QSpinBox()
         self.copies_spin.setRange(1, 100)
-        self.copies_spin.setValue(1)
+        self.copies_spin.setValue(self.initial_profile.copies)
         copies_layout.addWidget(copies_label)
         copies_layout.addWidget(self.copies_spin)
         copies_layout.addStretch()
         layout.addLayout(copies_layout)
         
+        # Background (test prints only; real check stock is already printed)
+        self.background_check = CheckBox("Imprimer le fond (impression test)")
+        self.background_check.setChecked(self.initial_profile.background)
+        self.grayscale_check = CheckBox("Fond en niveaux de gris")
+        self.grayscale_check.setChecked(self.initial_profile.grayscale)
+        self.grayscale_check.setEnabled(self.initial_profile.background)
+        self.background_check.stateChanged.connect(
+            lambda: self.grayscale_check.setEnabled(self.background_check.isChecked())
+        )
+        layout.addWidget(self.background_check)
+        layout.addWidget(self.grayscale_check)
+        
+        if self.profiles:
+            self.init_profile_ui(layout)
+        
         layout.addStretch()
         
         # Buttons
@@ -64,12 +111,84 @@ class CheckPrintDialog(QDialog):
         button_layout.addWidget(self.cancel_button)
         layout.addLayout(button_layout)
     
+    def init_profile_ui(self, layout):
+        """Add the margin, calibration offset and profile name fields."""
+        # Calibration: where this printer actually puts the check
+        offset_layout = QHBoxLayout()
+        offset_layout.addWidget(BodyLabel("Marge (mm):"))
+        self.margin_spin = QDoubleSpinBox()
+        self.margin_spin.setRange(0, 30)
+        self.margin_spin.setSingleStep(0.5)
+        self.margin_spin.setDecimals(1)
+        self.margin_spin.setValue(self.initial_profile.margin_mm)
+        self.margin_spin.setStyleSheet("background-color: #f3f3f3; color: black;")
+        offset_layout.addWidget(self.margin_spin)
+        offset_layout.addWidget(BodyLabel("Décalage (mm) X:"))
+        self.offset_x_spin = QDoubleSpinBox()
+        self.offset_y_spin = QDoubleSpinBox()
+        for spin, value in ((self.offset_x_spin, self.initial_profile.offset_x_mm),
+                            (self.offset_y_spin, self.initial_profile.offset_y_mm)):
+            spin.setRange(-20, 20)
+            spin.setSingleStep(0.5)
+            spin.setDecimals(1)
+            spin.setValue(value)
+            spin.setStyleSheet("background-color: #f3f3f3; color: black;")
+        offset_layout.addWidget(self.offset_x_spin)
+        offset_layout.addWidget(BodyLabel("Y:"))
+        offset_layout.addWidget(self.offset_y_spin)
+        offset_layout.addStretch()
+        layout.addLayout(offset_layout)
+        
+        # Save these settings for quick print
+        self.profile_name_edit = LineEdit()
+        # Left empty so a one-off change does not overwrite the active profile
+        self.profile_name_edit.setPlaceholderText("Enregistrer comme profil rapide (nom)")
+        layout.addWidget(self.profile_name_edit)
+    
+    def update_printer_info(self, *args):
+        """Show the cached capabilities of the selected printer."""
+        capabilities = self.catalog.get(self.printer_combo.currentData())
+        self.printer_info.setText(capabilities.summary() if capabilities else "")
+    
     def get_printer(self) -> QPrinter:
         """Get configured printer."""
         # Set copies
         self.printer.setCopyCount(self.copies_spin.value())
+        if self.profiles:
+            self.set_margin(self.margin_spin.value())
         return self.printer
     
+    def set_margin(self, margin: float):
+        """Set the same page margin, in mm, on every side."""
+        self.printer.setPageMargins(QMarginsF(margin, margin, margin, margin), QPageLayout.Unit.Millimeter)
+    
+    def print_background(self) -> bool:
+        """Whether to print the template image under the text (test print)."""
+        return self.background_check.isChecked()
+    
+    def grayscale_background(self) -> bool:
+        """Whether to print the template image in grayscale."""
+        return self.grayscale_check.isChecked()
+    
+    def profile(self) -> PrintProfile:
+        """Get the chosen settings as a profile named after the profile field."""
+        profile = PrintProfile(
+            name="",
+            printer_name=self.printer.printerName(),
+            copies=self.copies_spin.value(),
+            margin_mm=self.initial_profile.margin_mm,
+            offset_x_mm=self.initial_profile.offset_x_mm,
+            offset_y_mm=self.initial_profile.offset_y_mm,
+            background=self.print_background(),
+            grayscale=self.grayscale_background(),
+        )
+        if self.profiles:
+            profile.name = self.profile_name_edit.text().strip()
+            profile.margin_mm = self.margin_spin.value()
+            profile.offset_x_mm = self.offset_x_spin.value()
+            profile.offset_y_mm = self.offset_y_spin.value()
+        return profile
+    
     def exec(self) -> int:
         """Execute the dialog."""
         result = super().exec()
@@ -89,6 +208,13 @@ class CheckPrintDialog(QDialog):
             # Set output format explicitly
             self.printer.setOutputFormat(QPrinter.OutputFormat.NativeFormat)
             
+            if self.printer_combo is not None and not self.system_dialog_check.isChecked():
+                name = self.printer_combo.currentData()
+                # Re-selecting the same printer would query it again
+                if name != self.printer.printerName():
+                    self.printer.setPrinterName(name)
+                return QDialog.DialogCode.Accepted
+            
             # Show standard print dialog for final printer selection
             print_dialog = QPrintDialog(self.printer, self)
             print_dialog.setWindowTitle("Imprimer le Chèque")
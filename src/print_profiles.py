@@ -0,0 +1,115 @@
+"""
+Saved print profiles for printing a check without dialogs.
+
+A profile holds everything the print dialogs ask for (printer, copies,
+margins, background) plus a calibration offset for the printer's paper feed.
+Profiles are stored with QSettings; the active one is used by quick print.
+"""
+from dataclasses import dataclass, fields
+from typing import Optional
+
+from PyQt6.QtCore import QMarginsF, QSettings
+from PyQt6.QtGui import QPageLayout
+from PyQt6.QtPrintSupport import QPrinter
+
+from src.renderers import get_check_rect
+
+SETTINGS_ORGANIZATION = "check_print"
+SETTINGS_APPLICATION = "check_print"
+MM_PER_INCH = 25.4
+
+
+@dataclass
+class PrintProfile:
+    """Printer settings and calibration for quick printing."""
+    name: str
+    printer_name: str = ""
+    copies: int = 1
+    margin_mm: float = 10.0
+    # Shifts the check on the page to match where the printer feeds it
+    offset_x_mm: float = 0.0
+    offset_y_mm: float = 0.0
+    # Overlay only on pre-printed stock; the background is for test prints
+    background: bool = False
+    grayscale: bool = True
+
+    def apply(self, printer: QPrinter):
+        """Configure a printer; the printer is only reselected when it changes."""
+        if self.printer_name and self.printer_name != printer.printerName():
+            printer.setPrinterName(self.printer_name)
+        printer.setOutputFormat(QPrinter.OutputFormat.NativeFormat)
+        printer.setCopyCount(self.copies)
+        printer.setPageOrientation(QPageLayout.Orientation.Portrait)
+        margin = self.margin_mm
+        printer.setPageMargins(QMarginsF(margin, margin, margin, margin), QPageLayout.Unit.Millimeter)
+
+    def check_rect(self, device):
+        """Get the check area on a device, shifted by the calibration offset."""
+        return get_check_rect(device).translated(
+            self.offset_x_mm * device.logicalDpiX() / MM_PER_INCH,
+            self.offset_y_mm * device.logicalDpiY() / MM_PER_INCH)
+
+
+class ProfileStore:
+    """Print profiles saved in the application settings."""
+
+    def __init__(self, settings: Optional[QSettings] = None):
+        self.settings = settings or QSettings(SETTINGS_ORGANIZATION, SETTINGS_APPLICATION)
+
+    def profiles(self) -> list:
+        """Get the saved profiles, in the order they were saved."""
+        profiles = []
+        count = self.settings.beginReadArray("print_profiles")
+        for i in range(count):
+            self.settings.setArrayIndex(i)
+            values = {}
+            for f in fields(PrintProfile):
+                value = self.settings.value(f.name)
+                if value is not None:
+                    values[f.name] = _convert(f.type, value)
+            if values.get("name"):
+                profiles.append(PrintProfile(**values))
+        self.settings.endArray()
+        return profiles
+
+    def get(self, name: str) -> Optional[PrintProfile]:
+        return next((p for p in self.profiles() if p.name == name), None)
+
+    def active(self) -> Optional[PrintProfile]:
+        """Get the profile quick print uses, or None if none is set."""
+        name = self.settings.value("active_print_profile")
+        return self.get(name) if name else None
+
+    def set_active(self, name: Optional[str]):
+        self.settings.setValue("active_print_profile", name or "")
+
+    def save(self, profile: PrintProfile):
+        """Add a profile or replace the one with the same name."""
+        profiles = [p for p in self.profiles() if p.name != profile.name] + [profile]
+        self._write(profiles)
+
+    def remove(self, name: str):
+        self._write([p for p in self.profiles() if p.name != name])
+        if self.settings.value("active_print_profile") == name:
+            self.set_active(None)
+
+    def _write(self, profiles: list):
+        self.settings.remove("print_profiles")
+        self.settings.beginWriteArray("print_profiles", len(profiles))
+        for i, profile in enumerate(profiles):
+            self.settings.setArrayIndex(i)
+            for f in fields(PrintProfile):
+                self.settings.setValue(f.name, getattr(profile, f.name))
+        self.settings.endArray()
+        self.settings.sync()
+
+
+def _convert(kind, value):
+    """Convert a settings value (a string in INI files) to a profile field type."""
+    if kind in (bool, "bool"):
+        return value if isinstance(value, bool) else str(value).lower() in ("true", "1")
+    if kind in (int, "int"):
+        return int(value)
+    if kind in (float, "float"):
+        return float(value)
+    return str(value)
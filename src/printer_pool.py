@@ -0,0 +1,313 @@
+"""
+Printer pool: print one batch on several identical printers at once.
+
+The batch is split into one contiguous range of checks per printer, sized by
+each printer's measured pages per minute, so every printer's stock can be
+loaded with the matching cheque numbers before the run. When a printer
+fails, the part of its range that was not confirmed by the spooler is split
+among the remaining printers and the reassignment is reported.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field, asdict
+from itertools import islice
+from typing import Optional
+
+from PyQt6.QtGui import QGuiApplication, QPainter
+from PyQt6.QtPrintSupport import QPrinter
+
+from src.batch import BatchIndex
+from src.batch_print import JOBS_DIR, job_id_for
+from src.fonts import load_bundled_fonts
+from src.models import CheckTemplate
+from src.pipeline import BatchPipeline
+from src.printers import make_printer
+from src.renderers import get_check_rect
+from src.template_cache import template_cache
+from src.utils import get_data_dir
+
+SPEEDS_FILE = "printer_speeds.json"
+# Assumed speed of a printer that has not been measured yet
+DEFAULT_PAGES_PER_MINUTE = 30.0
+# Pages per spool job; a failure loses at most one job, which is reprinted elsewhere
+SPOOL_PAGES = 20
+# Runs shorter than this do not update the measured speed
+MIN_MEASURED_PAGES = 20
+
+
+@dataclass
+class Shard:
+    """A contiguous range of record indexes, first inclusive and last exclusive."""
+    first: int
+    last: int
+
+
+@dataclass
+class PrinterStats:
+    """Measured speed and counters of one printer in the pool."""
+    name: str
+    pages_per_minute: float = DEFAULT_PAGES_PER_MINUTE
+    state: str = "idle"
+    pages: int = 0
+    skipped: int = 0
+    spool_jobs: int = 0
+    busy_seconds: float = 0.0
+    ranges: list = field(default_factory=list)
+    last_error: Optional[str] = None
+
+
+class PrinterPool:
+    """Shards a batch across printers and fails over between them."""
+
+    def __init__(self, printer_names: list, check_type: Optional[str] = None, background=None,
+                 spool_pages: int = SPOOL_PAGES, speeds_path: Optional[str] = None):
+        if not printer_names:
+            raise ValueError("Aucune imprimante")
+        self.check_type = check_type
+        self.background = background
+        self.spool_pages = max(1, spool_pages)
+        self.speeds_path = speeds_path or os.path.join(get_data_dir(), SPEEDS_FILE)
+        self.stats = {name: PrinterStats(name) for name in printer_names}
+        self._load_speeds()
+
+        self.reassigned = []
+        self.skipped = {}
+        self.unprinted = []
+        self._queues = {name: deque() for name in printer_names}
+        self._pending = 0
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._pipelines = {}
+        self._index = None
+
+    def healthy(self) -> list:
+        """Get the printers that have not failed."""
+        return [name for name, stats in self.stats.items() if stats.state != "failed"]
+
+    def plan(self, first: int, last: int, names: Optional[list] = None) -> list:
+        """Split [first, last) into contiguous (name, Shard) ranges proportional to speed."""
+        names = names or self.healthy()
+        speeds = [max(1.0, self.stats[name].pages_per_minute) for name in names]
+        total_speed = sum(speeds)
+        shards = []
+        start = first
+        cumulative = 0.0
+        for name, speed in zip(names, speeds):
+            cumulative += speed
+            end = first + round((last - first) * cumulative / total_speed)
+            if end > start:
+                shards.append((name, Shard(start, end)))
+            start = end
+        return shards
+
+    def stop(self):
+        """Stop every printer after its current spool job."""
+        self._stop.set()
+        for pipeline in list(self._pipelines.values()):
+            pipeline.stop()
+        with self._cond:
+            self._cond.notify_all()
+
+    def run(self, input_path: str) -> dict:
+        """Print a batch file on every printer of the pool and return the summary."""
+        input_path = os.path.abspath(input_path)
+        index_path = os.path.join(get_data_dir(JOBS_DIR), f"{job_id_for(input_path)}.idx")
+        self._index = BatchIndex.build(input_path, index_path)
+        total = len(self._index)
+
+        with self._cond:
+            for name, shard in self.plan(0, total):
+                self._assign(name, shard)
+                print(f"[PRINTER POOL] {name}: chèques {shard.first + 1}-{shard.last}")
+
+        threads = [threading.Thread(target=self._printer_loop, args=(name,),
+                                    name=f"printer-{name}", daemon=True)
+                   for name in self.stats]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self._save_speeds()
+        return self.summary()
+
+    def summary(self) -> dict:
+        """Get per-printer counters, reassigned and unprinted ranges, and skipped records."""
+        return {
+            "printers": {name: asdict(stats) for name, stats in self.stats.items()},
+            "reassigned": self.reassigned,
+            "unprinted": [(shard.first, shard.last) for shard in self.unprinted],
+            "skipped": self.skipped,
+        }
+
+    def _assign(self, name: str, shard: Shard):
+        """Queue a range on a printer. The condition must be held."""
+        self._queues[name].append(shard)
+        self.stats[name].ranges.append((shard.first, shard.last))
+        self._pending += 1
+        self._cond.notify_all()
+
+    def _printer_loop(self, name: str):
+        """Print the ranges queued for one printer until the whole batch is done."""
+        printer = make_printer(name)
+        stats = self.stats[name]
+        while True:
+            with self._cond:
+                # Stay available: a failing printer may hand over its range
+                while not self._queues[name] and self._pending and not self._stop.is_set():
+                    self._cond.wait()
+                if self._stop.is_set():
+                    self.unprinted.extend(self._queues[name])
+                    self._queues[name].clear()
+                if not self._queues[name]:
+                    return
+                shard = self._queues[name].popleft()
+
+            stats.state = "printing"
+            started = time.perf_counter()
+            try:
+                self._print_shard(printer, name, shard)
+            except Exception as e:
+                stats.busy_seconds += time.perf_counter() - started
+                self._fail(name, shard, e)
+                return
+            stats.busy_seconds += time.perf_counter() - started
+            stats.state = "idle"
+            with self._cond:
+                if shard.first < shard.last:
+                    # Stopped part way through
+                    self.unprinted.append(shard)
+                self._pending -= 1
+                self._cond.notify_all()
+
+    def _print_shard(self, printer: QPrinter, name: str, shard: Shard):
+        """Print a range in spool jobs, advancing shard.first as each job is spooled."""
+        stats = self.stats[name]
+        painter = QPainter()
+        job_pages = 0
+
+        def end_job(next_index: int):
+            nonlocal job_pages
+            if painter.isActive():
+                painter.end()
+                if printer.printerState() == QPrinter.PrinterState.Error:
+                    raise RuntimeError("Erreur de l'imprimante")
+                stats.pages += job_pages
+                stats.spool_jobs += 1
+            job_pages = 0
+            shard.first = next_index
+
+        def spool_page(page):
+            nonlocal job_pages
+            if self._stop.is_set() and not painter.isActive():
+                return
+            if page.error is not None:
+                with self._cond:
+                    self.skipped[str(page.index)] = page.error
+                stats.skipped += 1
+            else:
+                if not painter.isActive():
+                    printer.setDocName(f"Chèques {page.index + 1}+ ({name})")
+                    if not painter.begin(printer):
+                        raise RuntimeError("Failed to initialize painter")
+                else:
+                    printer.newPage()
+                page.renderer.draw(painter, get_check_rect(printer),
+                                   draw_background=self.background is not None, layout=page.layout)
+                job_pages += 1
+            if job_pages >= self.spool_pages or not painter.isActive():
+                end_job(page.index + 1)
+
+        def close(failed: bool):
+            if not painter.isActive():
+                return
+            if failed:
+                printer.abort()
+                painter.end()
+            else:
+                end_job(shard.last)
+
+        records = islice(self._index.read_from(shard.first), shard.last - shard.first)
+        pipeline = BatchPipeline(records, self.check_type, self.background,
+                                 dpi=printer.logicalDpiY())
+        self._pipelines[name] = pipeline
+        try:
+            pipeline.run(spool_page, close)
+        finally:
+            del self._pipelines[name]
+
+    def _fail(self, name: str, shard: Shard, error: Exception):
+        """Take a failed printer out and split its unprinted ranges among the others."""
+        stats = self.stats[name]
+        stats.state = "failed"
+        stats.last_error = str(error)
+        print(f"[PRINTER POOL] {name} failed: {error}")
+        with self._cond:
+            remaining = [shard] + list(self._queues[name])
+            self._queues[name].clear()
+            healthy = self.healthy()
+            for failed in remaining:
+                if failed.first >= failed.last:
+                    continue
+                if not healthy or self._stop.is_set():
+                    self.unprinted.append(failed)
+                    continue
+                for other, part in self.plan(failed.first, failed.last, healthy):
+                    self._assign(other, part)
+                    self.reassigned.append({"from": name, "to": other,
+                                            "first": part.first, "last": part.last})
+                    print(f"[PRINTER POOL] Chèques {part.first + 1}-{part.last}: {name} -> {other}")
+            self._pending -= len(remaining)
+            self._cond.notify_all()
+
+    def _load_speeds(self):
+        try:
+            with open(self.speeds_path, encoding="utf-8") as f:
+                speeds = json.load(f)
+        except (OSError, ValueError):
+            return
+        for name, stats in self.stats.items():
+            if isinstance(speeds.get(name), (int, float)):
+                stats.pages_per_minute = float(speeds[name])
+
+    def _save_speeds(self):
+        """Blend this run's measured speeds into the stored ones."""
+        try:
+            with open(self.speeds_path, encoding="utf-8") as f:
+                speeds = json.load(f)
+        except (OSError, ValueError):
+            speeds = {}
+        for name, stats in self.stats.items():
+            if stats.pages >= MIN_MEASURED_PAGES and stats.busy_seconds > 0:
+                measured = stats.pages / (stats.busy_seconds / 60)
+                stats.pages_per_minute = (stats.pages_per_minute + measured) / 2
+            speeds[name] = round(stats.pages_per_minute, 2)
+        tmp_path = f"{self.speeds_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(speeds, f, indent=2)
+        os.replace(tmp_path, self.speeds_path)
+
+
+def main(argv=None):
+    """Print a batch file on a pool of printers."""
+    parser = argparse.ArgumentParser(prog="main.py pool", description="Print a batch on several printers")
+    parser.add_argument("batch_file")
+    parser.add_argument("--printers", nargs="+", required=True, help="printer names")
+    parser.add_argument("--check-type", choices=sorted(CheckTemplate.TEMPLATES))
+    parser.add_argument("--background", action="store_true", help="print the template image (test prints)")
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    app = QGuiApplication(sys.argv[:1])  # noqa: F841 - fonts and printing need an application
+    load_bundled_fonts()
+    background = template_cache.load(args.check_type) if args.background and args.check_type else None
+
+    pool = PrinterPool(args.printers, args.check_type, background)
+    summary = pool.run(args.batch_file)
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+    sys.exit(1 if summary["unprinted"] else 0)
@@ -0,0 +1,171 @@
+"""
+Cached printer discovery and a persistent printer session.
+
+Listing printers and their capabilities goes through CUPS (or the Windows
+spooler) and can take seconds on a network. The catalog is read from a JSON
+cache at start-up and refreshed on the worker pool, so the print dialog never
+waits for discovery. The session keeps one configured QPrinter across prints,
+so a repeat print on the same printer skips setting it up again.
+"""
+import json
+import os
+import time
+from dataclasses import dataclass, field, asdict
+from typing import Optional
+
+from PyQt6.QtCore import QMarginsF, QTimer
+from PyQt6.QtGui import QPageLayout
+from PyQt6.QtPrintSupport import QPrinter, QPrinterInfo
+
+from src.utils import get_cache_dir
+from src.workers import submit, when_done
+
+PRINTERS_CACHE = "printers.json"
+# Printers are added and removed rarely; rediscover them in the background
+REFRESH_INTERVAL_MS = 5 * 60 * 1000
+
+
+def make_printer(printer_name: Optional[str] = None, pdf_path: Optional[str] = None) -> QPrinter:
+    """Create a printer with the check defaults, or a PDF file writer if pdf_path is given."""
+    printer = QPrinter(QPrinter.PrinterMode.HighResolution)
+    if pdf_path:
+        printer.setOutputFormat(QPrinter.OutputFormat.PdfFormat)
+        printer.setOutputFileName(pdf_path)
+    elif printer_name:
+        printer.setPrinterName(printer_name)
+    printer.setPageOrientation(QPageLayout.Orientation.Portrait)
+    printer.setPageMargins(QMarginsF(10, 10, 10, 10), QPageLayout.Unit.Millimeter)
+    return printer
+
+
+@dataclass
+class PrinterCapabilities:
+    """What a printer reported when it was last discovered."""
+    name: str
+    description: str = ""
+    location: str = ""
+    is_default: bool = False
+    resolutions: list = field(default_factory=list)
+    duplex: bool = False
+    page_sizes: list = field(default_factory=list)
+
+    def summary(self) -> str:
+        """Describe the printer in one line for the print dialog."""
+        parts = [self.location] if self.location else []
+        if self.resolutions:
+            parts.append(f"{max(self.resolutions)} ppp")
+        if self.duplex:
+            parts.append("recto-verso")
+        return ", ".join(parts)
+
+
+def discover_printers() -> list:
+    """Query the system for printers and their capabilities (slow)."""
+    printers = []
+    for info in QPrinterInfo.availablePrinters():
+        printers.append(PrinterCapabilities(
+            name=info.printerName(),
+            description=info.description(),
+            location=info.location(),
+            is_default=info.isDefault(),
+            resolutions=sorted(set(info.supportedResolutions())),
+            duplex=len(info.supportedDuplexModes()) > 1,
+            page_sizes=[size.name() for size in info.supportedPageSizes()],
+        ))
+    return printers
+
+
+def _write_cache(path: str, printers: list):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"refreshed": time.time(), "printers": [asdict(p) for p in printers]},
+                  f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+class PrinterCatalog:
+    """Printers known to the system, served from a cache refreshed in the background."""
+
+    def __init__(self, cache_path: Optional[str] = None):
+        self.cache_path = cache_path or os.path.join(get_cache_dir(), PRINTERS_CACHE)
+        self.printers = {}
+        self.refreshed = None
+        self.started = False
+        self._pending = None
+        self._timer = None
+
+    def start(self):
+        """Load the cached list, then rediscover now and periodically."""
+        self.started = True
+        self.load_cache()
+        self.refresh_async()
+        self._timer = QTimer()
+        self._timer.setInterval(REFRESH_INTERVAL_MS)
+        self._timer.timeout.connect(self.refresh_async)
+        self._timer.start()
+
+    def load_cache(self):
+        """Read the printers found by the last discovery, if any."""
+        try:
+            with open(self.cache_path, encoding="utf-8") as f:
+                cached = json.load(f)
+            printers = [PrinterCapabilities(**entry) for entry in cached["printers"]]
+        except (OSError, ValueError, KeyError, TypeError):
+            return
+        self.printers = {p.name: p for p in printers}
+        self.refreshed = cached.get("refreshed")
+
+    def refresh_async(self):
+        """Rediscover printers on the worker pool unless a discovery is running."""
+        if self._pending is not None:
+            return self._pending
+        self._pending = submit(discover_printers)
+        when_done(self._pending, self._on_discovered)
+        return self._pending
+
+    def _on_discovered(self, future):
+        self._pending = None
+        try:
+            printers = future.result()
+        except Exception as e:
+            print(f"[PRINTERS] Discovery failed: {e}")
+            return
+        self.printers = {p.name: p for p in printers}
+        self.refreshed = time.time()
+        when_done(submit(_write_cache, self.cache_path, printers), self._on_written)
+
+    def _on_written(self, future):
+        if future.exception() is not None:
+            print(f"[PRINTERS] Could not save printer cache: {future.exception()}")
+
+    def names(self) -> list:
+        """Get printer names, the default printer first."""
+        return sorted(self.printers, key=lambda name: (not self.printers[name].is_default, name.lower()))
+
+    def default_name(self) -> Optional[str]:
+        names = self.names()
+        return names[0] if names else None
+
+    def get(self, name: str) -> Optional[PrinterCapabilities]:
+        return self.printers.get(name)
+
+
+class PrinterSession:
+    """One configured printer reused from one print to the next."""
+
+    def __init__(self):
+        self._printer = None
+
+    @property
+    def printer(self) -> QPrinter:
+        if self._printer is None:
+            self._printer = make_printer()
+        return self._printer
+
+    def printer_name(self) -> Optional[str]:
+        """Get the name of the printer in use, or None before the first print."""
+        return self._printer.printerName() if self._printer is not None else None
+
+    def reset(self):
+        """Drop the printer after an error so the next print sets it up afresh."""
+        self._printer = None
@@ -0,0 +1,353 @@
+"""
+PostScript, PCL 5 and ESC/P overlays sent straight to the printer.
+
+The text of each check is written as a few printer-language commands using
+the printer's resident fonts, so a page is a few hundred bytes instead of a
+rasterized image. PostScript and PCL are for laser printers; ESC/P prints
+continuous check forms on dot-matrix printers in text mode. Jobs are sent as
+raw data:
+
+    lp:NAME            through CUPS with "lp -o raw"
+    socket:HOST[:PORT] to the printer's raw port (JetDirect, 9100)
+    file:DIR           into numbered files, as a local stand-in for a printer
+
+    python main.py raw paie.csv --format pcl --to socket:10.0.0.21 --check-type BNA
+
+The output only depends on the checks and options (no dates or job ids), so
+a job can be compared byte for byte with a reference file.
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+from itertools import islice
+from typing import Optional
+
+from src.batch import read_batch_records, record_to_data
+from src.models import CheckTemplate, CHECK_HEIGHT_MM
+from src.pdf_direct import POINTS_PER_MM, text_runs
+
+# Check origin on the page: the margins make_printer() sets
+DEFAULT_ORIGIN_MM = (10.0, 10.0)
+A4_POINTS = (595.28, 841.89)
+RAW_PORT = 9100
+PAGES_PER_JOB = 100
+
+# PCL typefaces: Univers (4148) and Courier (4099), Windows Latin 1 symbol set
+PCL_SYMBOL_SET = b"\x1b(19U"
+# HP printers start the portrait logical page 1/4 inch (180 decipoints) inside the paper
+PCL_LOGICAL_PAGE_OFFSET = 180
+UEL = b"\x1b%-12345X"
+
+# ESC/P (24-pin): vertical moves in 1/180 inch, horizontal positions in 1/60 inch
+ESCP_VERTICAL_UNITS = 180
+ESCP_HORIZONTAL_UNITS = 60
+# (characters per inch, select command): pica, elite, 15 cpi, condensed pica, condensed elite
+ESCP_PITCHES = (
+    (10.0, b"\x1bP\x12"),
+    (12.0, b"\x1bM\x12"),
+    (15.0, b"\x1bg\x12"),
+    (17.14, b"\x1bP\x0f"),
+    (20.0, b"\x1bM\x0f"),
+)
+# Text-mode characters are 10.5 points at every pitch; superscript ones are 2/3 of that
+ESCP_POINT_SIZE = 10.5
+ESCP_SCRIPT_SCALE = 2 / 3
+# The print position is the top of the character, this fraction of its point size above the baseline
+ESCP_ASCENT_RATIO = 0.8
+
+
+def ps_string(text: str) -> bytes:
+    """Encode text as a 7-bit PostScript string in ISO Latin 1."""
+    out = bytearray(b"(")
+    for byte in text.encode("latin-1", errors="replace"):
+        if byte in b"()\\":
+            out += b"\\" + bytes([byte])
+        elif byte < 32 or byte > 126:
+            out += b"\\%03o" % byte
+        else:
+            out.append(byte)
+    return bytes(out + b")")
+
+
+class PostScriptOverlay:
+    """Writes checks as PostScript pages using resident fonts."""
+
+    extension = ".ps"
+
+    def __init__(self, check_type: Optional[str] = None, origin_mm: tuple = DEFAULT_ORIGIN_MM,
+                 page_size: tuple = A4_POINTS):
+        self.positions = CheckTemplate.get_positions(check_type)
+        self.origin = (origin_mm[0] * POINTS_PER_MM, origin_mm[1] * POINTS_PER_MM)
+        self.page_size = page_size
+
+    def document(self, checks: list) -> bytes:
+        """Get a PostScript job with one page per check."""
+        width, height = self.page_size
+        parts = [
+            b"%!PS-Adobe-3.0\n%%Creator: Check Printer\n",
+            b"%%%%Pages: %d\n%%%%DocumentNeededResources: font Helvetica-Bold Courier\n" % len(checks),
+            b"%%EndComments\n%%BeginProlog\n",
+            # Re-encode the resident fonts for accented letters
+            b"/L1 { findfont dup length dict begin { 1 index /FID ne { def } { pop pop } ifelse } forall\n"
+            b" /Encoding ISOLatin1Encoding def currentdict end definefont pop } bind def\n",
+            b"/Helvetica-Bold-L1 /Helvetica-Bold L1 /Courier-L1 /Courier L1\n",
+            b"/amount { /Helvetica-Bold-L1 exch selectfont } bind def\n",
+            b"/text { /Courier-L1 exch selectfont } bind def\n",
+            b"/T { moveto show } bind def\n",
+            b"%%EndProlog\n%%BeginSetup\n",
+            b"<< /PageSize [%.2f %.2f] >> setpagedevice\n" % (width, height),
+            b"%%EndSetup\n",
+        ]
+        left, top = self.origin
+        for number, data in enumerate(checks, 1):
+            parts.append(b"%%%%Page: %d %d\n" % (number, number))
+            for font, size, x, y, value in text_runs(data, self.positions):
+                parts.append(b"%.1f %s %s %.2f %.2f T\n"
+                             % (size, font.encode(), ps_string(value), left + x, height - top - y))
+            parts.append(b"showpage\n")
+        parts.append(b"%%EOF\n")
+        return b"".join(parts)
+
+
+class PclOverlay:
+    """Writes checks as PCL 5 pages using resident fonts."""
+
+    extension = ".pcl"
+
+    def __init__(self, check_type: Optional[str] = None, origin_mm: tuple = DEFAULT_ORIGIN_MM):
+        self.positions = CheckTemplate.get_positions(check_type)
+        self.origin = (origin_mm[0] * POINTS_PER_MM, origin_mm[1] * POINTS_PER_MM)
+
+    @staticmethod
+    def font(font: str, size: float) -> bytes:
+        """Select a resident font at a point size."""
+        if font == "amount":
+            return PCL_SYMBOL_SET + b"\x1b(s1p%.2fv0s3b4148T" % size
+        # Courier is fixed pitch: characters per inch = 120 / point size
+        return PCL_SYMBOL_SET + b"\x1b(s0p%.2fh%.2fv0s0b4099T" % (120 / size, size)
+
+    def document(self, checks: list) -> bytes:
+        """Get a PCL job with one page per check."""
+        parts = [
+            UEL, b"@PJL ENTER LANGUAGE=PCL\r\n",
+            # Reset, A4, portrait, no top margin, no perforation skip
+            b"\x1bE\x1b&l26a0o0e0L",
+        ]
+        left, top = self.origin
+        current = None
+        for number, data in enumerate(checks):
+            if number:
+                parts.append(b"\x0c")
+            for font, size, x, y, value in text_runs(data, self.positions):
+                if (font, size) != current:
+                    parts.append(self.font(font, size))
+                    current = (font, size)
+                # Decipoints; the cursor is on the baseline
+                parts.append(b"\x1b&a%dh%dV" % (round((left + x) * 10) - PCL_LOGICAL_PAGE_OFFSET,
+                                                round((top + y) * 10)))
+                parts.append(value.encode("cp1252", errors="replace"))
+        parts += [b"\x1bE", UEL]
+        return b"".join(parts)
+
+
+def _escp_page_length(units: int) -> tuple:
+    """Get (line spacing, lines) whose product is closest to a form length in 1/180 inch."""
+    return min(((spacing, max(1, min(127, round(units / spacing)))) for spacing in range(1, 256)),
+               key=lambda pair: (abs(pair[0] * pair[1] - units), -pair[0]))
+
+
+class EscpOverlay:
+    """Writes checks as ESC/P text-mode pages for continuous forms on dot-matrix printers."""
+
+    extension = ".prn"
+
+    def __init__(self, check_type: Optional[str] = None, origin_mm: tuple = (0.0, 0.0),
+                 form_length_mm: float = CHECK_HEIGHT_MM, letter_quality: bool = False):
+        self.positions = CheckTemplate.get_positions(check_type)
+        self.origin = (origin_mm[0] * POINTS_PER_MM, origin_mm[1] * POINTS_PER_MM)
+        # The form length must match the perforation pitch of the stock
+        self.form_length = round(form_length_mm / 25.4 * ESCP_VERTICAL_UNITS)
+        self.letter_quality = letter_quality
+
+    @staticmethod
+    def select_font(font: str, size: float) -> tuple:
+        """Get the commands selecting a text-mode font for a Courier run, and its ascent (1/180 inch).
+
+        The pitch is the widest one no wider than the Courier run; runs small
+        enough for superscript characters (the date) are printed in them.
+        """
+        width = 0.6 * size / 72
+        command = ESCP_PITCHES[-1][1]
+        for cpi, select in ESCP_PITCHES:
+            if 1 / cpi <= width + 1e-6:
+                command = select
+                break
+        # Bold for the amount, as in the rendered check
+        command += b"\x1bE" if font == "amount" else b"\x1bF"
+        glyph_size = ESCP_POINT_SIZE
+        if size <= ESCP_POINT_SIZE * ESCP_SCRIPT_SCALE:
+            command += b"\x1bS\x00"
+            glyph_size *= ESCP_SCRIPT_SCALE
+        else:
+            command += b"\x1bT"
+        return command, round(glyph_size * ESCP_ASCENT_RATIO / 72 * ESCP_VERTICAL_UNITS)
+
+    def page(self, data: dict) -> bytes:
+        """Get one form: forward micro-feeds, absolute columns and the field text."""
+        left, top = self.origin
+        lines = []
+        for font, size, x, y, value in text_runs(data, self.positions):
+            command, ascent = self.select_font(font, size)
+            row = max(0, round((top + y) / 72 * ESCP_VERTICAL_UNITS) - ascent)
+            column = max(0, round((left + x) / 72 * ESCP_HORIZONTAL_UNITS))
+            lines.append((row, column, command, value))
+        # Continuous paper only feeds forward
+        lines.sort(key=lambda line: line[:2])
+
+        parts = []
+        position = 0
+        for row, column, command, value in lines:
+            feed = row - position
+            while feed > 0:
+                # ESC J prints the current line and feeds n/180 inch
+                step = min(feed, 255)
+                parts.append(b"\x1bJ" + bytes([step]))
+                feed -= step
+            position = max(position, row)
+            parts.append(command)
+            parts.append(b"\x1b$" + bytes([column % 256, column // 256]))
+            parts.append(value.encode("cp437", errors="replace"))
+        # Print the last line and go to the top of the next form
+        parts.append(b"\r\x0c")
+        return b"".join(parts)
+
+    def document(self, checks: list) -> bytes:
+        """Get an ESC/P job with one form per check."""
+        spacing, lines = _escp_page_length(self.form_length)
+        header = (
+            b"\x1b@"                                         # reset
+            + b"\x1bx" + (b"\x01" if self.letter_quality else b"\x00")
+            + b"\x1bt\x01\x1bR\x00"                          # PC437 accents, USA
+            + b"\x1b3" + bytes([spacing]) + b"\x1bC" + bytes([lines])  # form length
+        )
+        return header + b"".join(self.page(data) for data in checks) + b"\x1b@"
+
+
+FORMATS = {"ps": PostScriptOverlay, "pcl": PclOverlay, "escp": EscpOverlay}
+
+
+class LpSink:
+    """Sends jobs through CUPS without filtering."""
+
+    def __init__(self, printer_name: Optional[str] = None):
+        self.printer_name = printer_name
+
+    def send(self, data: bytes, title: str):
+        command = ["lp", "-o", "raw", "-t", title]
+        if self.printer_name:
+            command += ["-d", self.printer_name]
+        result = subprocess.run(command, input=data, capture_output=True)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.decode(errors="replace").strip() or "lp a échoué")
+
+
+class SocketSink:
+    """Sends jobs to a printer's raw TCP port."""
+
+    def __init__(self, host: str, port: int = RAW_PORT, timeout: float = 30.0):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+    def send(self, data: bytes, title: str):
+        with socket.create_connection((self.host, self.port), timeout=self.timeout) as connection:
+            connection.sendall(data)
+            # Wait for the printer to read everything before closing
+            connection.shutdown(socket.SHUT_WR)
+            while connection.recv(4096):
+                pass
+
+
+class FileSink:
+    """Writes each job to a numbered file, standing in for a printer."""
+
+    def __init__(self, directory: str, extension: str = ".prn"):
+        self.directory = os.path.abspath(directory)
+        self.extension = extension
+        os.makedirs(self.directory, exist_ok=True)
+        self.jobs = len([name for name in os.listdir(self.directory) if name.endswith(extension)])
+
+    def send(self, data: bytes, title: str):
+        self.jobs += 1
+        path = os.path.join(self.directory, f"{self.jobs:06d}{self.extension}")
+        with open(path, "wb") as f:
+            f.write(data)
+
+
+def open_sink(target: str, extension: str = ".prn"):
+    """Get the sink for "lp[:NAME]", "socket:HOST[:PORT]" or "file:DIR"."""
+    kind, _, where = target.partition(":")
+    if kind == "lp":
+        return LpSink(where or None)
+    if kind == "socket" and where:
+        host, _, port = where.partition(":")
+        return SocketSink(host, int(port) if port else RAW_PORT)
+    if kind == "file" and where:
+        return FileSink(where, extension)
+    raise ValueError(f"Destination inconnue: {target!r} (lp:NOM, socket:HÔTE[:PORT] ou file:DOSSIER)")
+
+
+def print_batch(input_path: str, overlay, sink, pages_per_job: int = PAGES_PER_JOB) -> dict:
+    """Send a batch file as overlay jobs of up to pages_per_job checks."""
+    name = os.path.basename(input_path)
+    errors = {}
+    pages = 0
+    jobs = 0
+
+    def valid_checks():
+        for index, record in enumerate(read_batch_records(input_path)):
+            try:
+                yield record_to_data(record)
+            except ValueError as e:
+                errors[str(index)] = str(e)
+
+    checks = valid_checks()
+    while True:
+        chunk = list(islice(checks, pages_per_job))
+        if not chunk:
+            break
+        data = overlay.document(chunk)
+        sink.send(data, f"{name} ({pages + 1}-{pages + len(chunk)})")
+        jobs += 1
+        pages += len(chunk)
+        print(f"[RAW OVERLAY] {name}: job {jobs}, {len(chunk)} pages, {len(data)} bytes")
+    return {"pages": pages, "jobs": jobs, "skipped": errors}
+
+
+def main(argv=None):
+    """Send a batch file to a printer as PostScript, PCL or ESC/P overlays."""
+    parser = argparse.ArgumentParser(prog="main.py raw", description="Raw PostScript/PCL/ESC/P check printing")
+    parser.add_argument("batch_file")
+    parser.add_argument("--format", choices=sorted(FORMATS), default="pcl")
+    parser.add_argument("--to", required=True, help="lp[:NAME], socket:HOST[:PORT] or file:DIR")
+    parser.add_argument("--check-type", choices=sorted(CheckTemplate.TEMPLATES))
+    parser.add_argument("--origin", type=float, nargs=2, metavar=("X_MM", "Y_MM"),
+                        help="check position from the top left of the paper (default: 10 10, escp: 0 0)")
+    parser.add_argument("--form-length", type=float, default=CHECK_HEIGHT_MM,
+                        help="escp: continuous form length in mm (perforation to perforation)")
+    parser.add_argument("--nlq", action="store_true", help="escp: letter quality instead of draft")
+    parser.add_argument("--pages-per-job", type=int, default=PAGES_PER_JOB)
+    args = parser.parse_args(argv)
+
+    overlay_class = FORMATS[args.format]
+    options = {"origin_mm": tuple(args.origin)} if args.origin else {}
+    if overlay_class is EscpOverlay:
+        options.update(form_length_mm=args.form_length, letter_quality=args.nlq)
+    overlay = overlay_class(args.check_type, **options)
+    sink = open_sink(args.to, overlay_class.extension)
+    summary = print_batch(args.batch_file, overlay, sink, max(1, args.pages_per_job))
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+    sys.exit(0 if summary["pages"] else 1)
@@ -0,0 +1,257 @@
+"""
+Local render service for other applications (e.g. the ERP).
+
+A long-lived process keeps Qt, the fonts, the template images and the
+amount-to-words cache warm, and renders checks to PDF or PNG on request over
+localhost HTTP or a Unix socket:
+
+    POST /render  {"amount": "11800,50", "beneficiary": "...", "location": "...",
+                   "date": "2024-05-01", "check_type": "BNA", "format": "pdf"}
+    GET  /health
+"""
+import argparse
+import json
+import os
+import socket
+import stat
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import ThreadingMixIn, UnixStreamServer
+
+from PyQt6.QtCore import QBuffer, QIODevice, QMarginsF, QSizeF
+from PyQt6.QtGui import QColor, QGuiApplication, QImage, QPageSize, QPainter, QPdfWriter
+
+from src.batch import record_to_data
+from src.fonts import load_bundled_fonts
+from src.models import CheckTemplate, CHECK_WIDTH_MM, CHECK_HEIGHT_MM
+from src.pipeline import render_device
+from src.renderers import CheckRenderer, get_check_rect
+from src.template_cache import template_cache
+from src.workers import executor
+
+DEFAULT_PORT = 8765
+DEFAULT_DPI = 300
+MAX_REQUEST_BYTES = 1024 * 1024
+MAX_CHECKS_PER_REQUEST = 500
+CONTENT_TYPES = {"pdf": "application/pdf", "png": "image/png"}
+
+
+def pdf_writer(output, dpi: int = DEFAULT_DPI) -> QPdfWriter:
+    """Create a PDF writer with check-sized pages for a file name or QIODevice."""
+    writer = QPdfWriter(output)
+    writer.setCreator("Check Printer")
+    writer.setResolution(dpi)
+    writer.setPageSize(QPageSize(QSizeF(CHECK_WIDTH_MM, CHECK_HEIGHT_MM), QPageSize.Unit.Millimeter))
+    writer.setPageMargins(QMarginsF(0, 0, 0, 0))
+    return writer
+
+
+def render_pdf(checks: list, check_type=None, background=None, dpi: int = DEFAULT_DPI) -> bytes:
+    """Render check data as a PDF with one check-sized page per check."""
+    buffer = QBuffer()
+    buffer.open(QIODevice.OpenModeFlag.WriteOnly)
+    writer = pdf_writer(buffer, dpi)
+
+    painter = QPainter(writer)
+    rect = get_check_rect(writer)
+    try:
+        for i, data in enumerate(checks):
+            if i:
+                writer.newPage()
+            CheckRenderer(data, background, check_type).draw(
+                painter, rect, draw_background=background is not None)
+    finally:
+        painter.end()
+    return bytes(buffer.data())
+
+
+def render_png(data: dict, check_type=None, background=None, dpi: int = DEFAULT_DPI) -> bytes:
+    """Render one check as a PNG at the given resolution."""
+    device = render_device(dpi)
+    rect = get_check_rect(device)
+    image = QImage(rect.size().toSize(), QImage.Format.Format_RGB32)
+    image.setDotsPerMeterX(device.dotsPerMeterX())
+    image.setDotsPerMeterY(device.dotsPerMeterY())
+    image.fill(QColor(255, 255, 255))
+    painter = QPainter(image)
+    painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+    try:
+        CheckRenderer(data, background, check_type).draw(
+            painter, rect, draw_background=background is not None)
+    finally:
+        painter.end()
+
+    buffer = QBuffer()
+    buffer.open(QIODevice.OpenModeFlag.WriteOnly)
+    image.save(buffer, "PNG")
+    return bytes(buffer.data())
+
+
+def render_request(payload: dict) -> tuple:
+    """Render a request body to (bytes, content type). Raises ValueError if it is invalid."""
+    if not isinstance(payload, dict):
+        raise ValueError("Requête invalide: objet JSON attendu")
+    records = payload.get("checks", [payload])
+    if not isinstance(records, list) or not records or len(records) > MAX_CHECKS_PER_REQUEST:
+        raise ValueError("Requête invalide: 'checks' doit contenir entre 1 et "
+                         f"{MAX_CHECKS_PER_REQUEST} chèques")
+
+    fmt = payload.get("format", "pdf")
+    if not isinstance(fmt, str) or fmt.lower() not in CONTENT_TYPES:
+        raise ValueError(f"Format inconnu: {fmt!r}")
+    fmt = fmt.lower()
+    check_type = payload.get("check_type")
+    if check_type is not None and (not isinstance(check_type, str)
+                                   or check_type not in CheckTemplate.TEMPLATES):
+        raise ValueError(f"Type de chèque inconnu: {check_type!r}")
+    dpi = payload.get("dpi", DEFAULT_DPI)
+    # bool is an int subclass but never a resolution
+    if not isinstance(dpi, int) or isinstance(dpi, bool) or not 72 <= dpi <= 1200:
+        raise ValueError(f"Résolution invalide: {dpi!r}")
+
+    checks = []
+    for i, record in enumerate(records):
+        if not isinstance(record, dict):
+            raise ValueError(f"Chèque {i + 1}: objet attendu")
+        checks.append(record_to_data(record))
+    background = None
+    if payload.get("background") and check_type:
+        background = template_cache.load(check_type)
+
+    if fmt == "png":
+        if len(checks) > 1:
+            raise ValueError("Le format PNG ne contient qu'un seul chèque")
+        return render_png(checks[0], check_type, background, dpi), CONTENT_TYPES[fmt]
+    return render_pdf(checks, check_type, background, dpi), CONTENT_TYPES[fmt]
+
+
+def warm_up():
+    """Load fonts and templates and render once per template."""
+    started = time.perf_counter()
+    load_bundled_fonts()
+    sample = {"amount": "1", "beneficiary": "-", "location": "-", "date": "01/01/2000"}
+    for check_type in CheckTemplate.TEMPLATES:
+        template_cache.load(check_type)
+        render_request({**sample, "check_type": check_type})
+    print(f"[RENDER SERVICE] Warm in {time.perf_counter() - started:.2f} s")
+
+
+class RenderRequestHandler(BaseHTTPRequestHandler):
+    """Handles render requests; rendering runs on the shared worker pool."""
+
+    server_version = "CheckPrinter"
+    # Keep connections open so the ERP can send requests back to back
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if self.path != "/health":
+            self._send_json(404, {"error": "Not found"})
+            return
+        self._send_json(200, {"status": "ok"})
+
+    def do_POST(self):
+        if self.path != "/render":
+            self._send_json(404, {"error": "Not found"})
+            return
+        # The body is not read on these errors, so the connection cannot be reused
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            self._send_json(400, {"error": "Invalid Content-Length"}, close=True)
+            return
+        if length > MAX_REQUEST_BYTES:
+            self._send_json(413, {"error": "Request too large"}, close=True)
+            return
+
+        started = time.perf_counter()
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            body, content_type = executor.submit(render_request, payload).result()
+        except ValueError as e:
+            self._send_json(400, {"error": str(e)})
+            return
+        except Exception as e:
+            print(f"[RENDER SERVICE] Render failed: {e}")
+            self._send_json(500, {"error": str(e)})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("X-Render-Time-Ms", f"{(time.perf_counter() - started) * 1000:.1f}")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status: int, data: dict, close: bool = False):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        if close:
+            # Also sets close_connection
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self) -> str:
+        # Unix socket peers have no address
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+    def log_message(self, format, *args):
+        print(f"[RENDER SERVICE] {self.address_string()} {format % args}")
+
+
+class UnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    """HTTP server listening on a Unix socket."""
+    daemon_threads = True
+
+    def server_bind(self):
+        # Replace a socket left by a previous run, but never another file
+        try:
+            mode = os.stat(self.server_address).st_mode
+        except FileNotFoundError:
+            pass
+        else:
+            if not stat.S_ISSOCK(mode):
+                raise OSError(f"{self.server_address} exists and is not a socket")
+            os.remove(self.server_address)
+        super().server_bind()
+        # Only the user running the service may connect
+        os.chmod(self.server_address, 0o600)
+
+
+def create_server(socket_path=None, port: int = DEFAULT_PORT):
+    """Create the server on a Unix socket if given, else on localhost:port."""
+    if socket_path:
+        if not hasattr(socket, "AF_UNIX"):
+            raise OSError("Unix sockets are not available on this system")
+        return UnixHTTPServer(socket_path, RenderRequestHandler)
+    return ThreadingHTTPServer(("127.0.0.1", port), RenderRequestHandler)
+
+
+def main(argv=None):
+    """Run the render service until interrupted."""
+    parser = argparse.ArgumentParser(prog="main.py serve", description="Check render service")
+    parser.add_argument("--socket", help="listen on this Unix socket instead of TCP")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="localhost TCP port")
+    args = parser.parse_args(argv)
+
+    # Fonts and painting need a GUI application, but no display
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    app = QGuiApplication(sys.argv[:1])  # noqa: F841 - must outlive the server
+    warm_up()
+
+    server = create_server(args.socket, args.port)
+    where = args.socket or f"http://127.0.0.1:{args.port}"
+    print(f"[RENDER SERVICE] Listening on {where}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.socket and os.path.exists(args.socket):
+            os.remove(args.socket)
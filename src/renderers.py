@@ -1,48 +1,78 @@
 """
 Check rendering logic for preview and printing.
 """
-from PyQt6.QtCore import Qt, QRectF
-from PyQt6.QtGui import QPainter, QFont, QColor
+import math
+from PyQt6.QtCore import Qt, QRectF, QPointF, QSize
+from PyQt6.QtGui import QPainter, QFont, QColor, QImage
+from src.backgrounds import background_provider, check_size_pixels
+from src.fonts import get_font
 from src.models import CheckTemplate
+from src.text_layout import text_layout_cache, text_fitter, font_metrics_cache
+from src.utils import format_amount_display
+
+def get_check_rect(device) -> QRectF:
+    """Get the physical check area, in device pixels, at the device origin."""
+    return QRectF(QPointF(0, 0), check_size_pixels(device.logicalDpiX(), device.logicalDpiY()))
+
+
+# Fraction of the check width kept clear to the right of the amount in words
+WORDS_RIGHT_MARGIN = 0.03
+# Font sizes in points; the amount in words starts at TEXT_POINT_SIZE and is fitted
+AMOUNT_POINT_SIZE = 10.0
+TEXT_POINT_SIZE = 11.0
+DATE_POINT_SIZE = 6.0
+# The amount's baseline is this many device pixels below its position
+AMOUNT_BASELINE_OFFSET = 20
+
+
+def draw_background_image(painter: QPainter, rect: QRectF, image, grayscale=False):
+    """Draw a template image resampled once to the device pixels it covers."""
+    target = rect.toRect()
+    transform = painter.transform()
+    scale = math.hypot(transform.m11(), transform.m12()) * painter.device().devicePixelRatioF()
+    size = QSize(round(target.width() * scale), round(target.height() * scale))
+    background = background_provider.get(image, size, grayscale)
+    if isinstance(background, QImage):
+        painter.drawImage(target, background)
+    else:
+        painter.drawPixmap(target, background)
 
 
 class CheckRenderer:
     """Renders check data onto a painter surface."""
     
-    def __init__(self, data, background_image=None, check_type=None):
+    def __init__(self, data, background_image=None, check_type=None, positions=None):
         self.data = data
         self.background_image = background_image
         self.check_type = check_type
         
         # Fonts
-        self.font_amount_num = QFont("Arial", 10, QFont.Weight.Bold)
-        self.font_text = QFont("Courier New", 11)
-        self.font_date = QFont("Courier New", 6)
+        self.font_amount_num = get_font("Arial", AMOUNT_POINT_SIZE, QFont.Weight.Bold)
+        self.font_text = get_font("Courier New", TEXT_POINT_SIZE)
+        self.font_date = get_font("Courier New", DATE_POINT_SIZE)
         
-        # Get positions for this check type
-        positions = CheckTemplate.get_positions(check_type)
-        self.pos_amount_num = positions["amount_num"]
-        self.pos_amount_words = positions["amount_words"]
-        self.pos_beneficiary = positions["beneficiary"]
-        self.pos_location = positions["location"]
-        self.pos_date = positions["date"]
-
-    def draw(self, painter: QPainter, rect: QRectF, draw_background=False):
-        """Draw the check on the painter."""
+        # Get positions for this check type (the preview passes its own
+        # draggable positions, shared by reference)
+        if positions is None:
+            positions = CheckTemplate.get_positions(check_type)
+        self.positions = positions
+
+    def draw(self, painter: QPainter, rect: QRectF, draw_background=False, grayscale=False, layout=None):
+        """Draw the check on the painter, reusing a layout_text() result if given."""
         painter.save()
         
         if draw_background:
-            self._draw_background(painter, rect)
+            self._draw_background(painter, rect, grayscale)
         
         painter.setPen(Qt.GlobalColor.black)
-        self._draw_text_elements(painter, rect)
+        self._draw_text_elements(painter, rect, layout)
         
         painter.restore()
 
-    def _draw_background(self, painter: QPainter, rect: QRectF):
+    def _draw_background(self, painter: QPainter, rect: QRectF, grayscale=False):
         """Draw the background image or fallback."""
         if self.background_image and not self.background_image.isNull():
-            painter.drawPixmap(rect.toRect(), self.background_image)
+            draw_background_image(painter, rect, self.background_image, grayscale)
         else:
             painter.setPen(Qt.PenStyle.NoPen)
             painter.setBrush(QColor(240, 248, 255))
@@ -57,33 +87,61 @@ class CheckRenderer:
                 int(rect.x() + rect.width() * 0.9), int(rect.y() + rect.height() * 0.35)
             )
 
-    def _draw_text_elements(self, painter: QPainter, rect: QRectF):
-        """Draw all text elements on the check."""
-        def get_pos(pct_tuple):
-            return (rect.x() + rect.width() * pct_tuple[0],
-                    rect.y() + rect.height() * pct_tuple[1])
-
-        # Draw Numeric Amount
-        painter.setFont(self.font_amount_num)
-        x, y = get_pos(self.pos_amount_num)
-        amount_str = f"{self.data['amount']:,.2f}".replace(",", "X").replace(".", ",").replace("X", " ")
-        painter.drawText(int(x), int(y + 20), amount_str)
-
-        # Draw Words
-        painter.setFont(self.font_text)
-        x, y = get_pos(self.pos_amount_words)
-        painter.drawText(int(x), int(y), self.data['words'])
-
-        # Draw Beneficiary
-        x, y = get_pos(self.pos_beneficiary)
-        painter.drawText(int(x), int(y), self.data['beneficiary'])
-
-        # Draw Location
-        x, y = get_pos(self.pos_location)
-        painter.drawText(int(x), int(y), self.data['location'])
-
-        # Draw Date
-        painter.setFont(self.font_date)
-        x, y = get_pos(self.pos_date)
+    def layout_text(self, rect: QRectF, device=None) -> list:
+        """Get (name, text, font, x, y) for each line of text, y at the baseline."""
+        def get_pos(name):
+            pct = self.positions[name]
+            return (rect.x() + rect.width() * pct[0],
+                    rect.y() + rect.height() * pct[1])
+
+        runs = []
+
+        # Numeric amount
+        x, y = get_pos("amount_num")
+        runs.append(("amount_num", format_amount_display(self.data['amount']),
+                     self.font_amount_num, int(x), int(y + AMOUNT_BASELINE_OFFSET)))
+
+        # Words, shrunk or wrapped onto a second line to fit the check
+        x, y = get_pos("amount_words")
+        max_width = rect.right() - rect.width() * WORDS_RIGHT_MARGIN - x
+        fit = text_fitter.fit(self.data['words'], self.font_text, max_width, device,
+                              self._room_below(y, get_pos, device))
+        line_spacing = font_metrics_cache.metrics(fit.font, fit.font.pointSizeF(), device).lineSpacing()
+        for i, line in enumerate(fit.lines):
+            runs.append(("amount_words", line, fit.font, int(x), int(y + i * line_spacing)))
+
+        # Beneficiary and location
+        for name in ("beneficiary", "location"):
+            x, y = get_pos(name)
+            runs.append((name, self.data[name], self.font_text, int(x), int(y)))
+
+        # Date
+        x, y = get_pos("date")
         date_str = self.data['date'].toString("dd/MM/yyyy")
-        painter.drawText(int(x), int(y), f"le {date_str}")
+        runs.append(("date", f"le {date_str}", self.font_date, int(x), int(y)))
+        return runs
+
+    def _room_below(self, y: float, get_pos, device=None):
+        """Get the height from baseline y down to the top of the nearest field below, or None."""
+        tops = []
+        for name, font in (("beneficiary", self.font_text), ("location", self.font_text),
+                           ("date", self.font_date)):
+            field_y = get_pos(name)[1]
+            if field_y > y:
+                tops.append(field_y - font_metrics_cache.metrics(font, font.pointSizeF(), device).ascent())
+        return min(tops) - y if tops else None
+
+    def get_field_bounds(self, rect: QRectF, device=None) -> dict:
+        """Get the measured bounding box of each text element."""
+        bounds = {}
+        for name, text, font, x, y in self.layout_text(rect, device):
+            box = text_layout_cache.measure(text, font, x, y, device)
+            bounds[name] = bounds[name].united(box) if name in bounds else box
+        return bounds
+
+    def _draw_text_elements(self, painter: QPainter, rect: QRectF, layout=None):
+        """Draw all text elements on the check."""
+        if layout is None:
+            layout = self.layout_text(rect, painter.device())
+        for name, text, font, x, y in layout:
+            text_layout_cache.draw(painter, x, y, text, font)
@@ -0,0 +1,183 @@
+"""
+Decoded template images with a persistent raw-pixel disk cache.
+
+Templates are decoded, rotated and scaled once, then written as raw pixels.
+Later launches memory-map the raw file straight into a QImage, so no JPEG or
+PNG decoding happens until the source image changes.
+"""
+import glob
+import hashlib
+import mmap
+import os
+import struct
+import threading
+from concurrent.futures import Future
+from typing import Optional
+
+from PyQt6.QtCore import QSize
+from PyQt6.QtGui import QImage, QImageReader, QTransform
+
+from src.models import CheckTemplate
+from src.utils import get_resource_path, get_cache_dir
+from src.workers import submit, completed
+
+# Width the preview needs; full resolution is only decoded for printing
+PREVIEW_MAX_WIDTH = 1200
+
+CACHE_MAGIC = b"CHKIMG1\0"
+# magic, width, height, bytes per line, QImage.Format
+CACHE_HEADER = struct.Struct("<8sIIII")
+
+
+def file_digest(path: str) -> str:
+    """Get the SHA-256 of a file."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def decode_template(path: str, rotation: int = 0, max_width: Optional[int] = None) -> QImage:
+    """Decode a template image, rotated and scaled down to max_width."""
+    reader = QImageReader(path)
+    if max_width:
+        # Let the decoder scale (JPEG scales in the DCT domain) instead of
+        # decoding full size and shrinking afterwards
+        size = reader.size()
+        rotated_width = size.height() if rotation % 180 else size.width()
+        if size.isValid() and rotated_width > max_width:
+            scale = max_width / rotated_width
+            reader.setScaledSize(QSize(max(1, round(size.width() * scale)),
+                                       max(1, round(size.height() * scale))))
+
+    image = reader.read()
+    if image.isNull():
+        return image
+    if rotation:
+        image = image.transformed(QTransform().rotate(rotation))
+    if max_width and image.width() > max_width:
+        image = image.scaledToWidth(max_width)
+    return image
+
+
+class TemplateCache:
+    """In-memory and on-disk cache of decoded template images."""
+
+    def __init__(self, cache_dir: Optional[str] = None):
+        self.cache_dir = cache_dir
+        self._images = {}
+        self._digests = {}
+        # Memory maps backing cached QImages; kept open for the process lifetime
+        self._mappings = []
+        self._pending = {}
+        # Re-entrant: a future that is already done runs its callback inline
+        self._lock = threading.RLock()
+
+    def get(self, check_type: str, max_width: Optional[int] = None) -> Optional[QImage]:
+        """Get a template image if it is already loaded in memory."""
+        with self._lock:
+            return self._images.get((check_type, max_width))
+
+    def load(self, check_type: str, max_width: Optional[int] = None) -> QImage:
+        """Load a template image from memory, the disk cache, or the source file."""
+        image = self.get(check_type, max_width)
+        if image is not None:
+            return image
+
+        path = get_resource_path(CheckTemplate.get_template_path(check_type))
+        cache_path = self._cache_path(check_type, path, max_width)
+        image = self._read_cached(cache_path)
+        if image is None:
+            image = decode_template(path, CheckTemplate.get_rotation(check_type), max_width)
+            if not image.isNull():
+                self._write_cached(cache_path, image)
+
+        if not image.isNull():
+            with self._lock:
+                self._images[(check_type, max_width)] = image
+        return image
+
+    def load_async(self, check_type: str, max_width: Optional[int] = None) -> Future:
+        """Load a template on the worker pool, sharing any load already running."""
+        key = (check_type, max_width)
+        with self._lock:
+            if key in self._images:
+                return completed(self._images[key])
+            future = self._pending.get(key)
+            if future is None:
+                future = submit(self.load, check_type, max_width)
+                self._pending[key] = future
+                future.add_done_callback(lambda f: self._forget_pending(key))
+            return future
+
+    def _forget_pending(self, key):
+        with self._lock:
+            self._pending.pop(key, None)
+
+    def _cache_path(self, check_type: str, path: str, max_width: Optional[int]) -> str:
+        """Get the raw cache file for a source file's current contents."""
+        stat = os.stat(path)
+        stamp = (stat.st_size, stat.st_mtime_ns)
+        cached = self._digests.get(path)
+        if cached is None or cached[0] != stamp:
+            cached = (stamp, file_digest(path))
+            self._digests[path] = cached
+
+        cache_dir = self.cache_dir or get_cache_dir("templates")
+        size = max_width or "full"
+        return os.path.join(cache_dir, f"{check_type}-{size}-{cached[1][:16]}.raw")
+
+    def _read_cached(self, cache_path: str) -> Optional[QImage]:
+        """Memory-map a raw cache file into a QImage."""
+        try:
+            with open(cache_path, "rb") as f:
+                mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        except (OSError, ValueError):
+            return None
+
+        try:
+            magic, width, height, bytes_per_line, fmt = CACHE_HEADER.unpack_from(mapping)
+        except struct.error:
+            magic = None
+        if magic != CACHE_MAGIC or len(mapping) != CACHE_HEADER.size + bytes_per_line * height:
+            mapping.close()
+            return None
+
+        pixels = memoryview(mapping)[CACHE_HEADER.size:]
+        image = QImage(pixels, width, height, bytes_per_line, QImage.Format(fmt))
+        with self._lock:
+            self._mappings.append((mapping, pixels))
+        return image
+
+    def _write_cached(self, cache_path: str, image: QImage):
+        """Write an image as raw pixels and drop stale files for the same template."""
+        if image.hasAlphaChannel():
+            image = image.convertToFormat(QImage.Format.Format_ARGB32_Premultiplied)
+        else:
+            image = image.convertToFormat(QImage.Format.Format_RGB32)
+
+        prefix = os.path.basename(cache_path).rsplit("-", 1)[0]
+        tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(CACHE_HEADER.pack(CACHE_MAGIC, image.width(), image.height(),
+                                          image.bytesPerLine(), image.format().value))
+                f.write(image.constBits().asstring(image.sizeInBytes()))
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            print(f"[TEMPLATE CACHE] Could not write {cache_path}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+
+        for stale in glob.glob(os.path.join(os.path.dirname(cache_path), f"{prefix}-*.raw")):
+            if stale != cache_path:
+                try:
+                    os.remove(stale)
+                except OSError:
+                    pass
+
+
+# Shared by the application window and batch workers
+template_cache = TemplateCache()
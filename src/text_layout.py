@@ -0,0 +1,255 @@
+"""
+Cached text layout for check rendering.
+
+Shaping a string is the expensive part of drawText(); the preview repaints the
+same handful of fields on every drag frame, so each field is shaped once into a
+QStaticText and reused until its string, font or scale changes.
+
+The caches are shared with thumbnail rendering on worker threads, so lookups
+and insertions are guarded by a lock.
+"""
+import math
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from PyQt6.QtCore import Qt, QPointF, QRectF
+from PyQt6.QtGui import QFont, QFontMetricsF, QPainter, QStaticText, QTransform
+
+
+@dataclass(frozen=True)
+class TextRun:
+    """A pre-shaped line of text with its measured metrics."""
+    static_text: QStaticText
+    bounds: QRectF      # Relative to the baseline origin
+    ascent: float
+    line_spacing: float
+
+
+class TextLayoutCache:
+    """LRU cache of pre-shaped text runs keyed by string, font and scale."""
+
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self._runs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, text: str, font: QFont, scale: float = 1.0, device=None) -> TextRun:
+        """Get the cached run for text, shaping it on first use."""
+        dpi = device.logicalDpiY() if device is not None else 0
+        key = (text, font.key(), round(scale, 4), dpi)
+        with self._lock:
+            run = self._runs.get(key)
+            if run is not None:
+                self._runs.move_to_end(key)
+                return run
+
+        metrics = QFontMetricsF(font, device) if device is not None else QFontMetricsF(font)
+        static_text = QStaticText(text)
+        static_text.setTextFormat(Qt.TextFormat.PlainText)
+        static_text.setPerformanceHint(QStaticText.PerformanceHint.AggressiveCaching)
+        static_text.prepare(QTransform.fromScale(scale, scale), font)
+        run = TextRun(static_text, metrics.boundingRect(text), metrics.ascent(), metrics.lineSpacing())
+
+        with self._lock:
+            self._runs[key] = run
+            if len(self._runs) > self.max_entries:
+                self._runs.popitem(last=False)
+        return run
+
+    def measure(self, text: str, font: QFont, x: float, y: float, device=None) -> QRectF:
+        """Get the bounding box of text drawn with its baseline at (x, y)."""
+        return self.get(text, font, 1.0, device).bounds.translated(x, y)
+
+    def draw(self, painter: QPainter, x: float, y: float, text: str, font: QFont) -> QRectF:
+        """Draw text with its baseline at (x, y) and return its bounding box."""
+        transform = painter.transform()
+        scale = math.hypot(transform.m11(), transform.m12())
+        run = self.get(text, font, scale, painter.device())
+        if text:
+            painter.setFont(font)
+            painter.drawStaticText(QPointF(x, y - run.ascent), run.static_text)
+        return run.bounds.translated(x, y)
+
+    def clear(self):
+        """Drop all cached runs."""
+        with self._lock:
+            self._runs.clear()
+
+
+class FontMetricsCache:
+    """Cache of QFontMetricsF and text advances per font size and resolution."""
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self._metrics = {}
+        self._widths = OrderedDict()
+        self._lock = threading.Lock()
+
+    def metrics(self, font: QFont, point_size: float, device=None) -> QFontMetricsF:
+        """Get metrics for font at the given point size."""
+        dpi = device.logicalDpiY() if device is not None else 0
+        key = (font.key(), point_size, dpi)
+        metrics = self._metrics.get(key)
+        if metrics is None:
+            sized = QFont(font)
+            sized.setPointSizeF(point_size)
+            metrics = QFontMetricsF(sized, device) if device is not None else QFontMetricsF(sized)
+            self._metrics[key] = metrics
+        return metrics
+
+    def width(self, text: str, font: QFont, point_size: float, device=None) -> float:
+        """Get the horizontal advance of text at the given point size."""
+        dpi = device.logicalDpiY() if device is not None else 0
+        key = (text, font.key(), point_size, dpi)
+        width = self._widths.get(key)
+        if width is None:
+            width = self.metrics(font, point_size, device).horizontalAdvance(text)
+            with self._lock:
+                self._widths[key] = width
+                if len(self._widths) > self.max_entries:
+                    self._widths.popitem(last=False)
+        return width
+
+
+# Word fitting: text is shrunk in SIZE_STEP steps down to MIN_POINT_SIZE on
+# one line, then wrapped onto two, then shrunk further down to FLOOR_POINT_SIZE
+MIN_POINT_SIZE = 7.0
+FLOOR_POINT_SIZE = 5.0
+SIZE_STEP = 0.5
+
+
+def fit_text(text: str, base_size: float, max_width: float, max_height, width, vertical,
+             min_size: float = MIN_POINT_SIZE, floor_size: float = FLOOR_POINT_SIZE,
+             step: float = SIZE_STEP) -> tuple:
+    """Get (size, lines) for text, shrunk, then wrapped, to fit a width and height.
+
+    width(line, size) measures a line and vertical(size) gives (line spacing,
+    descent), so printers and writers without Qt fonts can share the rules.
+    max_height is the room below the first baseline, or None.
+    """
+    def fits(lines, size):
+        if not all(width(line, size) <= max_width for line in lines):
+            return False
+        if len(lines) > 1 and max_height is not None:
+            line_spacing, descent = vertical(size)
+            return (len(lines) - 1) * line_spacing + descent <= max_height
+        return True
+
+    def largest_size(lines, smallest):
+        """Binary search the size grid between smallest and the base size."""
+        if fits(lines, base_size):
+            return base_size
+        lo, hi = 0, int((base_size - smallest) / step) - 1
+        best = None
+        while lo <= hi:
+            mid = (lo + hi) // 2
+            size = smallest + mid * step
+            if fits(lines, size):
+                best = size
+                lo = mid + 1
+            else:
+                hi = mid - 1
+        return best
+
+    lines = (text,)
+    size = largest_size(lines, min_size)
+    if size is not None:
+        return size, lines
+    wrapped = _split_balanced(text, lambda line: width(line, base_size))
+    size = largest_size(wrapped, min_size)
+    if size is not None:
+        return size, wrapped
+    # Nothing fits at the minimum size: keep shrinking whichever layout stays larger
+    floor = min(floor_size, base_size)
+    one_line = largest_size(lines, floor)
+    two_lines = largest_size(wrapped, floor)
+    if two_lines is not None and (one_line is None or two_lines > one_line):
+        return two_lines, wrapped
+    if one_line is not None:
+        return one_line, lines
+    return floor, wrapped
+
+
+def _split_balanced(text: str, width) -> tuple:
+    """Break text at the space that makes the longer line shortest."""
+    words = text.split(" ")
+    if len(words) < 2:
+        return (text,)
+    best = None
+    for i in range(1, len(words)):
+        first, second = " ".join(words[:i]), " ".join(words[i:])
+        longest = max(width(first), width(second))
+        if best is None or longest < best[0]:
+            best = (longest, (first, second))
+    return best[1]
+
+
+@dataclass(frozen=True)
+class FitResult:
+    """Font size and line breaks chosen to fit text into a width."""
+    font: QFont
+    lines: tuple
+
+
+class TextFitter:
+    """Fits text with fit_text(), measured with the font's metrics, and caches the result."""
+
+    def __init__(self, metrics_cache: FontMetricsCache, min_point_size: float = MIN_POINT_SIZE,
+                 step: float = SIZE_STEP, floor_point_size: float = FLOOR_POINT_SIZE,
+                 max_entries: int = 1024):
+        self.metrics_cache = metrics_cache
+        self.min_point_size = min_point_size
+        self.step = step
+        self.floor_point_size = floor_point_size
+        self.max_entries = max_entries
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def fit(self, text: str, font: QFont, max_width: float, device=None, max_height=None) -> FitResult:
+        """Pick the largest size that fits on one line, else on two lines.
+
+        max_height is the room below the first baseline for the other lines,
+        down to the top of the next field; None leaves the height unchecked.
+        """
+        dpi = device.logicalDpiY() if device is not None else 0
+        height_key = round(max_height, 1) if max_height is not None else None
+        key = (text, font.key(), round(max_width, 1), height_key, dpi)
+        with self._lock:
+            result = self._results.get(key)
+            if result is not None:
+                self._results.move_to_end(key)
+                return result
+
+        def vertical(size):
+            metrics = self.metrics_cache.metrics(font, size, device)
+            return metrics.lineSpacing(), metrics.descent()
+
+        base_size = font.pointSizeF()
+        size, lines = fit_text(
+            text, base_size, max_width, max_height,
+            lambda line, size: self.metrics_cache.width(line, font, size, device), vertical,
+            self.min_point_size, self.floor_point_size, self.step)
+
+        if size == base_size:
+            result = FitResult(font, lines)
+        else:
+            fitted = QFont(font)
+            fitted.setPointSizeF(size)
+            result = FitResult(fitted, lines)
+
+        with self._lock:
+            self._results[key] = result
+            if len(self._results) > self.max_entries:
+                self._results.popitem(last=False)
+        return result
+
+    def fit_all(self, texts, font: QFont, max_width: float, device=None, max_height=None) -> list:
+        """Fit every text of a batch up front, e.g. before a print job."""
+        return [self.fit(text, font, max_width, device, max_height) for text in texts]
+
+
+# Shared between the preview widget and the print renderer
+text_layout_cache = TextLayoutCache()
+font_metrics_cache = FontMetricsCache()
+text_fitter = TextFitter(font_metrics_cache)
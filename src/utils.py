@@ -3,6 +3,7 @@ Utility functions for the Check Printer application.
 """
 import os
 import sys
+from functools import lru_cache
 from num2words import num2words
 
 
@@ -18,6 +19,35 @@ def get_resource_path(filename: str) -> str:
     return os.path.join(base_path, filename)
 
 
+def get_cache_dir(*parts: str) -> str:
+    """Get (and create) a per-user cache directory for the application."""
+    if is_windows():
+        base_path = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    elif is_macos():
+        base_path = os.path.expanduser("~/Library/Caches")
+    else:
+        base_path = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+
+    path = os.path.join(base_path, "check_print", *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def get_data_dir(*parts: str) -> str:
+    """Get (and create) a per-user data directory for the application."""
+    if is_windows():
+        base_path = os.environ.get("APPDATA") or os.path.expanduser("~")
+    elif is_macos():
+        base_path = os.path.expanduser("~/Library/Application Support")
+    else:
+        base_path = os.environ.get("XDG_DATA_HOME") or os.path.expanduser("~/.local/share")
+
+    path = os.path.join(base_path, "check_print", *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+@lru_cache(maxsize=4096)
 def amount_to_words(amount: float, language: str = 'fr') -> str:
     """Convert numeric amount to words."""
     try:
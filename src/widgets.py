@@ -2,17 +2,124 @@
 Custom PyQt6 widgets for the Check Printer application.
 """
 from PyQt6.QtCore import Qt, QRectF, QDate
-from PyQt6.QtGui import QPainter, QFont, QColor, QPixmap
+from PyQt6.QtGui import QPainter, QColor, QPixmap, QImage
 from PyQt6.QtWidgets import QWidget
 from qfluentwidgets import CardWidget
-from PyQt6.QtWidgets import QGraphicsDropShadowEffect
 
-from src.models import CheckTemplate
-from src.renderers import CheckRenderer
+from src.fonts import get_font
+from src.models import CheckTemplate, CHECK_WIDTH_MM, CHECK_HEIGHT_MM
+from src.renderers import CheckRenderer, draw_background_image
 
-# Constants
-CHECK_WIDTH_MM = 175
-CHECK_HEIGHT_MM = 80
+# Card shadow
+SHADOW_BLUR = 15
+SHADOW_OFFSET = (0, 4)
+SHADOW_COLOR = QColor(0, 0, 0, 50)
+
+# Hit-testing
+HIT_PADDING = 6
+MIN_HIT_WIDTH = 40
+MIN_HIT_HEIGHT = 20
+
+# update_data() default: keep the current background
+_KEEP = object()
+
+
+class FieldHitIndex:
+    """Uniform grid over measured field boxes for constant-time hit tests."""
+
+    CELL_SIZE = 32
+
+    def __init__(self, bounds: dict):
+        self._boxes = {}
+        self._cells = {}
+        cell = self.CELL_SIZE
+        for name, box in bounds.items():
+            left = box.left() - HIT_PADDING
+            right = max(box.right(), box.left() + MIN_HIT_WIDTH) + HIT_PADDING
+            top = min(box.top(), box.bottom() - MIN_HIT_HEIGHT) - HIT_PADDING
+            bottom = box.bottom() + HIT_PADDING
+            self._boxes[name] = (left, top, right, bottom)
+            for cx in range(int(left // cell), int(right // cell) + 1):
+                for cy in range(int(top // cell), int(bottom // cell) + 1):
+                    self._cells.setdefault((cx, cy), []).append(name)
+
+    def element_at(self, x: float, y: float):
+        """Get the name of the field under (x, y), or None."""
+        cell = self.CELL_SIZE
+        for name in self._cells.get((int(x // cell), int(y // cell)), ()):
+            left, top, right, bottom = self._boxes[name]
+            if left <= x <= right and top <= y <= bottom:
+                return name
+        return None
+
+
+def _box_blur(values: list, size: int, radius: int) -> list:
+    """Blur a square grid of floats with a separable box filter."""
+    def blur_rows(grid):
+        out = []
+        for row in grid:
+            acc = sum(row[0:radius + 1]) + row[0] * radius
+            blurred = []
+            for i in range(size):
+                blurred.append(acc / (2 * radius + 1))
+                acc += row[min(i + radius + 1, size - 1)] - row[max(i - radius, 0)]
+            out.append(blurred)
+        return out
+
+    transposed = [list(col) for col in zip(*blur_rows(values))]
+    return [list(col) for col in zip(*blur_rows(transposed))]
+
+
+_shadow_tile = None
+
+
+def get_shadow_tile() -> QImage:
+    """Get the pre-blurred shadow nine-patch tile, built once per process.
+
+    The tile is a blurred square of size 4 * SHADOW_BLUR + 1. Its corners are
+    2 * SHADOW_BLUR wide and its middle row and column are uniform, so they
+    can be stretched to any card size.
+    """
+    global _shadow_tile
+    if _shadow_tile is None:
+        size = 4 * SHADOW_BLUR + 1
+        pad = SHADOW_BLUR
+        grid = [[1.0 if pad <= x < size - pad and pad <= y < size - pad else 0.0
+                 for x in range(size)] for y in range(size)]
+        # Three box passes approximate the Gaussian of the old drop shadow effect
+        radius = max(1, SHADOW_BLUR // 3)
+        for _ in range(3):
+            grid = _box_blur(grid, size, radius)
+
+        tile = QImage(size, size, QImage.Format.Format_ARGB32)
+        color = QColor(SHADOW_COLOR)
+        for y in range(size):
+            for x in range(size):
+                color.setAlpha(round(SHADOW_COLOR.alpha() * grid[y][x]))
+                tile.setPixelColor(x, y, color)
+        _shadow_tile = tile
+    return _shadow_tile
+
+
+def draw_nine_patch(painter: QPainter, target: QRectF, tile: QImage, corner: int):
+    """Draw tile stretched over target, keeping its corners unscaled."""
+    middle = tile.width() - 2 * corner
+    x0, y0 = target.left(), target.top()
+    x1, y1 = target.right() - corner, target.bottom() - corner
+    inner_w, inner_h = target.width() - 2 * corner, target.height() - 2 * corner
+    # (target, source) for the corners and edges; the centre is hidden by the card
+    patches = [
+        (QRectF(x0, y0, corner, corner), QRectF(0, 0, corner, corner)),
+        (QRectF(x1, y0, corner, corner), QRectF(corner + middle, 0, corner, corner)),
+        (QRectF(x0, y1, corner, corner), QRectF(0, corner + middle, corner, corner)),
+        (QRectF(x1, y1, corner, corner), QRectF(corner + middle, corner + middle, corner, corner)),
+        (QRectF(x0 + corner, y0, inner_w, corner), QRectF(corner, 0, middle, corner)),
+        (QRectF(x0 + corner, y1, inner_w, corner), QRectF(corner, corner + middle, middle, corner)),
+        (QRectF(x0, y0 + corner, corner, inner_h), QRectF(0, corner, corner, middle)),
+        (QRectF(x1, y0 + corner, corner, inner_h), QRectF(corner + middle, corner, corner, middle)),
+    ]
+    for target_rect, source_rect in patches:
+        painter.drawImage(target_rect, tile, source_rect)
 
 
 class CheckPreviewWidget(CardWidget):
@@ -31,12 +138,9 @@ class CheckPreviewWidget(CardWidget):
         self.check_type = None
         self.setMinimumHeight(300)
         
-        # Add shadow effect
-        shadow = QGraphicsDropShadowEffect(self)
-        shadow.setBlurRadius(15)
-        shadow.setOffset(0, 4)
-        shadow.setColor(QColor(0, 0, 0, 50))
-        self.setGraphicsEffect(shadow)
+        # Card shadow, drawn from a pre-blurred nine-patch rather than a
+        # QGraphicsDropShadowEffect, which re-blurs the widget on every repaint
+        self._shadow_pixmap = None
         
         # Draggable positions
         self.draggable_positions = CheckTemplate.DEFAULT_POSITIONS.copy()
@@ -44,16 +148,34 @@ class CheckPreviewWidget(CardWidget):
         self.drag_offset = (0, 0)
         self.setMouseTracking(True)
 
-    def update_data(self, data, background_image=None, check_type=None):
-        """Update preview data."""
+        # Preview fonts; the date is drawn larger than on paper for readability
+        self.font_date = get_font("Courier New", 9)
+        self.renderer = self._make_renderer()
+        self._hit_index = None
+        self._hover_element = None
+
+    def _make_renderer(self) -> CheckRenderer:
+        """Create the renderer used to draw the preview text."""
+        renderer = CheckRenderer(self.data, check_type=self.check_type,
+                                 positions=self.draggable_positions)
+        renderer.font_date = self.font_date
+        return renderer
+
+    def update_data(self, data, background_image=_KEEP, check_type=None):
+        """Update preview data; a background_image of None clears the background."""
         self.data = data
-        if background_image is not None:
+        if background_image is not _KEEP:
             self.background_image = background_image
-            print(f"[IMAGE SIZE] {self.background_image.width()} x {self.background_image.height()}")
         if check_type is not None:
             self.check_type = check_type
             self.draggable_positions = CheckTemplate.get_positions(check_type).copy()
+        self.renderer = self._make_renderer()
+        self.invalidate_layout()
         self.update()
+
+    def invalidate_layout(self):
+        """Drop the hit-test index; it is rebuilt on the next lookup."""
+        self._hit_index = None
     
     def get_target_rect(self) -> QRectF:
         """Calculate the rectangle for drawing the check."""
@@ -65,22 +187,32 @@ class CheckPreviewWidget(CardWidget):
     
     def get_element_at(self, pos):
         """Find which text element is at the given position."""
-        rect = self.get_target_rect()
-        for name, pct in self.draggable_positions.items():
-            x = rect.x() + rect.width() * pct[0]
-            y = rect.y() + rect.height() * pct[1]
-            
-            # Create larger hit boxes
-            if name == "amount_words":
-                hit_rect = QRectF(x - 20, y - 20, 350, 40)
-            elif name == "amount_num":
-                hit_rect = QRectF(x - 20, y - 10, 150, 50)
-            else:
-                hit_rect = QRectF(x - 20, y - 20, 200, 40)
-            
-            if hit_rect.contains(pos.x(), pos.y()):
-                return name
-        return None
+        if self._hit_index is None:
+            bounds = self.renderer.get_field_bounds(self.get_target_rect(), self)
+            self._hit_index = FieldHitIndex(bounds)
+        return self._hit_index.element_at(pos.x(), pos.y())
+
+    def resizeEvent(self, event):
+        """Rebuild hit boxes and the shadow for the new size."""
+        self.invalidate_layout()
+        self._shadow_pixmap = None
+        super().resizeEvent(event)
+
+    def get_shadow_pixmap(self) -> QPixmap:
+        """Get the card shadow for the current size, composed once per resize."""
+        if self._shadow_pixmap is None:
+            ratio = self.devicePixelRatioF()
+            pixmap = QPixmap(round(self.width() * ratio), round(self.height() * ratio))
+            pixmap.setDevicePixelRatio(ratio)
+            pixmap.fill(Qt.GlobalColor.transparent)
+
+            rect = self.get_target_rect().translated(*SHADOW_OFFSET)
+            target = rect.adjusted(-SHADOW_BLUR, -SHADOW_BLUR, SHADOW_BLUR, SHADOW_BLUR)
+            painter = QPainter(pixmap)
+            draw_nine_patch(painter, target, get_shadow_tile(), 2 * SHADOW_BLUR)
+            painter.end()
+            self._shadow_pixmap = pixmap
+        return self._shadow_pixmap
     
     def mousePressEvent(self, event):
         """Handle mouse press for dragging."""
@@ -111,10 +243,12 @@ class CheckPreviewWidget(CardWidget):
         else:
             # Change cursor when hovering
             element = self.get_element_at(event.pos())
-            if element:
-                self.setCursor(Qt.CursorShape.OpenHandCursor)
-            else:
-                self.setCursor(Qt.CursorShape.ArrowCursor)
+            if element != self._hover_element:
+                self._hover_element = element
+                if element:
+                    self.setCursor(Qt.CursorShape.OpenHandCursor)
+                else:
+                    self.setCursor(Qt.CursorShape.ArrowCursor)
         super().mouseMoveEvent(event)
     
     def mouseReleaseEvent(self, event):
@@ -126,6 +260,8 @@ class CheckPreviewWidget(CardWidget):
             for name, p in self.draggable_positions.items():
                 print(f"    self.pos_{name} = ({p[0]:.3f}, {p[1]:.3f})")
             self.dragging = None
+            self._hover_element = None
+            self.invalidate_layout()
             self.setCursor(Qt.CursorShape.ArrowCursor)
         super().mouseReleaseEvent(event)
 
@@ -136,49 +272,19 @@ class CheckPreviewWidget(CardWidget):
         
         rect = self.get_target_rect()
         
+        # Draw shadow
+        painter.drawPixmap(0, 0, self.get_shadow_pixmap())
+        
         # Draw background
         if self.background_image and not self.background_image.isNull():
-            painter.drawPixmap(rect.toRect(), self.background_image)
+            draw_background_image(painter, rect, self.background_image)
         else:
             painter.setPen(Qt.PenStyle.NoPen)
             painter.setBrush(QColor(240, 248, 255))
             painter.drawRect(rect)
         
         # Draw text elements
-        painter.setPen(Qt.GlobalColor.black)
-        font_amount_num = QFont("Arial", 10, QFont.Weight.Bold)
-        font_text = QFont("Courier New", 11)
-        font_date = QFont("Courier New", 9)
-        
-        def get_pos(name):
-            pct = self.draggable_positions[name]
-            return (rect.x() + rect.width() * pct[0],
-                    rect.y() + rect.height() * pct[1])
-        
-        # Draw Numeric Amount
-        painter.setFont(font_amount_num)
-        x, y = get_pos("amount_num")
-        amount_str = f"{self.data['amount']:,.2f}".replace(",", "X").replace(".", ",").replace("X", " ")
-        painter.drawText(int(x), int(y + 20), amount_str)
-        
-        # Draw Words
-        painter.setFont(font_text)
-        x, y = get_pos("amount_words")
-        painter.drawText(int(x), int(y), self.data['words'])
-        
-        # Draw Beneficiary
-        x, y = get_pos("beneficiary")
-        painter.drawText(int(x), int(y), self.data['beneficiary'])
-        
-        # Draw Location
-        x, y = get_pos("location")
-        painter.drawText(int(x), int(y), self.data['location'])
-        
-        # Draw Date
-        painter.setFont(font_date)
-        x, y = get_pos("date")
-        date_str = self.data['date'].toString("dd/MM/yyyy")
-        painter.drawText(int(x), int(y), f"le {date_str}")
+        self.renderer.draw(painter, rect)
         
         # Draw drag handles
         if self.dragging:
@@ -0,0 +1,429 @@
+"""
+Shared work queue for rendering one large batch on several processes or machines.
+
+A batch is split into chunks of consecutive records in a SQLite database on
+shared storage. Render nodes lease a chunk for a limited time, renew the
+lease while they work, and write the chunk as a PDF part. A chunk whose lease
+expires (crashed or stalled node) goes back to the queue. Once every chunk is
+done, merge() files the parts in batch order with a manifest.
+
+    python main.py queue submit batch.csv --queue /mnt/share/q.db --output /mnt/share/out
+    python main.py queue work --queue /mnt/share/q.db --processes 8     # on each machine
+    python main.py queue merge <batch_id> --queue /mnt/share/q.db
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sqlite3
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from itertools import islice
+from typing import Optional
+
+from PyQt6.QtGui import QGuiApplication, QPainter
+
+from src.batch import BatchIndex, record_to_data
+from src.batch_print import job_id_for
+from src.fonts import load_bundled_fonts
+from src.hot_folder import worker_name
+from src.models import CheckTemplate
+from src.pdf_direct import DirectPdfWriter, template_background
+from src.render_service import pdf_writer, DEFAULT_DPI
+from src.renderers import CheckRenderer, get_check_rect
+from src.template_cache import template_cache
+
+CHUNK_SIZE = 1000
+LEASE_SECONDS = 300
+# Pages rendered between lease renewals
+RENEW_EVERY = 50
+MAX_ATTEMPTS = 3
+POLL_SECONDS = 5.0
+PARTS_DIR = "parts"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS batches (
+    batch_id TEXT PRIMARY KEY, input_path TEXT NOT NULL, index_path TEXT NOT NULL,
+    output_dir TEXT NOT NULL, check_type TEXT, background INTEGER NOT NULL DEFAULT 0,
+    total INTEGER NOT NULL, created REAL);
+CREATE TABLE IF NOT EXISTS chunks (
+    batch_id TEXT NOT NULL, chunk_no INTEGER NOT NULL, first INTEGER NOT NULL, last INTEGER NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending', owner TEXT, lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0, output TEXT, pages INTEGER, errors TEXT, error TEXT,
+    PRIMARY KEY (batch_id, chunk_no));
+"""
+
+
+class LeaseLost(Exception):
+    """Raised when a chunk's lease expired and it was given to another node."""
+
+
+@dataclass
+class Chunk:
+    """A leased range of records, first inclusive and last exclusive."""
+    batch_id: str
+    chunk_no: int
+    first: int
+    last: int
+    attempts: int
+
+
+class WorkQueue:
+    """Chunks of batches in a SQLite database that several processes share."""
+
+    def __init__(self, path: str):
+        self.path = path
+        connection = sqlite3.connect(path, timeout=60)
+        try:
+            connection.executescript(SCHEMA)
+        finally:
+            connection.close()
+
+    @contextmanager
+    def _transaction(self, write: bool = True):
+        """Run statements in a transaction, taking the write lock up front if needed."""
+        # Rollback journal rather than WAL: WAL does not work on network file systems
+        connection = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        try:
+            connection.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+            yield connection
+            connection.execute("COMMIT")
+        except BaseException:
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            raise
+        finally:
+            connection.close()
+
+    def submit(self, input_path: str, output_dir: str, check_type: Optional[str] = None,
+               chunk_size: int = CHUNK_SIZE, background: bool = False) -> str:
+        """Index a batch file and queue its chunks; submitting it again is a no-op."""
+        input_path = os.path.abspath(input_path)
+        output_dir = os.path.abspath(output_dir)
+        batch_id = job_id_for(input_path)
+        if self.batch(batch_id) is not None:
+            return batch_id
+        os.makedirs(os.path.join(output_dir, PARTS_DIR), exist_ok=True)
+        index_path = os.path.join(output_dir, f"{batch_id}.idx")
+        total = len(BatchIndex.build(input_path, index_path))
+
+        with self._transaction() as connection:
+            if connection.execute("SELECT 1 FROM batches WHERE batch_id = ?", (batch_id,)).fetchone():
+                return batch_id
+            connection.execute(
+                "INSERT INTO batches VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (batch_id, input_path, index_path, output_dir, check_type, int(background),
+                 total, time.time())
+            )
+            connection.executemany(
+                "INSERT INTO chunks (batch_id, chunk_no, first, last) VALUES (?, ?, ?, ?)",
+                [(batch_id, n, first, min(first + chunk_size, total))
+                 for n, first in enumerate(range(0, total, chunk_size))]
+            )
+        return batch_id
+
+    def lease(self, owner: str, batch_id: Optional[str] = None,
+              seconds: float = LEASE_SECONDS) -> Optional[Chunk]:
+        """Lease the first pending or expired chunk, or None if there is none.
+
+        An expired chunk that already had MAX_ATTEMPTS leases is marked failed
+        instead, so a chunk that kills its node is not leased forever.
+        """
+        now = time.time()
+        expire = ("UPDATE chunks SET state = 'failed', owner = NULL, lease_expires = NULL,"
+                  " error = 'lease expired after ' || attempts || ' attempts'"
+                  " WHERE state = 'leased' AND lease_expires < ? AND attempts >= ?")
+        expire_params = [now, MAX_ATTEMPTS]
+        query = ("SELECT batch_id, chunk_no, first, last, attempts FROM chunks"
+                 " WHERE (state = 'pending' OR (state = 'leased' AND lease_expires < ?))")
+        params = [now]
+        if batch_id:
+            expire += " AND batch_id = ?"
+            expire_params.append(batch_id)
+            query += " AND batch_id = ?"
+            params.append(batch_id)
+        query += " ORDER BY batch_id, chunk_no LIMIT 1"
+
+        with self._transaction() as connection:
+            connection.execute(expire, expire_params)
+            row = connection.execute(query, params).fetchone()
+            if row is None:
+                return None
+            connection.execute(
+                "UPDATE chunks SET state = 'leased', owner = ?, lease_expires = ?, attempts = attempts + 1"
+                " WHERE batch_id = ? AND chunk_no = ?",
+                (owner, now + seconds, row["batch_id"], row["chunk_no"])
+            )
+        return Chunk(row["batch_id"], row["chunk_no"], row["first"], row["last"], row["attempts"] + 1)
+
+    def renew(self, chunk: Chunk, owner: str, seconds: float = LEASE_SECONDS) -> bool:
+        """Extend a lease; False if it was lost to another node."""
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                "UPDATE chunks SET lease_expires = ? WHERE batch_id = ? AND chunk_no = ?"
+                " AND state = 'leased' AND owner = ?",
+                (time.time() + seconds, chunk.batch_id, chunk.chunk_no, owner)
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, chunk: Chunk, owner: str, output: Optional[str], pages: int, errors: dict) -> bool:
+        """Mark a leased chunk as done; False if the lease was lost meanwhile."""
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                "UPDATE chunks SET state = 'done', output = ?, pages = ?, errors = ?, error = NULL"
+                " WHERE batch_id = ? AND chunk_no = ? AND state = 'leased' AND owner = ?",
+                (output, pages, json.dumps(errors, ensure_ascii=False),
+                 chunk.batch_id, chunk.chunk_no, owner)
+            )
+            return cursor.rowcount == 1
+
+    def fail(self, chunk: Chunk, owner: str, error: str):
+        """Give a chunk back, or mark it failed after MAX_ATTEMPTS."""
+        state = "failed" if chunk.attempts >= MAX_ATTEMPTS else "pending"
+        with self._transaction() as connection:
+            connection.execute(
+                "UPDATE chunks SET state = ?, owner = NULL, lease_expires = NULL, error = ?"
+                " WHERE batch_id = ? AND chunk_no = ? AND state = 'leased' AND owner = ?",
+                (state, error, chunk.batch_id, chunk.chunk_no, owner)
+            )
+
+    def retry_failed(self, batch_id: str) -> int:
+        """Queue the failed chunks of a batch again."""
+        with self._transaction() as connection:
+            return connection.execute(
+                "UPDATE chunks SET state = 'pending', attempts = 0 WHERE batch_id = ? AND state = 'failed'",
+                (batch_id,)
+            ).rowcount
+
+    def batch(self, batch_id: str) -> Optional[dict]:
+        with self._transaction(write=False) as connection:
+            row = connection.execute("SELECT * FROM batches WHERE batch_id = ?", (batch_id,)).fetchone()
+            return dict(row) if row else None
+
+    def chunks(self, batch_id: str) -> list:
+        with self._transaction(write=False) as connection:
+            return [dict(row) for row in connection.execute(
+                "SELECT * FROM chunks WHERE batch_id = ? ORDER BY chunk_no", (batch_id,))]
+
+    def status(self, batch_id: Optional[str] = None) -> dict:
+        """Count chunks per state, for one batch or all of them."""
+        query = "SELECT state, COUNT(*) FROM chunks"
+        params = ()
+        if batch_id:
+            query += " WHERE batch_id = ?"
+            params = (batch_id,)
+        with self._transaction(write=False) as connection:
+            return dict(connection.execute(query + " GROUP BY state", params).fetchall())
+
+
+def render_chunk(queue: WorkQueue, batch: dict, chunk: Chunk, owner: str, direct: bool = False) -> tuple:
+    """Render a leased chunk to a PDF part; returns (path or None, pages, errors)."""
+    part_path = os.path.join(batch["output_dir"], PARTS_DIR,
+                             f"{chunk.batch_id}-{chunk.chunk_no:05d}.pdf")
+    tmp_path = f"{part_path}.{owner}.tmp"
+    index = BatchIndex(batch["input_path"], batch["index_path"])
+    check_type = batch["check_type"]
+    if direct:
+        return _write_chunk_direct(queue, batch, chunk, owner, index, part_path, tmp_path)
+    background = template_cache.load(check_type) if batch["background"] and check_type else None
+
+    writer = None
+    painter = QPainter()
+    pages = 0
+    errors = {}
+    try:
+        for record_no, record in islice(index.read_from(chunk.first), chunk.last - chunk.first):
+            try:
+                data = record_to_data(record)
+            except ValueError as e:
+                errors[str(record_no)] = str(e)
+                continue
+            if writer is None:
+                writer = pdf_writer(tmp_path, DEFAULT_DPI)
+                if not painter.begin(writer):
+                    raise RuntimeError("Failed to initialize painter")
+            else:
+                writer.newPage()
+            CheckRenderer(data, background, check_type).draw(
+                painter, get_check_rect(writer), draw_background=background is not None)
+            pages += 1
+            if pages % RENEW_EVERY == 0 and not queue.renew(chunk, owner):
+                raise LeaseLost(f"chunk {chunk.chunk_no}")
+    except BaseException:
+        if painter.isActive():
+            painter.end()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    if writer is None:
+        # Every record in the chunk is invalid
+        return None, 0, errors
+    painter.end()
+    os.replace(tmp_path, part_path)
+    return part_path, pages, errors
+
+
+def _write_chunk_direct(queue: WorkQueue, batch: dict, chunk: Chunk, owner: str,
+                        index: BatchIndex, part_path: str, tmp_path: str) -> tuple:
+    """Write a leased chunk with the direct PDF writer instead of QPainter."""
+    check_type = batch["check_type"]
+    background = template_background(check_type) if batch["background"] and check_type else None
+    errors = {}
+    writer = DirectPdfWriter(tmp_path, check_type, background)
+    try:
+        for record_no, record in islice(index.read_from(chunk.first), chunk.last - chunk.first):
+            try:
+                writer.add_page(record_to_data(record))
+            except ValueError as e:
+                errors[str(record_no)] = str(e)
+                continue
+            if writer.pages % RENEW_EVERY == 0 and not queue.renew(chunk, owner):
+                raise LeaseLost(f"chunk {chunk.chunk_no}")
+    except BaseException:
+        writer.abort()
+        raise
+
+    if not writer.pages:
+        # Every record in the chunk is invalid
+        writer.abort()
+        return None, 0, errors
+    writer.close()
+    os.replace(tmp_path, part_path)
+    return part_path, writer.pages, errors
+
+
+def work(queue_path: str, batch_id: Optional[str] = None, owner: Optional[str] = None,
+         direct: bool = False) -> int:
+    """Render chunks until the queue is drained; returns the number rendered."""
+    queue = WorkQueue(queue_path)
+    owner = owner or worker_name()
+    batches = {}
+    rendered = 0
+    while True:
+        chunk = queue.lease(owner, batch_id)
+        if chunk is None:
+            # Chunks leased by other nodes come back if their lease expires
+            status = queue.status(batch_id)
+            if not status.get("leased"):
+                return rendered
+            time.sleep(POLL_SECONDS)
+            continue
+
+        if chunk.batch_id not in batches:
+            batches[chunk.batch_id] = queue.batch(chunk.batch_id)
+        batch = batches[chunk.batch_id]
+        started = time.perf_counter()
+        try:
+            output, pages, errors = render_chunk(queue, batch, chunk, owner, direct)
+        except LeaseLost:
+            print(f"[WORK QUEUE] {owner}: lost lease on chunk {chunk.chunk_no}")
+            continue
+        except Exception as e:
+            print(f"[WORK QUEUE] {owner}: chunk {chunk.chunk_no} failed: {e}")
+            queue.fail(chunk, owner, str(e))
+            continue
+        if queue.complete(chunk, owner, output, pages, errors):
+            rendered += 1
+            print(f"[WORK QUEUE] {owner}: chunk {chunk.chunk_no} ({pages} pages)"
+                  f" in {time.perf_counter() - started:.1f} s")
+
+
+def merge(queue: WorkQueue, batch_id: str) -> str:
+    """File the parts of a finished batch in order and write its manifest."""
+    batch = queue.batch(batch_id)
+    if batch is None:
+        raise ValueError(f"Lot inconnu: {batch_id}")
+    chunks = queue.chunks(batch_id)
+    unfinished = [c["chunk_no"] for c in chunks if c["state"] != "done"]
+    if unfinished:
+        raise ValueError(f"{len(unfinished)} parties non terminées (ex. {unfinished[:5]})")
+
+    stem = os.path.splitext(os.path.basename(batch["input_path"]))[0]
+    files = []
+    errors = {}
+    for chunk in chunks:
+        errors.update(json.loads(chunk["errors"] or "{}"))
+        if not chunk["output"]:
+            continue
+        name = f"{stem}-{chunk['first'] + 1:06d}-{chunk['last']:06d}.pdf"
+        final_path = os.path.join(batch["output_dir"], name)
+        # Already moved if merge is run again
+        if os.path.exists(chunk["output"]):
+            os.replace(chunk["output"], final_path)
+        files.append({"file": name, "first": chunk["first"], "last": chunk["last"], "pages": chunk["pages"]})
+
+    manifest = {
+        "batch_id": batch_id,
+        "input": batch["input_path"],
+        "total": batch["total"],
+        "pages": sum(f["pages"] for f in files),
+        "files": files,
+        "errors": dict(sorted(errors.items(), key=lambda item: int(item[0]))),
+    }
+    manifest_path = os.path.join(batch["output_dir"], f"{stem}.manifest.json")
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, manifest_path)
+    return manifest_path
+
+
+def _run_worker(queue_path: str, batch_id: Optional[str], owner: str, direct: bool = False):
+    """Entry point of a render process."""
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    app = QGuiApplication(sys.argv[:1])  # noqa: F841 - fonts need an application
+    load_bundled_fonts()
+    work(queue_path, batch_id, owner, direct)
+
+
+def main(argv=None):
+    """Submit, render, inspect or merge batches in a shared queue."""
+    parser = argparse.ArgumentParser(prog="main.py queue", description="Shared batch render queue")
+    parser.add_argument("--queue", required=True, help="queue database on shared storage")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    submit_parser = commands.add_parser("submit", help="queue a batch file")
+    submit_parser.add_argument("batch_file")
+    submit_parser.add_argument("--output", required=True, help="output folder on shared storage")
+    submit_parser.add_argument("--check-type", choices=sorted(CheckTemplate.TEMPLATES))
+    submit_parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    submit_parser.add_argument("--background", action="store_true", help="include the template image")
+
+    work_parser = commands.add_parser("work", help="render chunks until the queue is empty")
+    work_parser.add_argument("--batch", help="only this batch")
+    work_parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    work_parser.add_argument("--direct", action="store_true",
+                             help="write PDF text operators directly (standard fonts, no QPainter)")
+
+    status_parser = commands.add_parser("status", help="count chunks per state")
+    status_parser.add_argument("batch_id", nargs="?")
+    merge_parser = commands.add_parser("merge", help="file the parts of a finished batch in order")
+    merge_parser.add_argument("batch_id")
+    retry_parser = commands.add_parser("retry", help="queue failed chunks again")
+    retry_parser.add_argument("batch_id")
+    args = parser.parse_args(argv)
+
+    queue = WorkQueue(args.queue)
+    if args.command == "submit":
+        print(queue.submit(args.batch_file, args.output, args.check_type, args.chunk_size,
+                           args.background))
+    elif args.command == "work":
+        # One Qt application per process; each process leases its own chunks
+        context = multiprocessing.get_context("spawn")
+        processes = [context.Process(target=_run_worker,
+                                     args=(args.queue, args.batch, f"{worker_name()}.{n}", args.direct))
+                     for n in range(max(1, args.processes))]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+    elif args.command == "status":
+        print(json.dumps(queue.status(args.batch_id)))
+    elif args.command == "merge":
+        print(merge(queue, args.batch_id))
+    elif args.command == "retry":
+        print(queue.retry_failed(args.batch_id))
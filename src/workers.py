@@ -0,0 +1,52 @@
+"""
+Background work for the Check Printer application.
+
+Work runs on a shared thread pool and returns a concurrent.futures.Future.
+Callbacks passed to submit() are delivered on the GUI thread.
+"""
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from PyQt6.QtCore import QObject, pyqtSignal
+
+executor = ThreadPoolExecutor(max_workers=min(4, os.cpu_count() or 1),
+                              thread_name_prefix="check-worker")
+
+
+class _CallbackRelay(QObject):
+    """Carries finished futures from worker threads to the GUI thread."""
+    finished = pyqtSignal(object, object)
+
+    def __init__(self):
+        super().__init__()
+        self.finished.connect(self._deliver)
+
+    def _deliver(self, callback, future):
+        callback(future)
+
+
+_relay = None
+
+
+def when_done(future: Future, callback):
+    """Call callback(future) on the GUI thread once future has finished."""
+    global _relay
+    if _relay is None:
+        # Created on first use from the GUI thread, so it lives there
+        _relay = _CallbackRelay()
+    relay = _relay
+    future.add_done_callback(lambda f: relay.finished.emit(callback, f))
+
+
+def submit(fn, *args, on_done=None) -> Future:
+    """Run fn(*args) on the pool; on_done(future) is called on the GUI thread."""
+    future = executor.submit(fn, *args)
+    if on_done is not None:
+        when_done(future, on_done)
+    return future
+
+
+def completed(result) -> Future:
+    """Get a future that is already resolved with result."""
+    future = Future()
+    future.set_result(result)
+    return future
@@ -0,0 +1,138 @@
+"""
+Golden-file tests for the raw printer overlays.
+
+Each overlay's output for a fixed set of records is compared byte for byte
+with a reference file in tests/golden. After an intended change to the
+output, regenerate the references and review their diff:
+
+    UPDATE_GOLDEN=1 python -m pytest tests
+"""
+import os
+
+import pytest
+
+from src.batch import record_to_data
+from src.pdf_direct import text_runs
+from src.raw_overlay import EscpOverlay, PclOverlay, PostScriptOverlay, ps_string
+
+GOLDEN_DIR = os.path.join(os.path.dirname(__file__), "golden")
+
+RECORDS = [
+    {"amount": "1500.50", "beneficiary": "Société Générale Algérie", "location": "Béjaïa",
+     "date": "01/02/2026"},
+    # Largest amount: the words are wrapped onto two lines
+    {"amount": "987654321.99", "beneficiary": "Hôtel Ça Va Élysée", "location": "Tizi Ouzou",
+     "date": "2026-12-31"},
+    # Characters PostScript strings must escape, and one outside Latin-1
+    {"amount": "7", "beneficiary": "Zoë (Café) \\ Müller €", "location": "Oran",
+     "date": "05-06-2026"},
+]
+
+
+def check_golden(name: str, output: bytes):
+    """Compare output with the reference file, or rewrite it with UPDATE_GOLDEN=1."""
+    path = os.path.join(GOLDEN_DIR, name)
+    if os.environ.get("UPDATE_GOLDEN"):
+        os.makedirs(GOLDEN_DIR, exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(output)
+    with open(path, "rb") as f:
+        expected = f.read()
+    assert output == expected, f"{name} differs from its reference file"
+
+
+@pytest.fixture(scope="module")
+def checks():
+    return [record_to_data(record) for record in RECORDS]
+
+
+@pytest.mark.parametrize("check_type", ["BNA", "BDR"])
+def test_postscript(checks, check_type):
+    check_golden(f"{check_type.lower()}.ps", PostScriptOverlay(check_type).document(checks))
+
+
+@pytest.mark.parametrize("check_type", ["BNA", "BDR"])
+def test_pcl(checks, check_type):
+    check_golden(f"{check_type.lower()}.pcl", PclOverlay(check_type).document(checks))
+
+
+def test_postscript_escapes_strings():
+    assert ps_string("Zoë (a) \\ €") == b"(Zo\\353 \\(a\\) \\\\ ?)"
+
+
+def escp_fields(page: bytes) -> dict:
+    """Get {text: (row in 1/180 inch, column in 1/60 inch, font commands)} from an ESC/P form."""
+    fields = {}
+    row = column = 0
+    commands = b""
+    i = 0
+    while i < len(page):
+        if page[i:i + 2] == b"\x1bJ":
+            row += page[i + 2]
+            i += 3
+        elif page[i:i + 2] == b"\x1b$":
+            column = page[i + 2] + 256 * page[i + 3]
+            i += 4
+        elif page[i:i + 2] in (b"\x1bS", b"\x1bP", b"\x1bM", b"\x1bg", b"\x1bE", b"\x1bF", b"\x1bT"):
+            length = 3 if page[i + 1:i + 2] == b"S" else 2
+            commands += page[i:i + length]
+            i += length
+        elif page[i] in (0x0f, 0x12):
+            commands += page[i:i + 1]
+            i += 1
+        elif page[i] in (0x0c, 0x0d):
+            i += 1
+        else:
+            end = i
+            while end < len(page) and page[end] not in (0x1b, 0x0c, 0x0d):
+                end += 1
+            fields[page[i:end]] = (row, column, commands)
+            commands = b""
+            i = end
+    return fields
+
+
+@pytest.mark.parametrize("check_type", ["BNA", "BDR"])
+def test_escp(checks, check_type):
+    check_golden(f"{check_type.lower()}.prn", EscpOverlay(check_type).document(checks))
+
+
+def test_escp_letter_quality_and_form_length(checks):
+    overlay = EscpOverlay("BNA", origin_mm=(5.0, 2.0), form_length_mm=88.9, letter_quality=True)
+    check_golden("bna_nlq.prn", overlay.document(checks[:1]))
+
+
+@pytest.mark.parametrize("size, pitch", [
+    (11.0, b"\x1bM\x12"),   # 12 cpi elite
+    (9.0, b"\x1bg\x12"),    # 15 cpi
+    (7.5, b"\x1bP\x0f"),    # condensed pica, 17.14 cpi
+    (6.0, b"\x1bM\x0f"),    # condensed elite, 20 cpi
+    (20.0, b"\x1bP\x12"),   # 10 cpi pica
+])
+def test_escp_pitch(size, pitch):
+    command, _ = EscpOverlay.select_font("text", size)
+    assert command.startswith(pitch)
+
+
+def test_escp_ascent_depends_on_size():
+    amount, amount_ascent = EscpOverlay.select_font("amount", 10.0)
+    date, date_ascent = EscpOverlay.select_font("text", 6.0)
+    assert amount.endswith(b"\x1bE\x1bT") and amount_ascent == 21
+    # The date is printed in superscript, 2/3 as tall
+    assert date.endswith(b"\x1bF\x1bS\x00") and date_ascent == 14
+
+
+def test_escp_positions(checks):
+    data = checks[0]
+    page = EscpOverlay("BNA").page(data)
+    fields = escp_fields(page)
+    runs = {value: (size, x, y) for _, size, x, y, value in text_runs(data, EscpOverlay("BNA").positions)}
+    for value, (size, x, y) in runs.items():
+        row, column, commands = fields[value.encode("cp437", errors="replace")]
+        _, ascent = EscpOverlay.select_font("text", size)
+        # Columns in 1/60 inch, rows fed in 1/180 inch down to the top of the characters
+        assert column == round(x / 72 * 60)
+        assert row == round(y / 72 * 180) - ascent
+    # cp437 accents
+    assert "Société Générale Algérie".encode("cp437") == b"Soci\x82t\x82 G\x82n\x82rale Alg\x82rie"
+    assert b"Soci\x82t\x82 G\x82n\x82rale Alg\x82rie" in fields